@@ -51,6 +51,535 @@ def deactivate_stripe_courses(debug:bool=False) -> None:
         except InvalidRequestError as error:
             print(error)
 
+def create_keyset_pagination_procedure(
+    cur:pymysql.cursors.Cursor=None, definer:str="", procedureName:str="", filterParams:str="",
+    selectColumns:str="", fromClause:str="", whereClause:str="", sortColumn:str="", idColumn:str=""
+) -> None:
+    """
+    Create a stored procedure that paginates the rows in descending order of (sortColumn, idColumn)
+    using keyset pagination so that the next/previous page costs the same regardless of how deep the page is.
+
+    The created procedure takes the filterParams followed by these parameters:
+    - page_offset (INT): The number of rows to skip, only used when there is no cursor
+                         (i.e. when jumping to a page number directly)
+    - page_size (INT): The number of rows to return
+    - cursor_sort_value (DATETIME): The sortColumn value of the row to seek from (exclusive)
+    - cursor_id (VARCHAR(32)): The idColumn value of the row to seek from (exclusive)
+    - seek_backward (BOOL): If true, returns the rows before the cursor
+                            (or the last rows if there is no cursor) instead of the rows after it
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor to create the procedure with
+    - definer (str): The definer of the procedure
+    - procedureName (str): The name of the procedure
+    - filterParams (str): The parameters of the procedure for filtering the rows, e.g. "IN teacherID VARCHAR(32)"
+    - selectColumns (str): The columns to select which must include the sortColumn and idColumn
+    - fromClause (str): The tables to select from
+    - whereClause (str): The conditions to filter the rows
+    - sortColumn (str): The DATETIME column to sort by, e.g. "cc.date_created"
+    - idColumn (str): The unique column to break ties of the sortColumn, e.g. "cc.course_id"
+    """
+    # the outer query of the backward seek can only refer to the column names of the derived table
+    sortAlias, idAlias = sortColumn.split(".")[-1], idColumn.split(".")[-1]
+    params = f"{filterParams}, " if (filterParams) else ""
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `{procedureName}`(
+            {params}IN page_offset INT, IN page_size INT,
+            IN cursor_sort_value DATETIME, IN cursor_id VARCHAR(32), IN seek_backward BOOL
+        )
+        BEGIN
+            IF (NOT seek_backward) THEN
+                SELECT {selectColumns}
+                FROM {fromClause}
+                WHERE {whereClause} AND (
+                    cursor_sort_value IS NULL OR {sortColumn} < cursor_sort_value
+                    OR ({sortColumn} = cursor_sort_value AND {idColumn} < cursor_id)
+                )
+                ORDER BY {sortColumn} DESC, {idColumn} DESC
+                LIMIT page_size OFFSET page_offset;
+            ELSE
+                SELECT * FROM (
+                    SELECT {selectColumns}
+                    FROM {fromClause}
+                    WHERE {whereClause} AND (
+                        cursor_sort_value IS NULL OR {sortColumn} > cursor_sort_value
+                        OR ({sortColumn} = cursor_sort_value AND {idColumn} > cursor_id)
+                    )
+                    ORDER BY {sortColumn} ASC, {idColumn} ASC
+                    LIMIT page_size
+                ) AS page_rows
+                ORDER BY {sortAlias} DESC, {idAlias} DESC;
+            END IF;
+        END
+    """)
+
+def create_course_card_table(cur:pymysql.cursors.Cursor) -> None:
+    """
+    Create the course_card table and its indexes
+    (also used by migrate_course_card.py to add the table to an existing database)
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor of the connection to the "coursefinity" database
+    """
+    # Denormalised read model of the course cards shown in the course listings
+    # which is maintained incrementally by the triggers (see "Triggers for the course_card table" in create_stored_routines())
+    cur.execute("""CREATE TABLE course_card (
+        course_id CHAR(32) PRIMARY KEY,
+        teacher_id VARCHAR(32) NOT NULL,
+        teacher_username VARCHAR(255) NOT NULL,
+        teacher_profile_image VARCHAR(255) DEFAULT NULL,
+        course_name VARCHAR(255) NOT NULL,
+        course_description VARCHAR(2000) DEFAULT NULL,
+        course_image_path VARCHAR(255) DEFAULT NULL,
+        course_price DECIMAL(6,2) NOT NULL,
+        course_category VARCHAR(255) NOT NULL,
+        date_created DATETIME NOT NULL,
+        video_path VARCHAR(255) NOT NULL,
+        active BOOL NOT NULL DEFAULT TRUE,
+        review_count INTEGER NOT NULL DEFAULT 0,
+        rating_sum INTEGER NOT NULL DEFAULT 0,
+        avg_rating INTEGER AS (IF(review_count > 0, ROUND(rating_sum / review_count, 0), NULL)) STORED,
+        FOREIGN KEY (course_id) REFERENCES course(course_id) ON DELETE CASCADE
+    )""")
+    cur.execute("CREATE INDEX course_card_active_date_created_idx ON course_card(active, date_created)")
+    cur.execute("CREATE INDEX course_card_active_avg_rating_idx ON course_card(active, avg_rating)")
+    cur.execute("CREATE INDEX course_card_teacher_active_date_created_idx ON course_card(teacher_id, active, date_created)")
+    cur.execute("CREATE INDEX course_card_category_active_date_created_idx ON course_card(course_category, active, date_created)")
+    cur.execute("CREATE FULLTEXT INDEX course_card_search_idx ON course_card(course_name, course_description)")
+
+def create_stored_routines(cur:pymysql.cursors.Cursor, definer:str) -> None:
+    """
+    Create the stored procedures, functions and triggers
+    (also used by migrate_course_card.py to recreate them in an existing database)
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor of the connection to the "coursefinity" database
+    - definer (str): The definer of the stored routines, e.g. "coursefinity`@`localhost"
+    """
+    # Stored Procedures
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `delete_user_data`(IN user_id_input VARCHAR(32))
+        BEGIN
+            UPDATE course SET active=0 WHERE teacher_id=user_id_input;
+
+            UPDATE user SET email=NULL, password=NULL, profile_image=NULL, status='Deleted', 
+            role=(SELECT role_id FROM role WHERE role_name='Student'),
+            username=CONCAT('deleted-user-', UUID_V4()) -- totally not copying discord (;
+            WHERE id=user_id_input;
+
+            DELETE FROM purchased_courses WHERE user_id=user_id_input;
+            DELETE FROM draft_course WHERE teacher_id = user_id_input;
+            DELETE FROM review WHERE user_id = user_id_input;
+            DELETE FROM review WHERE course_id IN (SELECT course_id FROM course WHERE teacher_id = user_id_input);
+            DELETE FROM user_ip_addresses WHERE user_id = user_id_input;
+            DELETE FROM twofa_token WHERE user_id = user_id_input;
+            DELETE FROM login_attempts WHERE user_id = user_id_input;
+            DELETE FROM session WHERE user_id = user_id_input;
+            DELETE FROM guard_token WHERE user_id = user_id_input;
+            DELETE FROM acc_recovery_token WHERE user_id = user_id_input;
+            DELETE FROM expirable_token WHERE user_id = user_id_input;
+        END
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `delete_acc_recovery_token`(IN user_id_input VARCHAR(32))
+        BEGIN
+            DELETE FROM acc_recovery_token WHERE user_id = user_id_input;
+            DELETE FROM expirable_token WHERE user_id = user_id_input;
+        END
+    """)
+    """Functions to get Data"""
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `get_role_name`(IN roleID INT UNSIGNED)
+        BEGIN
+            SELECT role_name FROM role WHERE role_id=roleID;
+        END
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `get_role_id`(IN roleName VARCHAR(255))
+        BEGIN
+            SELECT role_id FROM role WHERE role_name=roleName;
+        END
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `get_course_data`(IN courseID CHAR(32))
+        BEGIN
+            SELECT 
+            course_id, teacher_id, 
+            teacher_username, teacher_profile_image, course_name, course_description,
+            course_image_path, course_price, course_category, date_created, 
+            avg_rating, video_path, active
+            FROM course_card
+            WHERE course_id=courseID;
+        END
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `get_user_data` (IN user_id_input VARCHAR(32), IN get_cart_data BOOLEAN)
+        BEGIN
+            SELECT
+            u.id, r.role_name, u.username, 
+            u.email, u.email_verified, u.password, 
+            u.profile_image, u.date_joined, 
+            IF(get_cart_data, (SELECT JSON_ARRAYAGG(course_id) FROM cart WHERE user_id=user_id_input), NULL) AS cart_courses,
+            u.status, t.token AS has_two_fa
+            FROM user AS u
+            LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
+            INNER JOIN role AS r ON u.role=r.role_id
+            WHERE u.id=user_id_input;
+        END
+    """)
+
+    # Pagination Functions
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_purchased_courses", filterParams="IN user_id_input VARCHAR(32)",
+        selectColumns="""
+        cc.course_id, cc.teacher_id,
+        cc.teacher_username, cc.teacher_profile_image, cc.course_name, cc.course_description,
+        cc.course_image_path, cc.course_price, cc.course_category, cc.date_created,
+        cc.avg_rating, cc.video_path, cc.active
+        """,
+        fromClause="course_card AS cc INNER JOIN purchased_courses AS pc ON pc.course_id=cc.course_id",
+        whereClause="pc.user_id=user_id_input",
+        sortColumn="cc.date_created", idColumn="cc.course_id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_teacher_courses", filterParams="IN teacherID VARCHAR(32)",
+        selectColumns="""
+        cc.course_id, cc.teacher_id,
+        cc.teacher_username, cc.teacher_profile_image, cc.course_name, cc.course_description,
+        cc.course_image_path, cc.course_price, cc.course_category, cc.date_created,
+        cc.avg_rating, cc.video_path, cc.active
+        """,
+        fromClause="course_card AS cc",
+        whereClause="cc.teacher_id=teacherID AND cc.active=1",
+        sortColumn="cc.date_created", idColumn="cc.course_id"
+    )
+
+    # For Drafting
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `paginate_draft_courses`(IN teacherID VARCHAR(32), IN page_number INT)
+        BEGIN
+            SET @total_course_num := (SELECT COUNT(*) FROM draft_course WHERE teacher_id=teacherID);
+            SET @page_offset := (page_number - 1) * 10;
+            SET @page_limit := @page_offset + 10;
+            SET @count := 0;
+            SELECT (@count := @count + 1) AS row_num, 
+            teacher_course_info.* FROM (
+                SELECT c.course_id, c.teacher_id, 
+                u.username, u.profile_image, c.date_created, c.video_path, @total_course_num
+                FROM draft_course AS c
+                INNER JOIN user AS u ON c.teacher_id=u.id
+                WHERE c.teacher_id=teacherID AND c.date_created IS NOT NULL
+                GROUP BY c.course_id
+                ORDER BY c.date_created DESC -- show most recent courses first
+            ) AS teacher_course_info
+            HAVING row_num > @page_offset AND row_num <= @page_limit
+            ORDER BY row_num;
+        END
+    """)
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="search_course_paginate", filterParams="IN search_term VARCHAR(255)",
+        selectColumns="""
+        cc.course_id, cc.teacher_id,
+        cc.teacher_username, cc.teacher_profile_image, cc.course_name, cc.course_description,
+        cc.course_image_path, cc.course_price, cc.course_category, cc.date_created,
+        cc.avg_rating, cc.video_path, cc.active
+        """,
+        fromClause="course_card AS cc",
+        whereClause="cc.course_name LIKE CONCAT('%', search_term, '%') AND cc.active=1",
+        sortColumn="cc.date_created", idColumn="cc.course_id"
+    )
+
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `search_course_fulltext_paginate`(IN page_number INT, IN search_query VARCHAR(1000))
+        COMMENT 'search_query must be a FULLTEXT boolean mode search query.'
+        BEGIN
+            DECLARE page_offset INT DEFAULT (page_number - 1) * 10;
+
+            -- the total number of matched courses is computed in the same pass as the page using a window function
+            -- as the courses are ranked by relevance, the pages are retrieved by offset instead of by keyset
+            SELECT course_id, teacher_id, 
+            teacher_username, teacher_profile_image, course_name, course_description, 
+            course_image_path, course_price, course_category, date_created, 
+            avg_rating, video_path, active, COUNT(*) OVER () AS total_course_num
+            FROM (
+                SELECT course_id, teacher_id, 
+                teacher_username, teacher_profile_image, course_name, course_description, 
+                course_image_path, course_price, course_category, date_created, avg_rating, video_path, active,
+                MATCH(course_name, course_description) AGAINST (search_query IN BOOLEAN MODE) AS relevance
+                FROM course_card
+                WHERE MATCH(course_name, course_description) AGAINST (search_query IN BOOLEAN MODE) AND active=1
+            ) AS course_info
+            ORDER BY relevance DESC, date_created DESC
+            LIMIT 10 OFFSET page_offset;
+        END
+    """)
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="explore_course_paginate", filterParams="IN course_tag VARCHAR(255)",
+        selectColumns="""
+        cc.course_id, cc.teacher_id,
+        cc.teacher_username, cc.teacher_profile_image, cc.course_name, cc.course_description,
+        cc.course_image_path, cc.course_price, cc.course_category, cc.date_created,
+        cc.avg_rating, cc.video_path, cc.active
+        """,
+        fromClause="course_card AS cc",
+        whereClause="cc.course_category=course_tag AND cc.active=1",
+        sortColumn="cc.date_created", idColumn="cc.course_id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_users", filterParams="",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa, (ar.user_id IS NOT NULL) AS is_in_recovery
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id LEFT OUTER JOIN acc_recovery_token AS ar ON u.id=ar.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_admins", filterParams="",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="r.role_name='Admin' AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_users_by_username", filterParams="IN username_input VARCHAR(255)",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa, (ar.user_id IS NOT NULL) AS is_in_recovery
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id LEFT OUTER JOIN acc_recovery_token AS ar ON u.id=ar.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="u.username LIKE CONCAT('%', username_input, '%') AND r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_admins_by_username", filterParams="IN username_input VARCHAR(255)",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="u.username LIKE CONCAT('%', username_input, '%') AND r.role_name='Admin' AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_users_by_uid", filterParams="IN uid_input VARCHAR(32)",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa, (ar.user_id IS NOT NULL) AS is_in_recovery
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id LEFT OUTER JOIN acc_recovery_token AS ar ON u.id=ar.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="u.id LIKE CONCAT('%', uid_input, '%') AND r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_admins_by_uid", filterParams="IN uid_input VARCHAR(32)",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="u.id LIKE CONCAT('%', uid_input, '%') AND r.role_name='Admin' AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_users_by_email", filterParams="IN email_input VARCHAR(255)",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa, (ar.user_id IS NOT NULL) AS is_in_recovery
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id LEFT OUTER JOIN acc_recovery_token AS ar ON u.id=ar.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="u.email LIKE CONCAT('%', email_input, '%') AND r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_admins_by_email", filterParams="IN email_input VARCHAR(255)",
+        selectColumns="""
+        u.id, r.role_name, u.username,
+        u.email, u.email_verified, u.password,
+        u.profile_image, u.date_joined, NULL AS cart,
+        u.status, t.token AS has_two_fa
+        """,
+        fromClause="user AS u LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id INNER JOIN role AS r ON u.role=r.role_id",
+        whereClause="u.email LIKE CONCAT('%', email_input, '%') AND r.role_name='Admin' AND u.status <> 'Deleted'",
+        sortColumn="u.date_joined", idColumn="u.id"
+    )
+
+    create_keyset_pagination_procedure(
+        cur=cur, definer=definer, procedureName="paginate_review_by_course", filterParams="IN course_id_input CHAR(32)",
+        selectColumns="""
+        r.user_id, r.course_id, r.course_rating,
+        r.course_review, r.review_date, u.username,
+        u.profile_image, ro.role_name
+        """,
+        fromClause="review AS r INNER JOIN user AS u ON r.user_id=u.id INNER JOIN role AS ro ON u.role=ro.role_id",
+        whereClause="r.course_id=course_id_input",
+        sortColumn="r.review_date", idColumn="r.user_id"
+    )
+
+    # Datetime function
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` FUNCTION SGT_NOW() 
+            RETURNS DATETIME 
+        DETERMINISTIC 
+        COMMENT 'Returns SGT (UTC+8) datetime.'
+        BEGIN
+            RETURN CONVERT_TZ(UTC_TIMESTAMP(), '+00:00', '+08:00');
+        END
+    """)
+
+    # UUID_V4 function based on https://stackoverflow.com/a/61062917/16377492
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` FUNCTION UUID_V4()
+            RETURNS CHAR(36)
+        DETERMINISTIC
+        COMMENT 'Returns a random UUID v4 (36 Characters string).'
+        BEGIN
+            -- 1th and 2nd block are made of 6 random bytes
+            SET @h1 = HEX(RANDOM_BYTES(4));
+            SET @h2 = HEX(RANDOM_BYTES(2));
+
+            -- 3th block will start with a 4 indicating the version, remaining is random
+            SET @h3 = CONCAT('4', SUBSTR(HEX(RANDOM_BYTES(2)), 2, 3));
+
+            -- 4th block first nibble can only be 8, 9 A or B, remaining is random
+            SET @h4 = CONCAT(
+                HEX(FLOOR(ASCII(RANDOM_BYTES(1)) / 64) + 8),
+                SUBSTR(HEX(RANDOM_BYTES(2)), 2, 3)
+            );
+
+            -- 5th block is made of 6 random bytes
+            SET @h5 = HEX(RANDOM_BYTES(6));
+
+            -- Build the complete UUID
+            RETURN LOWER(CONCAT_WS(
+                '-', @h1, @h2, @h3, @h4, @h5
+            ));
+        END
+    """)
+
+    # Triggers for the course_card table
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` PROCEDURE `rebuild_course_card`()
+        COMMENT 'Rebuilds the course_card read model from the course, user and review tables.'
+        BEGIN
+            DELETE FROM course_card;
+            INSERT INTO course_card (
+                course_id, teacher_id, teacher_username, teacher_profile_image,
+                course_name, course_description, course_image_path, course_price,
+                course_category, date_created, video_path, active, review_count, rating_sum
+            )
+            SELECT c.course_id, c.teacher_id, u.username, u.profile_image,
+            c.course_name, c.course_description, c.course_image_path, c.course_price,
+            c.course_category, c.date_created, c.video_path, c.active,
+            COUNT(r.user_id), IFNULL(SUM(r.course_rating), 0)
+            FROM course AS c
+            INNER JOIN user AS u ON c.teacher_id=u.id
+            LEFT OUTER JOIN review AS r ON c.course_id=r.course_id
+            GROUP BY c.course_id;
+        END
+    """)
+    # The sum of the role versions is used by the web app workers
+    # to detect if their cached RBAC decision table is outdated
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `role_before_update` BEFORE UPDATE ON role
+        FOR EACH ROW
+            SET NEW.version = OLD.version + 1;
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `course_after_insert` AFTER INSERT ON course
+        FOR EACH ROW
+            INSERT INTO course_card (
+                course_id, teacher_id, teacher_username, teacher_profile_image,
+                course_name, course_description, course_image_path, course_price,
+                course_category, date_created, video_path, active
+            )
+            SELECT NEW.course_id, NEW.teacher_id, u.username, u.profile_image,
+            NEW.course_name, NEW.course_description, NEW.course_image_path, NEW.course_price,
+            NEW.course_category, NEW.date_created, NEW.video_path, NEW.active
+            FROM user AS u WHERE u.id=NEW.teacher_id;
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `course_after_update` AFTER UPDATE ON course
+        FOR EACH ROW
+            UPDATE course_card SET
+            course_name=NEW.course_name, course_description=NEW.course_description,
+            course_image_path=NEW.course_image_path, course_price=NEW.course_price,
+            course_category=NEW.course_category, video_path=NEW.video_path, active=NEW.active
+            WHERE course_id=NEW.course_id;
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `user_after_update` AFTER UPDATE ON user
+        FOR EACH ROW
+        BEGIN
+            IF (NOT (NEW.username <=> OLD.username) OR NOT (NEW.profile_image <=> OLD.profile_image)) THEN
+                UPDATE course_card SET teacher_username=NEW.username, teacher_profile_image=NEW.profile_image
+                WHERE teacher_id=NEW.id;
+            END IF;
+        END
+    """)
+    # Reviews deleted by the ON DELETE CASCADE of the user table do not fire the review triggers
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `user_before_delete` BEFORE DELETE ON user
+        FOR EACH ROW
+            UPDATE course_card AS cc
+            INNER JOIN (
+                SELECT course_id, COUNT(*) AS review_count, IFNULL(SUM(course_rating), 0) AS rating_sum
+                FROM review WHERE user_id=OLD.id GROUP BY course_id
+            ) AS r ON cc.course_id=r.course_id
+            SET cc.review_count=cc.review_count - r.review_count, cc.rating_sum=cc.rating_sum - r.rating_sum;
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `review_after_insert` AFTER INSERT ON review
+        FOR EACH ROW
+            UPDATE course_card SET review_count=review_count + 1, rating_sum=rating_sum + IFNULL(NEW.course_rating, 0)
+            WHERE course_id=NEW.course_id;
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `review_after_update` AFTER UPDATE ON review
+        FOR EACH ROW
+        BEGIN
+            UPDATE course_card SET review_count=review_count - 1, rating_sum=rating_sum - IFNULL(OLD.course_rating, 0)
+            WHERE course_id=OLD.course_id;
+            UPDATE course_card SET review_count=review_count + 1, rating_sum=rating_sum + IFNULL(NEW.course_rating, 0)
+            WHERE course_id=NEW.course_id;
+        END
+    """)
+    cur.execute(f"""
+        CREATE DEFINER=`{definer}` TRIGGER `review_after_delete` AFTER DELETE ON review
+        FOR EACH ROW
+            UPDATE course_card SET review_count=review_count - 1, rating_sum=rating_sum - IFNULL(OLD.course_rating, 0)
+            WHERE course_id=OLD.course_id;
+    """)
+
 def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
     """
     Initialize the database with the necessary tables
@@ -87,7 +616,8 @@ def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
         error_bp BOOL NOT NULL DEFAULT 1,
         teacher_bp BOOL NOT NULL DEFAULT 0,
         user_bp BOOL NOT NULL DEFAULT 0,
-        super_admin_bp BOOL NOT NULL DEFAULT 0
+        super_admin_bp BOOL NOT NULL DEFAULT 0,
+        version INTEGER UNSIGNED NOT NULL DEFAULT 0 -- incremented on every update by the role_before_update trigger
     )""")
     cur.execute("CREATE INDEX role_role_name_idx ON role(role_name)")
 
@@ -167,6 +697,7 @@ def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
         FOREIGN KEY (user_id) REFERENCES user(id) ON DELETE CASCADE
     )""")
     cur.execute("CREATE INDEX stripe_payments_user_idx ON stripe_payments(user_id)")
+    cur.execute("CREATE INDEX stripe_payments_payment_time_created_time_idx ON stripe_payments(payment_time, created_time)")
 
     cur.execute("""CREATE TABLE user_ip_addresses (
         user_id VARCHAR(32) NOT NULL,
@@ -179,7 +710,7 @@ def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
     cur.execute("CREATE INDEX user_ip_addresses_ip_address_idx ON user_ip_addresses(ip_address)")
     cur.execute("CREATE INDEX user_ip_addresses_last_accessed_idx ON user_ip_addresses(last_accessed)")
     cur.execute("CREATE INDEX user_ip_addresses_is_ipv4_idx ON user_ip_addresses(is_ipv4)")
-    cur.execute("CREATE INDEX user_ip_addresses_user_id_idx ON user_ip_addresses(user_id)")
+    cur.execute("CREATE INDEX user_ip_addresses_user_id_last_accessed_idx ON user_ip_addresses(user_id, last_accessed)")
 
     cur.execute("""CREATE TABLE expirable_token (
         token CHAR(240) PRIMARY KEY, -- base85 encoded token since a hexadecimal token would be too long for a PK
@@ -191,6 +722,12 @@ def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
     cur.execute("CREATE INDEX expirable_token_user_idx ON expirable_token(user_id)")
     cur.execute("CREATE INDEX expirable_token_expiry_date_idx ON expirable_token(expiry_date)")
 
+    cur.execute("""CREATE TABLE used_url_token (
+        nonce CHAR(32) PRIMARY KEY, -- hex encoded nonce of the used stateless URL tokens (see generate_url_token())
+        expiry_date DATETIME NOT NULL
+    )""")
+    cur.execute("CREATE INDEX used_url_token_expiry_date_idx ON used_url_token(expiry_date)")
+
     cur.execute("""CREATE TABLE acc_recovery_token ( 
         user_id VARCHAR(32) PRIMARY KEY, -- will only allow CREATION and DELETION of tokens for this table
         token CHAR(240) NOT NULL,
@@ -235,6 +772,19 @@ def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
     cur.execute("CREATE INDEX session_expiry_date_idx ON session(expiry_date)")
     cur.execute("CREATE INDEX session_fingerprint_hash_idx ON session(fingerprint_hash)")
 
+    # Run history of the maintenance jobs that are run by the elected leader worker
+    cur.execute("""CREATE TABLE maintenance_job_run (
+        id BIGINT UNSIGNED PRIMARY KEY AUTO_INCREMENT,
+        job_id VARCHAR(64) NOT NULL,
+        started_at DATETIME NOT NULL,
+        duration_ms INTEGER UNSIGNED NOT NULL,
+        rows_affected INTEGER UNSIGNED DEFAULT NULL, -- NULL if the job does not report the number of rows affected
+        status VARCHAR(10) NOT NULL, -- "success" or "error"
+        error_message VARCHAR(1024) DEFAULT NULL,
+        leader VARCHAR(255) NOT NULL -- hostname:pid of the worker that ran the job
+    )""")
+    cur.execute("CREATE INDEX maintenance_job_run_job_id_started_at_idx ON maintenance_job_run(job_id, started_at)")
+
     cur.execute("""CREATE TABLE review (
         user_id VARCHAR(32),
         course_id CHAR(32),
@@ -250,505 +800,14 @@ def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
     cur.execute("CREATE INDEX review_course_id_idx ON review(course_id)")
     cur.execute("CREATE INDEX review_course_rating_idx ON review(course_rating)")
     cur.execute("CREATE INDEX review_review_date_idx ON review(review_date)")
+    cur.execute("CREATE INDEX review_course_id_review_date_idx ON review(course_id, review_date)")
+
+    create_course_card_table(cur)
 
     # end of table creation
     mydb.commit()
 
-    # Stored Procedures
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `delete_user_data`(IN user_id_input VARCHAR(32))
-        BEGIN
-            UPDATE course SET active=0 WHERE teacher_id=user_id_input;
-
-            UPDATE user SET email=NULL, password=NULL, profile_image=NULL, status='Deleted', 
-            role=(SELECT role_id FROM role WHERE role_name='Student'),
-            username=CONCAT('deleted-user-', UUID_V4()) -- totally not copying discord (;
-            WHERE id=user_id_input;
-
-            DELETE FROM purchased_courses WHERE user_id=user_id_input;
-            DELETE FROM draft_course WHERE teacher_id = user_id_input;
-            DELETE FROM review WHERE user_id = user_id_input;
-            DELETE FROM review WHERE course_id IN (SELECT course_id FROM course WHERE teacher_id = user_id_input);
-            DELETE FROM user_ip_addresses WHERE user_id = user_id_input;
-            DELETE FROM twofa_token WHERE user_id = user_id_input;
-            DELETE FROM login_attempts WHERE user_id = user_id_input;
-            DELETE FROM session WHERE user_id = user_id_input;
-            DELETE FROM guard_token WHERE user_id = user_id_input;
-            DELETE FROM acc_recovery_token WHERE user_id = user_id_input;
-            DELETE FROM expirable_token WHERE user_id = user_id_input;
-        END
-    """)
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `delete_acc_recovery_token`(IN user_id_input VARCHAR(32))
-        BEGIN
-            DELETE FROM acc_recovery_token WHERE user_id = user_id_input;
-            DELETE FROM expirable_token WHERE user_id = user_id_input;
-        END
-    """)
-    """Functions to get Data"""
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `get_role_name`(IN roleID INT UNSIGNED)
-        BEGIN
-            SELECT role_name FROM role WHERE role_id=roleID;
-        END
-    """)
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `get_role_id`(IN roleName VARCHAR(255))
-        BEGIN
-            SELECT role_id FROM role WHERE role_name=roleName;
-        END
-    """)
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `get_course_data`(IN courseID CHAR(32))
-        BEGIN
-            SELECT 
-            c.course_id, c.teacher_id, 
-            u.username, u.profile_image, c.course_name, c.course_description,
-            c.course_image_path, c.course_price, c.course_category, c.date_created, 
-            ROUND(SUM(r.course_rating) / COUNT(*), 0) AS avg_rating, c.video_path, c.active
-            FROM course AS c
-            LEFT OUTER JOIN review AS r
-            ON c.course_id = r.course_id
-            INNER JOIN user AS u
-            ON c.teacher_id=u.id
-            WHERE c.course_id=courseID
-            GROUP BY c.course_id;
-        END
-    """)
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `get_user_data` (IN user_id_input VARCHAR(32), IN get_cart_data BOOLEAN)
-        BEGIN
-            SELECT
-            u.id, r.role_name, u.username, 
-            u.email, u.email_verified, u.password, 
-            u.profile_image, u.date_joined, 
-            IF(get_cart_data, (SELECT JSON_ARRAYAGG(course_id) FROM cart WHERE user_id=user_id_input), NULL) AS cart_courses,
-            u.status, t.token AS has_two_fa
-            FROM user AS u
-            LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-            INNER JOIN role AS r ON u.role=r.role_id
-            WHERE u.id=user_id_input;
-        END
-    """)
-
-    # Pagination Functions
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_purchased_courses` (IN user_id_input VARCHAR(32), IN page_number INT)
-        BEGIN
-            SET @total_course_num := (SELECT COUNT(*) FROM purchased_courses WHERE user_id=user_id);
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num,
-            course_info.* FROM (
-                SELECT c.course_id, c.teacher_id, 
-                u.username, u.profile_image, c.course_name, c.course_description, 
-                c.course_image_path, c.course_price, c.course_category, c.date_created, 
-                ROUND(SUM(r.course_rating) / COUNT(r.user_id), 0) AS avg_rating, @total_course_num
-                FROM course AS c
-                LEFT OUTER JOIN review AS r ON c.course_id=r.course_id
-                INNER JOIN user AS u ON c.teacher_id=u.id
-                INNER JOIN purchased_courses AS pc ON pc.course_id=c.course_id
-                WHERE pc.user_id=user_id_input
-                GROUP BY c.course_id
-                ORDER BY c.date_created DESC -- show most recent courses first
-            ) AS course_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_teacher_courses`(IN teacherID VARCHAR(32), IN page_number INT)
-        BEGIN
-            SET @total_course_num := (SELECT COUNT(*) FROM course WHERE teacher_id=teacherID);
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num, 
-            teacher_course_info.* FROM (
-                SELECT c.course_id, c.teacher_id, 
-                u.username, u.profile_image, c.course_name, c.course_description, 
-                c.course_image_path, c.course_price, c.course_category, c.date_created,
-                ROUND(SUM(r.course_rating) / COUNT(r.user_id), 0) AS avg_rating, @total_course_num
-                FROM course AS c
-                LEFT OUTER JOIN review AS r ON c.course_id=r.course_id
-                INNER JOIN user AS u ON c.teacher_id=u.id
-                WHERE c.teacher_id=teacherID AND c.active=1
-                GROUP BY c.course_id
-                ORDER BY c.date_created DESC -- show most recent courses first
-            ) AS teacher_course_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    # For Drafting
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_draft_courses`(IN teacherID VARCHAR(32), IN page_number INT)
-        BEGIN
-            SET @total_course_num := (SELECT COUNT(*) FROM draft_course WHERE teacher_id=teacherID);
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num, 
-            teacher_course_info.* FROM (
-                SELECT c.course_id, c.teacher_id, 
-                u.username, u.profile_image, c.date_created, c.video_path, @total_course_num
-                FROM draft_course AS c
-                INNER JOIN user AS u ON c.teacher_id=u.id
-                WHERE c.teacher_id=teacherID AND c.date_created IS NOT NULL
-                GROUP BY c.course_id
-                ORDER BY c.date_created DESC -- show most recent courses first
-            ) AS teacher_course_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `search_course_paginate`(IN page_number INT, IN search_term VARCHAR(255))
-        BEGIN
-            SET @search_query := CONCAT('%', search_term, '%');
-            SET @total_course_num := (SELECT COUNT(*) FROM course WHERE course_name LIKE @search_query);
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num,
-            course_info.* FROM (
-                SELECT c.course_id, c.teacher_id, 
-                u.username, u.profile_image, c.course_name, c.course_description, 
-                c.course_image_path, c.course_price, c.course_category, c.date_created, 
-                ROUND(SUM(r.course_rating) / COUNT(r.user_id), 0) AS avg_rating, @total_course_num
-                FROM course AS c
-                LEFT OUTER JOIN review AS r ON c.course_id=r.course_id
-                INNER JOIN user AS u ON c.teacher_id=u.id
-                WHERE c.course_name LIKE @search_query AND c.active=1
-                GROUP BY c.course_id
-                ORDER BY c.date_created DESC -- show most recent courses first
-            ) AS course_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `explore_course_paginate`(IN page_number INT, IN course_tag VARCHAR(255))
-        BEGIN
-            SET @total_course_num := (SELECT COUNT(*) FROM course WHERE course_category=course_tag);
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num,
-            course_info.* FROM (
-                SELECT c.course_id, c.teacher_id, 
-                u.username, u.profile_image, c.course_name, c.course_description, 
-                c.course_image_path, c.course_price, c.course_category, c.date_created, 
-                ROUND(SUM(r.course_rating) / COUNT(r.user_id), 0) AS avg_rating, @total_course_num
-                FROM course AS c
-                LEFT OUTER JOIN review AS r ON c.course_id=r.course_id
-                INNER JOIN user AS u ON c.teacher_id=u.id
-                WHERE c.course_category=course_tag AND c.active=1
-                GROUP BY c.course_id
-                ORDER BY c.date_created DESC -- show most recent courses first
-            ) AS course_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_users` (IN page_number INT)
-        BEGIN
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE r.role_name IN ('Student', 'Teacher'));
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num, 
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart,
-                u.status, t.token AS has_two_fa, @total_user
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_admins` (IN page_number INT)
-        BEGIN
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE r.role_name='Admin');
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num, 
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart,
-                u.status, t.token AS has_two_fa, @total_user
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE r.role_name = 'Admin' AND u.status <> 'Deleted'
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_users_by_username` (IN page_number INT, IN username_input VARCHAR(255))
-        BEGIN
-            SET @search_query := CONCAT('%', username_input, '%');
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE username LIKE @search_query 
-                                AND r.role_name IN ('Student', 'Teacher'));
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num,
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart,
-                u.status, t.token AS has_two_fa, @total_user
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE username LIKE @search_query AND r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_admins_by_username` (IN page_number INT, IN username_input VARCHAR(255))
-        BEGIN
-            SET @search_query := CONCAT('%', username_input, '%');
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE username LIKE @search_query AND r.role_name='Admin');
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num,
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart, u.status, 
-                t.token AS has_two_fa, @total_user
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE username LIKE @search_query AND r.role_name='Admin' AND u.status <> 'Deleted'
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_users_by_uid` (IN page_number INT, IN uid_input VARCHAR(32))
-        BEGIN
-            SET @search_query := CONCAT('%', uid_input, '%');
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE id LIKE @search_query
-                                AND r.role_name IN ('Student', 'Teacher'));
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num,
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart,
-                u.status, t.token AS has_two_fa, @total_user
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE u.id LIKE @search_query AND r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_admins_by_uid` (IN page_number INT, IN uid_input VARCHAR(32))
-        BEGIN
-            SET @search_query := CONCAT('%', uid_input, '%');
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE id LIKE @search_query AND r.role_name="Admin");
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num,
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart,
-                u.status, t.token AS has_two_fa, @total_user
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE u.id LIKE @search_query AND r.role_name='Admin' AND u.status <> 'Deleted'
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_users_by_email` (IN page_number INT, IN email_input VARCHAR(255))
-        BEGIN
-            SET @search_query := CONCAT('%', email_input, '%');
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE email LIKE @search_query
-                                AND r.role_name IN ('Student', 'Teacher'));
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num, 
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart,
-                u.status, t.token AS has_two_fa, @total_user 
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE u.email LIKE @search_query AND r.role_name IN ('Student', 'Teacher') AND u.status <> 'Deleted'
-                GROUP BY u.id
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_admins_by_email` (IN page_number INT, IN email_input VARCHAR(255))
-        BEGIN
-            SET @search_query := CONCAT('%', email_input, '%');
-            SET @total_user := (SELECT COUNT(*) FROM user AS u
-                                INNER JOIN role AS r ON u.role=r.role_id
-                                WHERE email LIKE @search_query AND r.role_name="Admin");
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num, 
-            user_info.* FROM (
-                SELECT u.id, r.role_name, u.username, 
-                u.email, u.email_verified, u.password, 
-                u.profile_image, u.date_joined, NULL as cart,
-                u.status, t.token AS has_two_fa, @total_user 
-                FROM user AS u
-                LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
-                INNER JOIN role AS r ON u.role=r.role_id
-                WHERE u.email LIKE @search_query AND r.role_name='Admin' AND u.status <> 'Deleted'
-                GROUP BY u.id
-                ORDER BY u.date_joined DESC -- show newest users first
-            ) AS user_info
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` PROCEDURE `paginate_review_by_course` (IN page_number INT, IN course_id_input CHAR(32))
-        BEGIN
-            SET @total_reviews := (SELECT COUNT(*) FROM review WHERE course_id=course_id_input GROUP BY course_id);
-
-            SET @page_offset := (page_number - 1) * 10;
-            SET @page_limit := @page_offset + 10;
-            SET @count := 0;
-            SELECT (@count := @count + 1) AS row_num, 
-            review.* FROM (
-                SELECT 
-                r.user_id, r.course_id, r.course_rating, 
-                r.course_review, r.review_date, u.username, @total_reviews 
-                FROM review r 
-                INNER JOIN user u ON r.user_id=u.id 
-                WHERE r.course_id=course_id_input
-                ORDER BY r.review_date DESC -- show newest reviews first
-            ) AS review
-            HAVING row_num > @page_offset AND row_num <= @page_limit
-            ORDER BY row_num;
-        END
-    """)
-
-    # Datetime function
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` FUNCTION SGT_NOW() 
-            RETURNS DATETIME 
-        DETERMINISTIC 
-        COMMENT 'Returns SGT (UTC+8) datetime.'
-        BEGIN
-            RETURN CONVERT_TZ(UTC_TIMESTAMP(), '+00:00', '+08:00');
-        END
-    """)
-
-    # UUID_V4 function based on https://stackoverflow.com/a/61062917/16377492
-    cur.execute(f"""
-        CREATE DEFINER=`{definer}` FUNCTION UUID_V4()
-            RETURNS CHAR(36)
-        DETERMINISTIC
-        COMMENT 'Returns a random UUID v4 (36 Characters string).'
-        BEGIN
-            -- 1th and 2nd block are made of 6 random bytes
-            SET @h1 = HEX(RANDOM_BYTES(4));
-            SET @h2 = HEX(RANDOM_BYTES(2));
-
-            -- 3th block will start with a 4 indicating the version, remaining is random
-            SET @h3 = CONCAT('4', SUBSTR(HEX(RANDOM_BYTES(2)), 2, 3));
-
-            -- 4th block first nibble can only be 8, 9 A or B, remaining is random
-            SET @h4 = CONCAT(
-                HEX(FLOOR(ASCII(RANDOM_BYTES(1)) / 64) + 8),
-                SUBSTR(HEX(RANDOM_BYTES(2)), 2, 3)
-            );
-
-            -- 5th block is made of 6 random bytes
-            SET @h5 = HEX(RANDOM_BYTES(6));
-
-            -- Build the complete UUID
-            RETURN LOWER(CONCAT_WS(
-                '-', @h1, @h2, @h3, @h4, @h5
-            ));
-        END
-    """)
+    create_stored_routines(cur, definer)
 
     # end of stored procedures and functions
     mydb.commit()
@@ -796,6 +855,10 @@ def mysql_init_tables(debug:bool=False) -> pymysql.connections.Connection:
     """)
     mydb.commit()
 
+    # backfill the course_card read model in case the tables were populated before the triggers were created
+    cur.execute("CALL rebuild_course_card()")
+    mydb.commit()
+
     # get users' info for user creation for the database
     coursefinityName = f"'coursefinity'@'{hostName}'"
 
@@ -103,9 +103,7 @@ def main() -> None:
 
             response = upload_secret_to_gcp(
                 secretName=CONSTANTS.FLASK_SECRET_KEY_NAME, 
-                secretValue=NormalFunctions.generate_secure_random_bytes(
-                    nBytes=CONSTANTS.SESSION_NUM_OF_BYTES, generateFromHSM=True
-                )
+                secretValue=NormalFunctions.kms_generate_random_bytes(nBytes=CONSTANTS.SESSION_NUM_OF_BYTES)
             )
             print(f"\rGenerated the new Flask secret key at \"{response.name}\"!", end="\n\n")
 
@@ -175,9 +173,7 @@ def main() -> None:
 
             response = upload_secret_to_gcp(
                 secretName=CONSTANTS.FLASK_SALT_KEY_NAME, 
-                secretValue=NormalFunctions.generate_secure_random_bytes(
-                    nBytes=CONSTANTS.SALT_NUM_OF_BYTES, generateFromHSM=True
-                )
+                secretValue=NormalFunctions.kms_generate_random_bytes(nBytes=CONSTANTS.SALT_NUM_OF_BYTES)
             )
             print(f"\rGenerated the new salt at \"{response.name}\"!", end="\n\n")
 
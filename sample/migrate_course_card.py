@@ -0,0 +1,106 @@
+"""
+Migrates an existing "coursefinity" database (created before the course_card read model) without dropping any data:
+1. Adds the role.version column used by the web app workers to detect outdated RBAC decision tables
+2. Creates the course_card table and its indexes
+3. Recreates all the stored procedures, functions and triggers (e.g. the course listings that read from course_card)
+4. Backfills course_card from the course, user and review tables with rebuild_course_card()
+
+The course listings are empty until course_card is backfilled, so run it before deploying the web app.
+Since the triggers are briefly dropped while they are recreated, any course or review changes in the meantime
+are reconciled by the backfill at the end. The script can be re-run safely.
+
+Usage (from the root of the repository):
+    python sample/migrate_course_card.py
+"""
+# import third party libraries
+import pymysql
+
+# import python standard libraries
+import pathlib, sys
+from importlib.util import spec_from_file_location, module_from_spec
+
+# import create_mysql_database.py local python module using absolute path
+FILE_PATH = pathlib.Path(__file__).parent.absolute()
+CREATE_DATABASE_PY_FILE = FILE_PATH.joinpath("create_mysql_database.py")
+spec = spec_from_file_location("create_mysql_database", str(CREATE_DATABASE_PY_FILE))
+create_mysql_database = module_from_spec(spec)
+sys.modules[spec.name] = create_mysql_database
+spec.loader.exec_module(create_mysql_database)
+
+NormalFunctions = create_mysql_database.NormalFunctions
+
+def has_column(cur:pymysql.cursors.Cursor, table:str, column:str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%(table)s AND COLUMN_NAME=%(column)s",
+        {"table": table, "column": column}
+    )
+    return (cur.fetchone() is not None)
+
+def has_table(cur:pymysql.cursors.Cursor, table:str) -> bool:
+    cur.execute(
+        "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA=DATABASE() AND TABLE_NAME=%(table)s",
+        {"table": table}
+    )
+    return (cur.fetchone() is not None)
+
+def drop_stored_routines(cur:pymysql.cursors.Cursor) -> None:
+    """Drop all the stored procedures, functions and triggers of the database so that they can be recreated"""
+    cur.execute("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA=DATABASE()")
+    for (triggerName,) in cur.fetchall():
+        cur.execute(f"DROP TRIGGER IF EXISTS `{triggerName}`")
+
+    cur.execute("SELECT ROUTINE_TYPE, ROUTINE_NAME FROM information_schema.ROUTINES WHERE ROUTINE_SCHEMA=DATABASE()")
+    for routineType, routineName in cur.fetchall():
+        cur.execute(f"DROP {routineType} IF EXISTS `{routineName}`")
+
+def migrate_course_card(debug:bool=False) -> None:
+    """
+    Migrate the existing database to the course_card read model
+
+    Args:
+    - debug (bool): If true, will migrate the local database, else will migrate the remote database
+    """
+    hostName = "localhost" if (debug) else "%"
+    definer = f"coursefinity`@`{hostName}"
+    mydb = NormalFunctions.get_mysql_connection(debug=debug, user="root")
+    cur = mydb.cursor()
+    try:
+        if (not has_column(cur, "role", "version")):
+            print("Adding the role.version column...")
+            cur.execute("ALTER TABLE role ADD COLUMN version INTEGER UNSIGNED NOT NULL DEFAULT 0")
+
+        if (not has_table(cur, "course_card")):
+            print("Creating the course_card table...")
+            create_mysql_database.create_course_card_table(cur)
+        mydb.commit()
+
+        print("Recreating the stored procedures, functions and triggers...")
+        drop_stored_routines(cur)
+        create_mysql_database.create_stored_routines(cur, definer)
+        mydb.commit()
+
+        print("Backfilling the course_card table...")
+        cur.execute("CALL rebuild_course_card()")
+        mydb.commit()
+        cur.execute("SELECT COUNT(*) FROM course_card")
+        print(f"course_card has {cur.fetchone()[0]} courses.")
+    finally:
+        mydb.close()
+
+if (__name__ == "__main__"):
+    while (1):
+        debugPrompt = input("Debug mode? (Y/n): ").lower().strip()
+        if (debugPrompt not in ("y", "n", "")):
+            print("Invalid input", end="\n\n")
+            continue
+        else:
+            debugFlag = True if (debugPrompt != "n") else False
+            break
+
+    try:
+        migrate_course_card(debug=debugFlag)
+        print("Successfully migrated the database, \"coursefinity\"!")
+    except (pymysql.err.Error) as e:
+        print("\nMySQL error caught!")
+        print("More details:")
+        print(e)
@@ -1,11 +1,9 @@
-# import third-party libraries
-from apscheduler.schedulers.background import BackgroundScheduler
-
 # import flask libraries (Third-party libraries)
 from flask import Flask
 from flask.sessions import SecureCookieSessionInterface
 from flask_talisman import Talisman
 from werkzeug.exceptions import HTTPException, default_exceptions
+from itsdangerous import URLSafeTimedSerializer
 
 # import Google Cloud Logging API (third-party library)
 from google.cloud import logging as gcp_logging
@@ -13,13 +11,21 @@ from google.cloud import logging as gcp_logging
 # import local python libraries
 from python_files.classes.Constants import SECRET_CONSTANTS, CONSTANTS
 from python_files.classes.Course import get_readable_category
+from python_files.classes.MaintenanceScheduler import LeaderElectedScheduler
+from python_files.classes.SQLInstrumentation import SQL_METRICS
+from python_files.functions.NormalFunctions import get_mysql_connection, write_log_entry, \
+                                                 rotate_data_encryption_key, create_missing_data_encryption_keys, \
+                                                 HSM_ENTROPY_POOL, PASSWORD_HASHING_EXECUTOR
 from python_files.functions.SQLFunctions import sql_operation
 from python_files.functions.VideoFunctions import delete_unuploaded_video
 
 # import python standard libraries
 from pathlib import Path
 from os import environ
-import logging, hashlib
+from typing import Optional
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import logging, hashlib, atexit
 
 """------------------------------------- START OF WEB APP CONFIGS -------------------------------------"""
 
@@ -31,6 +37,24 @@ class PaymentRequired(HTTPException):
     description = "<p>Payment required.</p>"
 default_exceptions[402] = PaymentRequired
 
+class FallbackKeySessionInterface(SecureCookieSessionInterface):
+    """
+    Session cookie interface that signs with the Flask secret key but also accepts
+    the session cookies signed with the keys in SECRET_KEY_FALLBACKS (like Flask 3.1)
+    so that the sessions stay valid while the workers switch to a rotated secret key.
+    """
+    def get_signing_serializer(self, app:Flask) -> Optional[URLSafeTimedSerializer]:
+        if (not app.secret_key):
+            return None
+
+        # itsdangerous signs with the last key and verifies with any of the keys
+        return URLSafeTimedSerializer(
+            [*app.config.get("SECRET_KEY_FALLBACKS", []), app.secret_key],
+            salt=self.salt,
+            serializer=self.serializer,
+            signer_kwargs={"key_derivation": self.key_derivation, "digest_method": self.digest_method}
+        )
+
 app = Flask(__name__)
 
 # Add the constants objects to the Flask web app
@@ -54,7 +78,7 @@ if (not app.config["CONSTANTS"].DEBUG_MODE):
 #   - HMAC-SHA1:
 #       - https://github.com/pallets/flask/blob/96726f6a04251bde39ec802080c9008060e0b5b9/src/flask/sessions.py#L316
 #       - https://github.com/pallets/itsdangerous/blob/484d5e6d3c613160cb6c9336b9454f3204702e74/src/itsdangerous/signer.py#L67
-FLASK_SESSION_COOKIE_INTERFACE = SecureCookieSessionInterface()
+FLASK_SESSION_COOKIE_INTERFACE = FallbackKeySessionInterface()
 FLASK_SESSION_COOKIE_INTERFACE.salt = app.config["SECRET_CONSTANTS"].get_secret_payload(
     secretID=app.config["CONSTANTS"].FLASK_SALT_KEY_NAME, decodeSecret=False
 )
@@ -191,7 +215,8 @@ app.config["ALLOWED_VIDEO_EXTENSIONS"] = app.config["CONSTANTS"].ALLOWED_VIDEO_E
 # import utility functions into the flask app and get neccessary functions
 # such as update_secret_key() for rotation of the secret key
 with app.app_context():
-    from routes.RoutesUtils import update_secret_key
+    from routes.RoutesUtils import update_secret_key, set_secret_key, remove_expired_secret_key_fallbacks, \
+                                   get_rbac_decision_table, get_admin_ip_allowlist
 
     # Register all app routes
     from routes.SuperAdmin import superAdminBP
@@ -227,123 +252,281 @@ with app.app_context():
 # E.g. Running job "<lambda> (trigger: cron[hour='23', minute='57', second='0'],
 # next run at: 2022-07-11 23:57:00 +08)" (scheduled at 2022-07-10 23:57:00+08:00)
 
-def remove_unverified_users_for_more_than_30_days() -> None:
+def remove_unverified_users_for_more_than_30_days() -> int:
     """Remove unverified users from the database
 
     >>> sql_operation(table="user", mode="remove_unverified_users_more_than_30_days")
     """
-    sql_operation(table="user", mode="remove_unverified_users_more_than_30_days")
+    return sql_operation(table="user", mode="remove_unverified_users_more_than_30_days")
 
-def remove_expired_tokens() -> None:
+def remove_expired_tokens() -> int:
     """Remove expired tokens from the database
 
     >>> sql_operation(table="expirable_token", mode="delete_all_expired_tokens")
     """
-    sql_operation(table="expirable_token", mode="delete_all_expired_tokens")
+    return sql_operation(table="expirable_token", mode="delete_all_expired_tokens")
 
-def remove_expired_sessions() -> None:
+def remove_expired_sessions() -> int:
     """Remove expired sessions from the database
 
     >>> sql_operation(table="session", mode="delete_expired_sessions")
     """
-    sql_operation(table="session", mode="delete_expired_sessions")
+    return sql_operation(table="session", mode="delete_expired_sessions")
 
-def reset_expired_login_attempts() -> None:
+def reset_expired_login_attempts() -> int:
     """Reset expired login attempts for users
 
     >>> sql_operation(table="login_attempts", mode="reset_attempts_past_reset_date")
     """
-    sql_operation(table="login_attempts", mode="reset_attempts_past_reset_date")
+    return sql_operation(table="login_attempts", mode="reset_attempts_past_reset_date")
 
-def remove_last_accessed_more_than_10_days() -> None:
+def remove_last_accessed_more_than_10_days() -> int:
     """Remove last accessed more than 10 days from the database
 
     >>> sql_operation(table="user_ip_addresses", mode="remove_last_accessed_more_than_10_days")
     """
-    sql_operation(table="user_ip_addresses", mode="remove_last_accessed_more_than_10_days")
+    return sql_operation(table="user_ip_addresses", mode="remove_last_accessed_more_than_10_days")
 
-def remove_expired_guard_tokens() -> None:
+def remove_expired_guard_tokens() -> int:
     """Remove expired guard tokens from the database
 
     >>> sql_operation(table="guard_token", mode="remove_expired_tokens")
     """
-    sql_operation(table="guard_token", mode="remove_expired_tokens")
+    return sql_operation(table="guard_token", mode="remove_expired_tokens")
+
+def remove_expired_payment_sessions() -> int:
+    """Remove Stripe checkout sessions that were not paid within 2 hours from the database
+
+    >>> sql_operation(table="stripe_payments", mode="delete_expired_payment_sessions")
+    """
+    return sql_operation(table="stripe_payments", mode="delete_expired_payment_sessions")
+
+def rotate_secret_key() -> None:
+    """Rotate the secret key for digitally signing the session cookie
+
+    >>> update_secret_key()
+    """
+    with app.app_context():
+        update_secret_key()
+
+def rotate_data_encryption_keys() -> int:
+    """
+    Rotate the data encryption keys (DEK) used for the envelope encryption of the data in the database and the tokens.
+    The past DEK versions are kept to decrypt the existing data.
+
+    >>> rotate_data_encryption_key(keyID)
+    """
+    for keyID in app.config["CONSTANTS"].ENVELOPE_ENCRYPTION_KEY_IDS:
+        rotate_data_encryption_key(keyID)
+    return len(app.config["CONSTANTS"].ENVELOPE_ENCRYPTION_KEY_IDS)
 
 def check_for_new_session_configs() -> None:
     """
-    Check for any value updates in Google Cloud Platform Secret Manager API
-    if the Flask secret key or the session cookie salt has changed.
+    Check for any new versions in Google Cloud Platform Secret Manager API
+    of the Flask secret key or the session cookie salt.
 
-    If there are changes, update the Flask session cookie configurations.
+    Only the secret version metadata is retrieved unless there is a new version,
+    in which case the Flask session cookie configurations are updated.
+    The previous secret key is still accepted until SECRET_KEY_FALLBACK_DURATION has passed.
     """
-    retrievedKey = app.config["SECRET_CONSTANTS"].get_secret_payload(
-        secretID=app.config["CONSTANTS"].FLASK_SECRET_KEY_NAME, decodeSecret=False
-    )
-    if (retrievedKey != app.config["SECRET_KEY"]):
-        app.config["SECRET_KEY"] = retrievedKey
+    with app.app_context():
+        remove_expired_secret_key_fallbacks()
+        if (app.config["SECRET_CONSTANTS"].refresh_if_new_version(secretID=app.config["CONSTANTS"].FLASK_SECRET_KEY_NAME)):
+            set_secret_key(
+                app.config["SECRET_CONSTANTS"].get_secret_payload(
+                    secretID=app.config["CONSTANTS"].FLASK_SECRET_KEY_NAME, decodeSecret=False
+                )
+            )
+
+    if (app.config["SECRET_CONSTANTS"].refresh_if_new_version(secretID=app.config["CONSTANTS"].FLASK_SALT_KEY_NAME)):
+        app.session_interface.salt = app.config["SECRET_CONSTANTS"].get_secret_payload(
+            secretID=app.config["CONSTANTS"].FLASK_SALT_KEY_NAME, decodeSecret=False
+        )
 
-    retrievedSessionSalt = app.config["SECRET_CONSTANTS"].get_secret_payload(
-        secretID=app.config["CONSTANTS"].FLASK_SALT_KEY_NAME, decodeSecret=False
-    )
-    if (retrievedSessionSalt != app.session_interface.salt):
-        app.session_interface.salt = retrievedSessionSalt
+def refresh_admin_ip_allowlist() -> None:
+    """
+    Check for a new version of the admin IP allowlist in Google Cloud Platform Secret Manager API
+    and recompile the allowlist if there is one, so that admin requests are served from memory.
+    """
+    app.config["SECRET_CONSTANTS"].refresh_if_new_version(secretID=app.config["CONSTANTS"].ADMIN_IP_ALLOWLIST_NAME)
+    with app.app_context():
+        get_admin_ip_allowlist()
+
+def log_sql_metrics() -> None:
+    """Log the SQL latency histograms per SQL operation of this worker since the last time they were logged"""
+    sqlMetrics = SQL_METRICS.get_snapshot(reset=True)
+    if (sqlMetrics):
+        write_log_entry(logMessage={"SQL metrics": sqlMetrics}, severity="INFO")
+
+def log_password_hashing_metrics() -> None:
+    """Log the queue depth and the hash latency of this worker's password hashing executor since the last time they were logged"""
+    passwordHashingStats = PASSWORD_HASHING_EXECUTOR.get_stats(reset=True)
+    if (passwordHashingStats["hash_latency"]["count"] > 0 or passwordHashingStats["rejected"] > 0 or passwordHashingStats["timed_out"] > 0):
+        write_log_entry(
+            logMessage={"Password hashing metrics": passwordHashingStats},
+            severity="WARNING" if (passwordHashingStats["rejected"] > 0 or passwordHashingStats["timed_out"] > 0) else "INFO"
+        )
 
-"""------------------------------------- END OF WEB APP SCHEDULED JOBS -------------------------------------"""
+def refill_hsm_entropy_pool() -> None:
+    """
+    Top up this worker's pool of random bytes from GCP KMS Cloud HSM and
+    log the pool's stats if any caller had to fall back to the secrets library since the last refill
+    """
+    try:
+        HSM_ENTROPY_POOL.refill()
+    except (Exception) as e:
+        write_log_entry(logMessage=f"Failed to refill the HSM entropy pool: {e}", severity="WARNING")
 
-if (__name__ == "__main__"):
-    # APScheduler docs:
-    # https://apscheduler.readthedocs.io/en/latest/modules/triggers/cron.html
-    scheduler = BackgroundScheduler() # Uses threading to run the task in a separate thread
-    scheduler.configure(timezone="Asia/Singapore") # configure timezone to always follow Singapore's timezone
-
-    # Free up the database of expired guard tokens
-    scheduler.add_job(
-        remove_expired_guard_tokens,
-        trigger="cron", hour=23, minute=54, second=0, id="deleteExpiredGuardTokens"
-    )
-    # Free up database of videos that never got successfully uploaded
-    scheduler.add_job(
-        delete_unuploaded_video,
-        trigger="cron", hour=23, minute=55, second=0, id="removeUnuploadedVideos"
-    )
-    # Free up database of users who have not verified their email for more than 30 days
-    scheduler.add_job(
-        remove_unverified_users_for_more_than_30_days,
-        trigger="cron", hour=23, minute=56, second=0, id="removeUnverifiedUsers"
-    )
-    # Free up the database of expired Tokens
-    scheduler.add_job(
-        remove_expired_tokens,
-        trigger="cron", hour=23, minute=57, second=0, id="deleteExpiredTokens"
-    )
-    # Free up the database of expired sessions
-    scheduler.add_job(
-        remove_expired_sessions,
-        trigger="cron", hour=23, minute=58, second=0, id="deleteExpiredSessions"
-    )
-    # Free up database of expired login attempts
-    scheduler.add_job(
-        reset_expired_login_attempts,
-        trigger="cron", hour=23, minute=59, second=0, id="resetLockedAccounts"
-    )
-    # Remove user's IP address from the database if the the user has not logged in from that IP address for more than 10 days
-    scheduler.add_job(
-        remove_last_accessed_more_than_10_days,
-        trigger="interval", hours=1, id="removeUnusedIPAddresses"
-    )
-    # For key rotation of the secret key for digitally signing the session cookie
-    scheduler.add_job(
-        update_secret_key,
-        trigger="cron", day="last", hour=23, minute=59, second=59, id="updateFlaskSecretKey"
-    )
-    # For checking if the Flask secret key has been manually changed every 30 minutes
-    scheduler.add_job(
-        check_for_new_session_configs,
-        trigger="interval", minutes=30, id="checkForNewSessionConfigs"
+    entropyPoolStats = HSM_ENTROPY_POOL.get_stats(reset=True)
+    if (entropyPoolStats["fallbacks"] > 0 or entropyPoolStats["refill_errors"] > 0):
+        write_log_entry(logMessage={"HSM entropy pool": entropyPoolStats}, severity="NOTICE")
+
+def record_maintenance_job_run(runDetails:dict) -> None:
+    """
+    Log and save the duration and the number of rows affected of a maintenance job
+    that was run by the elected leader.
+
+    Args:
+    - runDetails (dict): The run details from LeaderElectedScheduler
+    """
+    write_log_entry(
+        logMessage={
+            "Maintenance job": runDetails["job_id"],
+            "Status": runDetails["status"],
+            "Duration (ms)": runDetails["duration_ms"],
+            "Rows affected": runDetails["rows_affected"],
+            "Error": runDetails["error_message"],
+            "Leader": runDetails["leader"]
+        },
+        severity="INFO" if (runDetails["status"] == "success") else "ERROR"
     )
-    # Start all the scheduled jobs
+    sql_operation(table="maintenance_job_run", mode="insert", runDetails=runDetails)
+
+# The scheduler is started in every gunicorn worker by start_scheduler() (see gunicorn.conf.py), not on import.
+# The maintenance jobs only run on the worker that holds the MySQL leader lock (across all workers and instances)
+# whereas the jobs that refresh the in-memory configurations run on every worker.
+# APScheduler docs:
+# https://apscheduler.readthedocs.io/en/latest/modules/triggers/cron.html
+scheduler = LeaderElectedScheduler(
+    connectionFactory=get_mysql_connection,
+    lockName=app.config["CONSTANTS"].MAINTENANCE_LEADER_LOCK_NAME,
+    electionInterval=app.config["CONSTANTS"].MAINTENANCE_LEADER_ELECTION_INTERVAL,
+    onJobRun=record_maintenance_job_run,
+    timezone="Asia/Singapore" # configure timezone to always follow Singapore's timezone
+)
+
+# Free up the database of expired guard tokens
+scheduler.add_leader_job(
+    remove_expired_guard_tokens,
+    trigger="cron", hour=23, minute=54, second=0, id="deleteExpiredGuardTokens"
+)
+# Free up database of videos that never got successfully uploaded
+scheduler.add_leader_job(
+    delete_unuploaded_video,
+    trigger="cron", hour=23, minute=55, second=0, id="removeUnuploadedVideos"
+)
+# Free up database of users who have not verified their email for more than 30 days
+scheduler.add_leader_job(
+    remove_unverified_users_for_more_than_30_days,
+    trigger="cron", hour=23, minute=56, second=0, id="removeUnverifiedUsers"
+)
+# Free up the database of expired Tokens
+scheduler.add_leader_job(
+    remove_expired_tokens,
+    trigger="cron", hour=23, minute=57, second=0, id="deleteExpiredTokens"
+)
+# Free up the database of expired sessions
+scheduler.add_leader_job(
+    remove_expired_sessions,
+    trigger="cron", hour=23, minute=58, second=0, id="deleteExpiredSessions"
+)
+# Free up database of expired login attempts
+scheduler.add_leader_job(
+    reset_expired_login_attempts,
+    trigger="cron", hour=23, minute=59, second=0, id="resetLockedAccounts"
+)
+# Remove user's IP address from the database if the the user has not logged in from that IP address for more than 10 days
+scheduler.add_leader_job(
+    remove_last_accessed_more_than_10_days,
+    trigger="interval", hours=1, id="removeUnusedIPAddresses"
+)
+# Free up the database of Stripe checkout sessions that were never paid
+scheduler.add_leader_job(
+    remove_expired_payment_sessions,
+    trigger="interval", hours=1, id="deleteExpiredPaymentSessions"
+)
+# For key rotation of the secret key for digitally signing the session cookie
+scheduler.add_leader_job(
+    rotate_secret_key,
+    trigger="cron", day="last", hour=23, minute=59, second=59, id="updateFlaskSecretKey"
+)
+# For creating the data encryption keys for envelope encryption if they do not exist yet
+# (after the first leader election which runs when the scheduler starts)
+scheduler.add_leader_job(
+    create_missing_data_encryption_keys,
+    trigger="date", run_date=datetime.now(tz=ZoneInfo("Asia/Singapore")) + timedelta(seconds=60),
+    id="createMissingDataEncryptionKeys"
+)
+# For key rotation of the data encryption keys for envelope encryption
+scheduler.add_leader_job(
+    rotate_data_encryption_keys,
+    trigger="cron", day=1, hour=0, minute=30, second=0, id="rotateDataEncryptionKeys"
+)
+# For checking if the Flask secret key has been manually changed (or rotated by the leader) every 30 minutes
+scheduler.add_worker_job(
+    check_for_new_session_configs,
+    trigger="interval", minutes=30, id="checkForNewSessionConfigs"
+)
+# For switching every worker to the Flask secret key rotated by the leader (at the end of the month)
+# within seconds instead of waiting for the 30 minutes check
+scheduler.add_worker_job(
+    check_for_new_session_configs,
+    trigger="cron", day=1, hour=0, minute="0-4",
+    second=f"*/{app.config['CONSTANTS'].SECRET_KEY_ROTATION_CHECK_INTERVAL}", id="checkForRotatedSecretKey"
+)
+# For refreshing the admin IP allowlist every 5 minutes
+scheduler.add_worker_job(
+    refresh_admin_ip_allowlist,
+    trigger="interval", minutes=5, id="refreshAdminIPAllowlist"
+)
+# For logging the SQL latency histograms of each worker
+scheduler.add_worker_job(
+    log_sql_metrics,
+    trigger="interval", minutes=app.config["CONSTANTS"].SQL_METRICS_LOG_INTERVAL, id="logSQLMetrics"
+)
+# For logging the queue depth and hash latency of each worker's password hashing executor
+scheduler.add_worker_job(
+    log_password_hashing_metrics,
+    trigger="interval", minutes=app.config["CONSTANTS"].PASSWORD_HASHING_METRICS_LOG_INTERVAL, id="logPasswordHashingMetrics"
+)
+# For filling this worker's pool of random bytes from GCP KMS Cloud HSM on start-up and topping it up every minute
+scheduler.add_worker_job(
+    refill_hsm_entropy_pool,
+    trigger="interval", minutes=app.config["CONSTANTS"].HSM_ENTROPY_POOL_REFILL_INTERVAL, id="refillHSMEntropyPool",
+    next_run_time=datetime.now(tz=ZoneInfo("Asia/Singapore"))
+)
+def start_scheduler() -> None:
+    """
+    Warm up this worker's in-memory configurations and start the scheduled jobs
+    (including the maintenance leader election) which releases the leader lock when the worker exits.
+
+    Called by gunicorn's post_worker_init hook in every worker (see gunicorn.conf.py)
+    or when running app.py directly, so importing the app (e.g. in the tests or scripts) does not start it.
+    """
+    with app.app_context():
+        # Compile the RBAC decision table from the roles and
+        # the registered endpoints before serving any requests
+        get_rbac_decision_table()
+
+        # Load the admin IP allowlist so that the first admin request does not wait for Secret Manager API
+        get_admin_ip_allowlist()
+
     scheduler.start()
+    atexit.register(scheduler.shutdown)
+
+"""------------------------------------- END OF WEB APP SCHEDULED JOBS -------------------------------------"""
 
+if (__name__ == "__main__"):
     if (app.config["DEBUG_FLAG"]):
         SSL_CONTEXT = (
             CONSTANTS.CONFIG_FOLDER_PATH.joinpath("flask-cert.pem"),
@@ -354,4 +537,5 @@ if (__name__ == "__main__"):
         SSL_CONTEXT = None
         host = "0.0.0.0"
 
+    start_scheduler()
     app.run(debug=app.config["DEBUG_FLAG"], host=host, port=int(environ.get("PORT", 8080)), ssl_context=SSL_CONTEXT)
\ No newline at end of file
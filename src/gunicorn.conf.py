@@ -0,0 +1,11 @@
+"""
+Gunicorn configurations for the web app (read from the working directory by gunicorn).
+
+The scheduled jobs and the maintenance leader election are started in each worker
+after the web app is loaded instead of as a side effect of importing the web app.
+"""
+
+def post_worker_init(worker) -> None:
+    """Called by gunicorn in each worker after the web app (app:app) has been loaded"""
+    from app import start_scheduler
+    start_scheduler()
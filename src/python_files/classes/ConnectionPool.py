@@ -0,0 +1,292 @@
+# import python standard libraries
+import threading
+from time import monotonic
+from collections import deque
+from typing import Callable, Optional
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# import third party libraries
+import pymysql
+from pymysql.connections import Connection as MySQLConnection
+
+# import local python libraries
+from .Errors import ConnectionPoolExhaustedError
+
+@dataclass
+class PooledConnection:
+    """This dataclass is used to store a MySQL connection with its pool bookkeeping."""
+    connection: MySQLConnection
+    createdAt: float = field(default_factory=monotonic)
+    lastUsedAt: float = field(default_factory=monotonic)
+
+class MySQLConnectionPool:
+    """
+    A bounded and thread-safe MySQL connection pool.
+
+    Connections are lazily created by the connection factory and are kept in a LIFO
+    stack so that the most recently used connections are handed out first while the
+    rest of them can age out.
+
+    A thread that already borrowed a connection will get the same connection back
+    if it borrows again (e.g. when sql_operation() is called within another sql_operation()),
+    so that a thread never holds more than one connection from the pool at a time.
+    """
+    def __init__(
+        self,
+        connectionFactory:Callable[[], MySQLConnection]=None,
+        maxSize:int=16,
+        acquireTimeout:float=10,
+        maxConnectionAge:float=1800,
+        maxIdleTime:float=300,
+        pingAfterIdle:float=30
+    ):
+        """
+        Constructor for the MySQL connection pool.
+
+        Args:
+        - connectionFactory (Callable): A function that returns a new MySQL connection.
+        - maxSize (int): The maximum number of connections that can be opened by the pool.
+        - acquireTimeout (float): The number of seconds to wait for a connection before raising an error.
+        - maxConnectionAge (float): The number of seconds before a connection is closed and replaced.
+        - maxIdleTime (float): The number of seconds a connection can be idle before it is closed.
+        - pingAfterIdle (float): The number of seconds a connection can be idle before it is
+                                 pinged to check if it is still alive before being handed out.
+        """
+        if (connectionFactory is None):
+            raise ValueError("connectionFactory must be defined!")
+        if (maxSize < 1):
+            raise ValueError("maxSize must be greater than 0!")
+
+        self.__connectionFactory = connectionFactory
+        self.__maxSize = maxSize
+        self.__acquireTimeout = acquireTimeout
+        self.__maxConnectionAge = maxConnectionAge
+        self.__maxIdleTime = maxIdleTime
+        self.__pingAfterIdle = pingAfterIdle
+
+        self.__slots = threading.BoundedSemaphore(maxSize)
+        self.__lock = threading.Lock()
+        self.__idleConnections: deque[PooledConnection] = deque()
+        self.__inUseCount = 0
+        self.__threadLocal = threading.local()
+        self.__stats = {
+            "created": 0,
+            "reused": 0,
+            "recycled": 0,
+            "idle_closed": 0,
+            "failed_health_checks": 0,
+            "discarded": 0,
+            "timeouts": 0,
+            "total_wait_seconds": 0.0
+        }
+
+    def __increment_stat(self, statName:str, value:float=1) -> None:
+        with self.__lock:
+            self.__stats[statName] += value
+
+    def __is_expired(self, pooledConnection:PooledConnection, now:float) -> Optional[str]:
+        """Returns the name of the stat to increment if the connection should be closed, else None."""
+        if (now - pooledConnection.createdAt > self.__maxConnectionAge):
+            return "recycled"
+        if (now - pooledConnection.lastUsedAt > self.__maxIdleTime):
+            return "idle_closed"
+        return None
+
+    @staticmethod
+    def __close(pooledConnection:PooledConnection) -> None:
+        try:
+            pooledConnection.connection.close()
+        except (pymysql.err.Error):
+            # Connection is already closed or broken
+            pass
+
+    def __take_idle_connection(self) -> Optional[PooledConnection]:
+        """Pops idle connections until a usable one is found, returns None if there are none left."""
+        while (1):
+            with self.__lock:
+                pooledConnection = self.__idleConnections.pop() if (self.__idleConnections) else None
+            if (pooledConnection is None):
+                return None
+
+            now = monotonic()
+            expiredStat = self.__is_expired(pooledConnection, now)
+            if (expiredStat is not None):
+                self.__close(pooledConnection)
+                self.__increment_stat(expiredStat)
+                continue
+
+            if (now - pooledConnection.lastUsedAt > self.__pingAfterIdle):
+                try:
+                    pooledConnection.connection.ping(reconnect=False)
+                except (pymysql.err.Error):
+                    self.__close(pooledConnection)
+                    self.__increment_stat("failed_health_checks")
+                    continue
+
+            return pooledConnection
+
+    def get_connection(self) -> MySQLConnection:
+        """
+        Borrow a connection from the pool.
+
+        The connection MUST be returned with release_connection() after use.
+
+        Returns:
+        - A MySQL connection
+
+        Raises:
+        - ConnectionPoolExhaustedError: If no connection is available before the acquire timeout
+        - pymysql.err.OperationalError: If a new connection could not be opened
+        """
+        heldConnection = getattr(self.__threadLocal, "pooledConnection", None)
+        if (heldConnection is not None):
+            self.__threadLocal.depth += 1
+            return heldConnection.connection
+
+        startTime = monotonic()
+        if (not self.__slots.acquire(timeout=self.__acquireTimeout)):
+            self.__increment_stat("timeouts")
+            raise ConnectionPoolExhaustedError(
+                f"No MySQL connection was available after waiting for {self.__acquireTimeout} seconds!"
+            )
+        self.__increment_stat("total_wait_seconds", monotonic() - startTime)
+
+        try:
+            pooledConnection = self.__take_idle_connection()
+            if (pooledConnection is None):
+                pooledConnection = PooledConnection(connection=self.__connectionFactory())
+                self.__increment_stat("created")
+            else:
+                self.__increment_stat("reused")
+        except:
+            self.__slots.release()
+            raise
+
+        with self.__lock:
+            self.__inUseCount += 1
+        self.__threadLocal.pooledConnection = pooledConnection
+        self.__threadLocal.depth = 1
+        return pooledConnection.connection
+
+    def release_connection(self, connection:MySQLConnection) -> None:
+        """
+        Return a connection borrowed from get_connection() to the pool.
+
+        Any transaction that was not committed will be rolled back so that the next borrower
+        starts with a clean connection. Broken connections are closed instead of being reused.
+
+        Args:
+        - connection (MySQLConnection): The connection that was borrowed
+        """
+        pooledConnection = getattr(self.__threadLocal, "pooledConnection", None)
+        if (pooledConnection is None or pooledConnection.connection is not connection):
+            raise ValueError("The connection was not borrowed from this pool by the current thread!")
+
+        self.__threadLocal.depth -= 1
+        if (self.__threadLocal.depth > 0):
+            return
+        self.__threadLocal.pooledConnection = None
+
+        try:
+            discard = not connection.open
+            if (not discard):
+                connection.rollback()
+        except (pymysql.err.Error):
+            discard = True
+
+        now = monotonic()
+        if (discard):
+            self.__close(pooledConnection)
+            self.__increment_stat("discarded")
+        elif (now - pooledConnection.createdAt > self.__maxConnectionAge):
+            self.__close(pooledConnection)
+            self.__increment_stat("recycled")
+        else:
+            pooledConnection.lastUsedAt = now
+            with self.__lock:
+                self.__idleConnections.append(pooledConnection)
+
+        with self.__lock:
+            self.__inUseCount -= 1
+        self.__slots.release()
+
+    @contextmanager
+    def connection(self) -> MySQLConnection:
+        """
+        Context manager to borrow a connection from the pool and return it afterwards.
+
+        Usage example:
+        >>> with pool.connection() as con:
+        ...     con.cursor().execute("SELECT 1")
+        """
+        connection = self.get_connection()
+        try:
+            yield connection
+        finally:
+            self.release_connection(connection)
+
+    def close_idle_connections(self) -> None:
+        """Close all idle connections in the pool, e.g. when the worker is shutting down."""
+        with self.__lock:
+            idleConnections = list(self.__idleConnections)
+            self.__idleConnections.clear()
+        for pooledConnection in idleConnections:
+            self.__close(pooledConnection)
+
+    def get_stats(self) -> dict:
+        """
+        Returns a snapshot of the connection pool statistics.
+
+        E.g.
+        {
+            "max_size": 16, "in_use": 2, "idle": 3, "created": 5, "reused": 120,
+            "recycled": 0, "idle_closed": 1, "failed_health_checks": 0,
+            "discarded": 0, "timeouts": 0, "total_wait_seconds": 0.01
+        }
+        """
+        with self.__lock:
+            stats = self.__stats.copy()
+            stats["in_use"] = self.__inUseCount
+            stats["idle"] = len(self.__idleConnections)
+        stats["max_size"] = self.__maxSize
+        return stats
+
+    @property
+    def maxSize(self) -> int:
+        return self.__maxSize
+
+class UnitOfWorkConnection:
+    """
+    Wraps a MySQL connection that is shared by all the SQL operations in a request.
+
+    Calls to commit() by the SQL operations are deferred so that the request's
+    writes are committed in a single transaction at the end of the request (see commit_pending()).
+    All other attributes are delegated to the wrapped connection.
+    """
+    def __init__(self, connection:MySQLConnection):
+        self.__connection = connection
+        self.__hasPendingCommit = False
+
+    def cursor(self, *args, **kwargs) -> pymysql.cursors.Cursor:
+        return self.__connection.cursor(*args, **kwargs)
+
+    def commit(self) -> None:
+        """Defers the commit to the end of the request."""
+        self.__hasPendingCommit = True
+
+    def commit_pending(self) -> None:
+        """Commits the deferred commits of the request on the wrapped connection."""
+        self.__connection.commit()
+        self.__hasPendingCommit = False
+
+    def __getattr__(self, name:str):
+        return getattr(self.__connection, name)
+
+    @property
+    def connection(self) -> MySQLConnection:
+        return self.__connection
+
+    @property
+    def hasPendingCommit(self) -> bool:
+        return self.__hasPendingCommit
@@ -1,7 +1,8 @@
 # import python standard libraries
-import pathlib, json, re
+import pathlib, json, re, threading
 from sys import exit as sysExit
-from typing import Union
+from time import monotonic
+from typing import Union, Optional
 from dataclasses import dataclass, field
 
 # import third party libraries
@@ -44,6 +45,32 @@ class Constants:
     NEGATIVE_PAGE_NUM_REGEX: re.Pattern[str] = re.compile(r"p=-\d+")
     PAGE_NUM_REGEX: re.Pattern[str] = re.compile(r"p=\d+")
 
+    # For caching the total number of rows of the paginated listings (e.g. search results)
+    PAGINATION_COUNT_CACHE_TTL: int = 60 # 1 min
+    PAGINATION_COUNT_CACHE_MAX_SIZE: int = 1024
+
+    # For caching the home and teacher page course carousels (without the user's purchased/in cart flags)
+    COURSE_CAROUSEL_CACHE_TTL: int = 30 # 30 secs
+    COURSE_CAROUSEL_CACHE_MAX_SIZE: int = 512
+
+    # For the per-worker cache of the (user ID, IP address) pairs whose last_accessed was recently updated
+    # so that repeated logins from a known IP address skip the write.
+    # The TTL is the staleness window of last_accessed and must be well within the 10 days that IP addresses are kept.
+    KNOWN_IP_ADDRESS_CACHE_TTL: int = 3600 # 1 hour
+    KNOWN_IP_ADDRESS_CACHE_MAX_SIZE: int = 10000
+
+    # For the FULLTEXT course search (follows MySQL's default innodb_ft_min_token_size)
+    SEARCH_TERM_REGEX: re.Pattern[str] = re.compile(r"\w+")
+    FULLTEXT_MIN_TOKEN_SIZE: int = 3
+    FULLTEXT_MAX_SEARCH_TERMS: int = 10
+    # MySQL InnoDB's default stopwords (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD)
+    # which would otherwise cause required terms in the boolean mode search query to match nothing
+    FULLTEXT_STOPWORDS: frozenset = frozenset((
+        "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en", "for", "from", "how", "i", "in", "is",
+        "it", "la", "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "who", "will",
+        "with", "und", "www"
+    ))
+
     # custom domain
     CUSTOM_DOMAIN: str = "https://127.0.0.1:8080" if (DEBUG_MODE) else "https://coursefinity.social"
 
@@ -51,6 +78,7 @@ class Constants:
     BLUEPRINT_ENDPOINT_REGEX: re.Pattern[str] = re.compile(r"^[\w]+(.)[\w]+$")
     BLUEPRINT_ORDER_TUPLE: tuple = ("guestBP", "generalBP", "adminBP", "loggedInBP", "errorBP", "teacherBP", "userBP", "superAdminBP")
     ROLE_NAME_ORDER_TUPLE: tuple = ("Student", "Teacher", "Admin", "SuperAdmin", "Guest")
+    RBAC_VERSION_CHECK_INTERVAL: int = 15 # 15 secs between checking if the roles were updated by another worker
 
     # For custom redirects after RBAC checks instead of the default abort(404)
     # Available blueprints: generalBP, guestBP, errorBP, loggedInBP, teacherBP, userBP, adminBP, superAdminBP
@@ -91,8 +119,9 @@ class Constants:
     MAX_LOGIN_ATTEMPTS: int = 8
 
     # For removing session identifiers that has no activity for more than x mins 
-    # (Expiry date will be updated per request to the web application)
+    # (Expiry date will be updated at most once every SESSION_EXPIRY_EXTENSION_INTERVAL mins)
     SESSION_EXPIRY_INTERVALS: int = 90 # 1 hour and 30 mins
+    SESSION_EXPIRY_EXTENSION_INTERVAL: int = 5 # 5 mins
 
     # Duration (in minutes) for locked accounts
     # before user can try to login again
@@ -154,6 +183,15 @@ class Constants:
     # More helpful details on choosing the parameters for argon2id:
     # https://www.ory.sh/choose-recommended-argon2-parameters-password-hashing/#argon2s-cryptographic-password-hashing-parameters
     # https://www.twelve21.io/how-to-choose-the-right-parameters-for-argon2/
+    # To calibrate the parameters on the target machine, run test/cryptographic_failure/argon2_config.py
+    # Note: The users' hashes are upgraded to the new parameters on their next login (see the "login" mode of user_sql_operation())
+
+    # For the bounded Argon2 hashing executor (one per gunicorn worker) so that hashing
+    # cannot take up every gunicorn thread and the memory used is at most 2 x 64MiB per worker
+    PASSWORD_HASHING_MAX_CONCURRENCY: int = 2       # Number of hashes run at the same time
+    PASSWORD_HASHING_MAX_QUEUE_SIZE: int = 6        # Number of hashes waiting before the requests are rejected
+    PASSWORD_HASHING_QUEUE_DEADLINE: float = 2      # 2 secs waiting for a hashing thread before responding with 503
+    PASSWORD_HASHING_METRICS_LOG_INTERVAL: int = 15 # 15 mins between logging the queue depth and hash latency
     # https://argon2-cffi.readthedocs.io/en/stable/parameters.html
 
     # for Google Cloud API
@@ -163,10 +201,16 @@ class Constants:
     # from Google Secret Manager API
     FLASK_SECRET_KEY_NAME: str = "flask-secret-key"
     FLASK_SALT_KEY_NAME: str = "flask-session-salt"
+    ADMIN_IP_ALLOWLIST_NAME: str = "ip-address-whitelist" # JSON array of IP addresses or CIDR ranges
 
     # For Flask session cookie
     SESSION_NUM_OF_BYTES: int = 512
     SALT_NUM_OF_BYTES: int = 64
+    # Seconds that the previous Flask secret key is still accepted after switching to a new key
+    # (for the workers that have not switched yet and the CSRF tokens of the forms opened before the switch)
+    SECRET_KEY_FALLBACK_DURATION: int = 3600
+    # Seconds between the checks for the rotated Flask secret key in the minutes after the monthly rotation
+    SECRET_KEY_ROTATION_CHECK_INTERVAL: int = 5
 
     # For Stripe API
     STRIPE_PUBLIC_KEY: str = "pk_test_51LD90SEQ13luXvBj7mFXNdvH08TWzZ477fvvR82HNOriieL7nj230ZhWVFjLTczJVNcDx5oKUOMZuvkkrXUXxKMS00WKMQ3hDu"
@@ -178,6 +222,12 @@ class Constants:
     # For Google Gmail API
     GOOGLE_TOKEN_NAME: str = "google-token"
 
+    # For the in-memory cache of the secrets retrieved from Google Secret Manager API
+    SECRET_CACHE_TTL: int = 300         # 5 mins before a cached secret is refreshed
+    SECRET_CACHE_STALE_TTL: int = 1800  # 30 mins after the TTL where the stale secret
+                                        # is still served while it is refreshed in the background
+    SECRET_CACHE_MISSING_TTL: int = 30  # 30 secs before a secret (version) that was not found is retrieved again
+
     # For Google reCAPTCHA API
     COURSEFINITY_SITE_KEY: str = "6Lc4X8EgAAAAAHxgPuly7X-soqiIZjU6-PBbkXsw"
 
@@ -193,12 +243,54 @@ class Constants:
     COOKIE_ENCRYPTION_KEY_ID: str = "cookie-key"
     TOKEN_ENCRYPTION_KEY_ID: str = "token-key"
 
+    # For envelope encryption where the data is encrypted locally using AES-GCM with a data encryption key (DEK)
+    # that is wrapped by the KMS key and stored in Secret Manager API as the secret, "<KMS key ID>-dek".
+    # Each secret version is a version of the DEK and the DEKs are rotated by the maintenance scheduler.
+    ENVELOPE_ENCRYPTION_KEY_IDS: tuple = (PEPPER_KEY_ID, SENSITIVE_DATA_KEY_ID, TOKEN_ENCRYPTION_KEY_ID)
+    ENVELOPE_DEK_SECRET_SUFFIX: str = "-dek"
+    ENVELOPE_CIPHERTEXT_PREFIX: bytes = b"CFE\x01" # format marker and version of the envelope ciphertext header
+    # Min. seconds between refreshes of the latest DEK version when a ciphertext has a newer DEK version
+    # (rotated by another worker or forged) to limit the calls to Secret Manager API
+    DEK_VERSION_REFRESH_INTERVAL: int = 30
+
+    # For the stateless URL tokens in the emails which are sealed with the token-key's DEK (see generate_url_token())
+    # and verified locally, the single-use is enforced by the used_url_token table.
+    # Note: "recover_account" tokens are still stored in the expirable_token table as they can be revoked by an admin.
+    URL_TOKEN_PURPOSES: tuple = ("verify_email", "reset_password", "unlock_account")
+    URL_TOKEN_PAYLOAD_PREFIX: bytes = b"\x01" # format version, never the first byte of the base85 encoded legacy tokens
+
     # For Google MySQL Cloud API
     SQL_INSTANCE_LOCATION: str = "coursefinity-339412:asia-southeast1:coursefinity-mysql"
 
     # for SQL connection configuration
     DATABASE_NAME: str = "coursefinity"
 
+    # For the MySQL connection pool (one pool per gunicorn worker)
+    SQL_POOL_MAX_SIZE: int = 16             # Same as the number of gunicorn threads per worker
+    SQL_POOL_ACQUIRE_TIMEOUT: int = 10      # 10 seconds before giving up on borrowing a connection
+    SQL_POOL_MAX_CONNECTION_AGE: int = 1800 # 30 mins before a connection is recycled
+    SQL_POOL_MAX_IDLE_TIME: int = 300       # 5 mins before an idle connection is closed
+    SQL_POOL_PING_AFTER_IDLE: int = 30      # Ping connections that have been idle for more than 30 seconds
+
+    # For the pool of random bytes from GCP KMS Cloud HSM (one pool per gunicorn worker)
+    KMS_RANDOM_BYTES_MAX_LENGTH: int = 1024          # Maximum number of random bytes per GCP KMS RNG Cloud HSM API call
+    HSM_ENTROPY_POOL_HIGH_WATER_MARK: int = 16384    # Refilled up to 16KiB (16 API calls per refill)
+    HSM_ENTROPY_POOL_LOW_WATER_MARK: int = 4096      # Refilled in the background once it drops below 4KiB
+    HSM_ENTROPY_POOL_REFILL_INTERVAL: int = 1        # 1 min between the scheduled refills and logging the pool's stats
+
+    # For the SQL query instrumentation
+    SQL_SLOW_QUERY_THRESHOLD_MS: int = 200  # Queries slower than 200ms are logged
+    SQL_METRICS_LOG_INTERVAL: int = 15      # 15 mins between logging the SQL latency histograms of each worker
+
+    # For the maintenance jobs which only run on the worker that holds the MySQL leader lock
+    MAINTENANCE_LEADER_LOCK_NAME: str = "coursefinity_maintenance_leader"
+    MAINTENANCE_LEADER_ELECTION_INTERVAL: int = 30 # 30 secs between the workers trying to become the leader
+
+    # For the chunked deletes of the maintenance jobs so that each transaction only locks a batch of rows
+    PURGE_BATCH_SIZE: int = 1000            # rows deleted per transaction
+    PURGE_USER_BATCH_SIZE: int = 100        # smaller as deleting a user cascades to the user's rows in other tables
+    PURGE_BATCH_SLEEP: float = 0.05         # 50ms between the batches for other transactions to acquire the locks
+
     # For Google Cloud Storage API
     PUBLIC_BUCKET_NAME: str = "coursefinity"
     COURSE_VIDEOS_BUCKET_NAME: str = "coursefinity-videos"
@@ -272,17 +364,13 @@ class SecretConstants:
 
     """------------------------ START OF FUNCTION FOR GETTING DATA FROM GCP SECRET MANAGER API ------------------------"""
 
-    def get_secret_payload(self, secretID:str="", versionID:str="latest", decodeSecret:bool=True) -> Union[str, bytes]:
+    def __fetch_secret(self, secretID:str, versionID:str) -> Optional[dict]:
         """
-        Get the secret payload from Google Cloud Secret Manager API.
-        
-        Args:
-        - secretID (str): The ID of the secret.
-        - versionID (str): The version ID of the secret.
-        - decodeSecret (bool): If true, decode the returned secret bytes payload to string type.
-        
+        Retrieve the secret payload from Google Cloud Secret Manager API without using the cache.
+
         Returns:
-        - secretPayload (str|bytes): the secret payload
+        - A dict with the secret payload bytes, the resolved secret version name and the time it was fetched
+        - None if the secret version is not found
         """
         # construct the resource name of the secret version
         secretName = self.__SM_CLIENT.secret_version_path(CONSTANTS.GOOGLE_PROJECT_ID, secretID, versionID)
@@ -296,15 +384,177 @@ class SecretConstants:
             print(e, end="\n\n")
             return
 
+        return {"payload": response.payload.data, "version_name": response.name, "fetched_at": monotonic()}
+
+    def __refresh_secret(self, cacheKey:tuple) -> Optional[dict]:
+        """
+        Fetch the secret and store it in the cache.
+
+        Concurrent refreshes of the same secret are coalesced into a single
+        Google Secret Manager API call where the other threads will wait for it to complete.
+        """
+        with self.__cacheLock:
+            fetchEvent = self.__inFlightFetches.get(cacheKey)
+            isFetcher = (fetchEvent is None)
+            if (isFetcher):
+                fetchEvent = self.__inFlightFetches[cacheKey] = threading.Event()
+
+        if (not isFetcher):
+            fetchEvent.wait()
+            with self.__cacheLock:
+                return self.__secretCache.get(cacheKey)
+
+        try:
+            cacheEntry = self.__fetch_secret(*cacheKey)
+            with self.__cacheLock:
+                if (cacheEntry is not None):
+                    self.__secretCache[cacheKey] = cacheEntry
+                    self.__missingSecrets.pop(cacheKey, None)
+                else:
+                    self.__secretCache.pop(cacheKey, None)
+                    self.__missingSecrets[cacheKey] = monotonic()
+            return cacheEntry
+        finally:
+            with self.__cacheLock:
+                self.__inFlightFetches.pop(cacheKey, None)
+            fetchEvent.set()
+
+    def __refresh_secret_in_background(self, cacheKey:tuple) -> None:
+        """Refresh the stale secret in a background thread unless it is already being refreshed."""
+        with self.__cacheLock:
+            if (cacheKey in self.__inFlightFetches):
+                return
+
+        def refresh() -> None:
+            try:
+                self.__refresh_secret(cacheKey)
+            except (GoogleErrors.GoogleAPIError) as e:
+                # keep serving the stale secret until the next refresh attempt
+                print(f"Error caught when refreshing the secret, {cacheKey[0]}:")
+                print(e, end="\n\n")
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def get_secret_payload(
+        self, secretID:str="", versionID:str="latest", decodeSecret:bool=True, useCache:bool=True,
+        returnVersionID:bool=False
+    ) -> Union[str, bytes, tuple]:
+        """
+        Get the secret payload from Google Cloud Secret Manager API.
+
+        The secret payload is cached in memory for SECRET_CACHE_TTL seconds.
+        After which, the stale payload is still returned for SECRET_CACHE_STALE_TTL seconds
+        while it is being refreshed in the background.
+        Specific secret versions (e.g. "2") are immutable and will not be refreshed.
+        Secrets that were not found are cached as missing for SECRET_CACHE_MISSING_TTL seconds.
+
+        Args:
+        - secretID (str): The ID of the secret.
+        - versionID (str): The version ID of the secret.
+        - decodeSecret (bool): If true, decode the returned secret bytes payload to string type.
+        - useCache (bool): If false, retrieve the secret from Google Cloud Secret Manager API directly.
+        - returnVersionID (bool): If true, also return the resolved version ID of the secret (e.g. "3" for "latest").
+
+        Returns:
+        - secretPayload (str|bytes): the secret payload
+        - or (secretPayload, versionID) if returnVersionID is True
+        """
+        cacheKey = (secretID, str(versionID))
+        if (not useCache):
+            cacheEntry = self.__fetch_secret(*cacheKey)
+        else:
+            with self.__cacheLock:
+                cacheEntry = self.__secretCache.get(cacheKey)
+                isMissing = (
+                    cacheEntry is None and
+                    monotonic() - self.__missingSecrets.get(cacheKey, float("-inf")) < CONSTANTS.SECRET_CACHE_MISSING_TTL
+                )
+
+            if (cacheEntry is None):
+                # the secrets that were not found recently are not retrieved again until SECRET_CACHE_MISSING_TTL has passed
+                if (not isMissing):
+                    cacheEntry = self.__refresh_secret(cacheKey)
+            elif (cacheKey[1] == "latest"):
+                secretAge = monotonic() - cacheEntry["fetched_at"]
+                if (secretAge > CONSTANTS.SECRET_CACHE_TTL + CONSTANTS.SECRET_CACHE_STALE_TTL):
+                    cacheEntry = self.__refresh_secret(cacheKey)
+                elif (secretAge > CONSTANTS.SECRET_CACHE_TTL):
+                    self.__refresh_secret_in_background(cacheKey)
+
+        if (cacheEntry is None):
+            return (None, None) if (returnVersionID) else None
+
         # return the secret payload
-        secret = response.payload.data
-        return secret.decode("utf-8") if (decodeSecret) else secret
+        secret = cacheEntry["payload"]
+        secret = secret.decode("utf-8") if (decodeSecret) else secret
+        if (returnVersionID):
+            return secret, cacheEntry["version_name"].rsplit("/", 1)[-1]
+        return secret
+
+    def invalidate_secret(self, secretID:Optional[str]=None, versionID:Optional[str]=None) -> None:
+        """
+        Remove secrets from the in-memory cache so that they will be
+        retrieved from Google Cloud Secret Manager API on the next access.
+
+        Args:
+        - secretID (str, Optional): The ID of the secret.
+            - Default: None, will remove all cached secrets.
+        - versionID (str, Optional): The version ID of the secret.
+            - Default: None, will remove all cached versions of the secret.
+        """
+        with self.__cacheLock:
+            for cache in (self.__secretCache, self.__missingSecrets):
+                if (secretID is None):
+                    cache.clear()
+                elif (versionID is not None):
+                    cache.pop((secretID, str(versionID)), None)
+                else:
+                    for cacheKey in [key for key in cache if (key[0] == secretID)]:
+                        del cache[cacheKey]
+
+    def refresh_if_new_version(self, secretID:str="", versionID:str="latest") -> bool:
+        """
+        Check if the secret has a different version from the cached version by only retrieving
+        the secret version's metadata from Google Cloud Secret Manager API.
+        If it does, the cached secret payload will be refreshed.
+
+        Args:
+        - secretID (str): The ID of the secret.
+        - versionID (str): The version ID of the secret.
+
+        Returns:
+        - True if the cached secret payload was refreshed, False otherwise.
+        """
+        cacheKey = (secretID, str(versionID))
+        secretName = self.__SM_CLIENT.secret_version_path(CONSTANTS.GOOGLE_PROJECT_ID, secretID, versionID)
+        try:
+            versionInfo = self.__SM_CLIENT.get_secret_version(request={"name": secretName})
+        except (GoogleErrors.NotFound):
+            return False
+
+        with self.__cacheLock:
+            cacheEntry = self.__secretCache.get(cacheKey)
+            # the secret version exists now even if it was cached as missing
+            self.__missingSecrets.pop(cacheKey, None)
+        if (cacheEntry is not None and cacheEntry["version_name"] == versionInfo.name):
+            return False
+
+        self.__refresh_secret(cacheKey)
+        return True
 
     """------------------------ END OF FUNCTION FOR GETTING DATA FROM GCP SECRET MANAGER API ------------------------"""
 
     """----------------------------------------- START OF DEFINING CONSTANTS -----------------------------------------"""
 
     def __init__(self):
+        # For the in-memory cache of the retrieved secrets,
+        # key: (secretID, versionID), value: the cached secret payload and its metadata
+        self.__secretCache: dict[tuple, dict] = {}
+        # key: (secretID, versionID), value: the monotonic time that the secret version was not found
+        self.__missingSecrets: dict[tuple, float] = {}
+        self.__inFlightFetches: dict[tuple, threading.Event] = {}
+        self.__cacheLock = threading.Lock()
+
         # For Google Secret Manager API
         GOOGLE_SM_JSON_PATH = CONSTANTS.CONFIG_FOLDER_PATH.joinpath("google-sm.json")
         if (not GOOGLE_SM_JSON_PATH.exists() or not GOOGLE_SM_JSON_PATH.is_file()):
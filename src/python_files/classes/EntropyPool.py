@@ -0,0 +1,117 @@
+# import python standard libraries
+import threading
+from typing import Callable, Optional
+
+class EntropyPool:
+    """
+    A thread-safe pool of random bytes (e.g. from GCP KMS Cloud HSM) per gunicorn worker
+    so that the callers can take random bytes without waiting for an API call.
+
+    The pool is refilled in batches up to the high-water mark by a background thread
+    whenever it drops below the low-water mark (or by calling refill() from a scheduled job).
+    Callers never wait for a refill, take() returns None if the pool does not have enough bytes
+    and the caller is expected to fall back to another source of randomness (e.g. the secrets library).
+
+    Note: Every byte is only handed out once.
+    """
+    def __init__(
+        self,
+        fetchFunc:Callable[[int], bytes]=None,
+        highWaterMark:int=16384,
+        lowWaterMark:int=4096,
+        name:str="entropy pool"
+    ):
+        """
+        Constructor for the entropy pool.
+
+        Args:
+        - fetchFunc (Callable): A function that returns the given number of random bytes
+        - highWaterMark (int): The number of bytes that the pool is refilled up to
+        - lowWaterMark (int): The number of bytes that the pool drops below before a refill is started
+        - name (str): The name of the pool for the logs
+        """
+        if (fetchFunc is None):
+            raise ValueError("fetchFunc must be defined!")
+        if (lowWaterMark < 0 or lowWaterMark >= highWaterMark):
+            raise ValueError("lowWaterMark must be between 0 and highWaterMark!")
+
+        self.__fetchFunc = fetchFunc
+        self.__highWaterMark = highWaterMark
+        self.__lowWaterMark = lowWaterMark
+        self.__name = name
+        self.__lock = threading.Lock()
+        self.__refillLock = threading.Lock()
+        self.__pool = bytearray()
+        self.__isRefilling = False
+        self.__stats = {"taken": 0, "fallbacks": 0, "bytes_refilled": 0, "refill_errors": 0}
+
+    def take(self, nBytes:int) -> Optional[bytes]:
+        """
+        Take random bytes from the pool without blocking on a refill.
+
+        Args:
+        - nBytes (int): The number of random bytes to take
+
+        Returns:
+        - The random bytes or None if the pool does not have enough bytes (counted as a fallback)
+        """
+        with self.__lock:
+            if (len(self.__pool) >= nBytes):
+                randomBytes = bytes(self.__pool[:nBytes])
+                del self.__pool[:nBytes]
+                self.__stats["taken"] += 1
+            else:
+                randomBytes = None
+                self.__stats["fallbacks"] += 1
+            needsRefill = (len(self.__pool) < self.__lowWaterMark and not self.__isRefilling)
+            if (needsRefill):
+                self.__isRefilling = True
+
+        if (needsRefill):
+            threading.Thread(target=self.__refill_in_background, daemon=True).start()
+        return randomBytes
+
+    def refill(self) -> int:
+        """
+        Refill the pool up to the high-water mark in the calling thread.
+
+        Returns:
+        - The number of bytes added to the pool (int)
+        """
+        # only one refill at a time so that concurrent refills do not overshoot the high-water mark
+        with self.__refillLock:
+            with self.__lock:
+                nBytes = self.__highWaterMark - len(self.__pool)
+            if (nBytes <= 0):
+                return 0
+
+            randomBytes = self.__fetchFunc(nBytes)
+            with self.__lock:
+                self.__pool.extend(randomBytes)
+                self.__stats["bytes_refilled"] += len(randomBytes)
+            return len(randomBytes)
+
+    def __refill_in_background(self) -> None:
+        try:
+            self.refill()
+        except (Exception) as e:
+            with self.__lock:
+                self.__stats["refill_errors"] += 1
+            print(f"{self.__name}: refill failed: {e}")
+        finally:
+            with self.__lock:
+                self.__isRefilling = False
+
+    def get_stats(self, reset:bool=False) -> dict:
+        """
+        Get the stats of the pool, e.g.
+        {"available": 12288, "taken": 30, "fallbacks": 0, "bytes_refilled": 16384, "refill_errors": 0}
+
+        Args:
+        - reset (bool): Whether to reset the counters after taking the stats
+        """
+        with self.__lock:
+            stats = {"available": len(self.__pool), **self.__stats}
+            if (reset):
+                self.__stats = dict.fromkeys(self.__stats, 0)
+        return stats
@@ -158,4 +158,14 @@ class UploadFailedError(Exception):
 class UserIsNotActiveError(Exception):
     """
     Raised if the user tries to login but their account is not active.
-    """
\ No newline at end of file
+    """
+
+class ConnectionPoolExhaustedError(Exception):
+    """
+    Raised if no MySQL connection could be borrowed from the connection pool before the timeout.
+    """
+
+class PasswordHashingBusyError(Exception):
+    """
+    Raised if the password hashing executor is saturated and the hash was not started before the queue deadline.
+    """
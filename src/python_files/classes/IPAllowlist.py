@@ -0,0 +1,108 @@
+# import python standard libraries
+import ipaddress, json, threading
+from typing import Iterable, Union
+
+class IPAllowlist:
+    """
+    An immutable set of IP addresses and CIDR ranges (IPv4 and IPv6) compiled for fast lookups.
+
+    The networks are stored as sets of their network addresses (as integers) per prefix length,
+    so a lookup masks the IP address once per distinct prefix length in the allowlist
+    instead of scanning through every entry.
+
+    Usage example:
+    >>> allowlist = IPAllowlist(["127.0.0.1", "10.0.0.0/8", "2001:db8::/32"])
+    >>> "10.1.2.3" in allowlist
+    True
+    """
+    def __init__(self, entries:Iterable[str]=()):
+        """
+        Constructor for the IP allowlist.
+
+        Args:
+        - entries (Iterable[str]): The IP addresses or CIDR ranges to allow.
+            - Invalid entries will be ignored.
+        """
+        networks = {4: {}, 6: {}}
+        invalidEntries = []
+        for entry in entries:
+            try:
+                network = ipaddress.ip_network(str(entry).strip(), strict=False)
+            except (ValueError):
+                invalidEntries.append(entry)
+                continue
+            networks[network.version].setdefault(network.prefixlen, set()).add(int(network.network_address))
+
+        # {ip version: {prefix length: set of network addresses}}
+        self.__networks: dict[int, dict[int, frozenset]] = {}
+        for version, prefixes in networks.items():
+            # check the longest prefixes first as they are usually the single IP addresses
+            self.__networks[version] = {
+                prefixLen: frozenset(prefixes[prefixLen]) for prefixLen in sorted(prefixes, reverse=True)
+            }
+        self.__invalidEntries = tuple(invalidEntries)
+
+    def __contains__(self, ipAddress:Union[str, ipaddress.IPv4Address, ipaddress.IPv6Address]) -> bool:
+        """
+        Check if the IP address is in the allowlist.
+
+        Args:
+        - ipAddress (str|IPv4Address|IPv6Address): The IP address to check
+
+        Returns:
+        - True if the IP address is in any of the allowed networks, False otherwise (including invalid IP addresses)
+        """
+        try:
+            ipAddress = ipaddress.ip_address(ipAddress)
+        except (ValueError):
+            return False
+
+        # IPv4-mapped IPv6 addresses (e.g. ::ffff:127.0.0.1) are checked as IPv4 addresses
+        if (ipAddress.version == 6 and ipAddress.ipv4_mapped is not None):
+            ipAddress = ipAddress.ipv4_mapped
+
+        maxPrefixLen = ipAddress.max_prefixlen
+        ipInt = int(ipAddress)
+        for prefixLen, networkAddresses in self.__networks[ipAddress.version].items():
+            hostBits = maxPrefixLen - prefixLen
+            if (((ipInt >> hostBits) << hostBits) in networkAddresses):
+                return True
+        return False
+
+    @property
+    def invalidEntries(self) -> tuple:
+        return self.__invalidEntries
+
+class JSONIPAllowlistCache:
+    """
+    Holds the IPAllowlist compiled from a JSON array payload (e.g. a Secret Manager secret)
+    and only recompiles it when the payload has changed.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__payload = None
+        self.__allowlist = IPAllowlist()
+
+    def get(self, payload:Union[str, bytes]) -> IPAllowlist:
+        """
+        Get the IP allowlist of the JSON array payload.
+
+        Args:
+        - payload (str|bytes): The JSON array of the IP addresses or CIDR ranges,
+            e.g. '["127.0.0.1", "10.0.0.0/8"]'
+
+        Returns:
+        - The compiled IP allowlist
+        """
+        # the cached secret payload is usually the same object until it is refreshed
+        if (payload is self.__payload or payload == self.__payload):
+            return self.__allowlist
+
+        with self.__lock:
+            if (payload != self.__payload):
+                allowlist = IPAllowlist(json.loads(payload))
+                if (allowlist.invalidEntries):
+                    print(f"Invalid entries ignored in the IP allowlist: {allowlist.invalidEntries}")
+                self.__allowlist = allowlist
+                self.__payload = payload
+            return self.__allowlist
@@ -0,0 +1,164 @@
+# import third party libraries
+import pymysql
+from pymysql.connections import Connection as MySQLConnection
+from apscheduler.schedulers.background import BackgroundScheduler
+
+# import python standard libraries
+import threading, socket
+from os import getpid
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from time import perf_counter
+from typing import Any, Callable, Optional
+
+class LeaderElectedScheduler:
+    """
+    A background scheduler that is started in every gunicorn worker (and every instance)
+    where the maintenance jobs only run on the worker that is elected as the leader.
+
+    The leader is the worker whose dedicated MySQL connection holds the named lock from GET_LOCK().
+    Since the lock is released by MySQL when the connection is closed (e.g. the worker crashed),
+    another worker will take over within the election interval.
+
+    Jobs added with add_worker_job() run on every worker instead, e.g. for refreshing in-memory caches.
+    """
+    def __init__(
+        self,
+        connectionFactory:Callable[[], MySQLConnection]=None,
+        lockName:str="",
+        electionInterval:float=30,
+        onJobRun:Optional[Callable[[dict], None]]=None,
+        timezone:str="Asia/Singapore"
+    ):
+        """
+        Constructor for the leader elected scheduler.
+
+        Args:
+        - connectionFactory (Callable): A function that returns a new MySQL connection
+            - The connection is dedicated to holding the leader lock and is not used for the jobs
+        - lockName (str): The name of the MySQL lock to elect the leader with
+        - electionInterval (float): The number of seconds between the election attempts
+        - onJobRun (Callable, Optional): Called with the run details of every leader job, e.g.
+            {"job_id": "deleteExpiredSessions", "started_at": datetime, "duration_ms": 12,
+            "rows_affected": 3, "status": "success", "error_message": None, "leader": "host:pid"}
+        - timezone (str): The timezone of the cron triggers
+        """
+        if (connectionFactory is None):
+            raise ValueError("connectionFactory must be defined!")
+        if (not lockName):
+            raise ValueError("lockName must be defined!")
+
+        self.__connectionFactory = connectionFactory
+        self.__lockName = lockName
+        self.__onJobRun = onJobRun
+        self.__workerName = f"{socket.gethostname()}:{getpid()}"
+        self.__lock = threading.Lock()
+        self.__leaderConnection: Optional[MySQLConnection] = None
+        self.__isLeader = False
+        self.__timezone = ZoneInfo(timezone)
+
+        self.__scheduler = BackgroundScheduler() # Uses threading to run the task in a separate thread
+        self.__scheduler.configure(timezone=timezone)
+        self.__scheduler.add_job(
+            self.__elect_leader,
+            trigger="interval", seconds=electionInterval, id="electMaintenanceLeader",
+            next_run_time=datetime.now(tz=self.__timezone) # timezone aware as naive datetimes are in the scheduler's timezone
+        )
+
+    def __close_leader_connection(self) -> None:
+        if (self.__leaderConnection is not None):
+            try:
+                self.__leaderConnection.close()
+            except (pymysql.err.Error):
+                pass
+            self.__leaderConnection = None
+        self.__isLeader = False
+
+    def __elect_leader(self) -> None:
+        """Try to become the leader or check if this worker still holds the leader lock."""
+        with self.__lock:
+            try:
+                if (self.__leaderConnection is None):
+                    self.__leaderConnection = self.__connectionFactory()
+
+                cur = self.__leaderConnection.cursor()
+                cur.execute("SELECT IS_USED_LOCK(%(lockName)s) = CONNECTION_ID()", {"lockName": self.__lockName})
+                if (cur.fetchone()[0] == 1):
+                    self.__isLeader = True
+                    return # still the leader
+
+                # GET_LOCK() with a timeout of 0 returns 1 if the lock was obtained, 0 if another worker holds it
+                cur.execute("SELECT GET_LOCK(%(lockName)s, 0)", {"lockName": self.__lockName})
+                if (cur.fetchone()[0] == 1):
+                    self.__isLeader = True
+                    print(f"Maintenance scheduler: {self.__workerName} is now the leader.")
+                else:
+                    # close the connection so that only the leader holds a connection
+                    self.__close_leader_connection()
+            except (pymysql.err.Error) as e:
+                # the connection was lost, hence the lock (if held) was released by MySQL
+                print(f"Maintenance scheduler: leader election failed on {self.__workerName}: {e}")
+                self.__close_leader_connection()
+
+    def __run_leader_job(self, func:Callable[[], Any], jobID:str) -> None:
+        """Run the job if this worker is the leader and report its duration and the number of rows affected."""
+        # confirm that the leader lock is still held in case the leader connection was lost since the last election
+        self.__elect_leader()
+        if (not self.__isLeader):
+            return
+
+        startedAt = datetime.now(tz=self.__timezone).replace(tzinfo=None)
+        startTime = perf_counter()
+        runDetails = {
+            "job_id": jobID, "started_at": startedAt, "duration_ms": 0, "rows_affected": None,
+            "status": "success", "error_message": None, "leader": self.__workerName
+        }
+        try:
+            returnValue = func()
+            if (isinstance(returnValue, int) and not isinstance(returnValue, bool)):
+                runDetails["rows_affected"] = returnValue
+        except (Exception) as e:
+            runDetails["status"] = "error"
+            runDetails["error_message"] = f"{type(e).__name__}: {e}"[:1024]
+        runDetails["duration_ms"] = round((perf_counter() - startTime) * 1000)
+
+        if (self.__onJobRun is not None):
+            try:
+                self.__onJobRun(runDetails)
+            except (Exception) as e:
+                print(f"Maintenance scheduler: failed to record the run of {jobID}: {e}")
+
+    def add_leader_job(self, func:Callable[[], Any], id:str="", **triggerArgs) -> None:
+        """
+        Add a job that only runs on the leader.
+
+        Args:
+        - func (Callable): The job which may return the number of rows affected (int)
+        - id (str): The ID of the job
+        - triggerArgs: The APScheduler trigger arguments, e.g. trigger="cron", hour=23, minute=58
+        """
+        self.__scheduler.add_job(self.__run_leader_job, args=(func, id), id=id, **triggerArgs)
+
+    def add_worker_job(self, func:Callable[[], Any], id:str="", **triggerArgs) -> None:
+        """
+        Add a job that runs on every worker.
+
+        Args:
+        - func (Callable): The job
+        - id (str): The ID of the job
+        - triggerArgs: The APScheduler trigger arguments, e.g. trigger="interval", minutes=5
+        """
+        self.__scheduler.add_job(func, id=id, **triggerArgs)
+
+    def start(self) -> None:
+        self.__scheduler.start()
+
+    def shutdown(self) -> None:
+        """Stop the scheduler and release the leader lock by closing the leader connection."""
+        self.__scheduler.shutdown(wait=False)
+        with self.__lock:
+            self.__close_leader_connection()
+
+    @property
+    def isLeader(self) -> bool:
+        return self.__isLeader
@@ -0,0 +1,154 @@
+# import third party libraries
+from argon2 import PasswordHasher
+
+# import python standard libraries
+import threading
+from time import perf_counter
+from typing import Any, Callable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+# import local python libraries
+from .Errors import PasswordHashingBusyError
+from .SQLInstrumentation import LatencyHistogram
+
+class PasswordHashingExecutor:
+    """
+    Runs the memory-hard Argon2 hashing and verification of a PasswordHasher on a bounded
+    thread pool (argon2-cffi releases the GIL while hashing) so that a burst of logins
+    cannot take up every gunicorn thread of the worker with hashing.
+
+    Admission control:
+    - At most maxConcurrency hashes run at the same time
+    - At most maxQueueSize hashes wait for a free hashing thread, more are rejected immediately
+    - A waiting hash that has not started within the queue deadline is cancelled
+
+    Rejected and cancelled hashes raise PasswordHashingBusyError for a fast "try again" response.
+    """
+    def __init__(
+        self,
+        passwordHasher:PasswordHasher=None,
+        maxConcurrency:int=2,
+        maxQueueSize:int=6,
+        queueDeadline:float=2,
+        bucketBoundsMs:tuple=(50, 100, 250, 500, 1000, 2000, 5000)
+    ):
+        """
+        Constructor for the password hashing executor.
+
+        Args:
+        - passwordHasher (PasswordHasher): The Argon2 password hasher, e.g. CONSTANTS.PH
+        - maxConcurrency (int): The number of hashing threads
+        - maxQueueSize (int): The maximum number of hashes waiting for a hashing thread
+        - queueDeadline (float): The number of seconds a hash may wait for a hashing thread
+        - bucketBoundsMs (tuple): The sorted upper bounds (in milliseconds) of the latency histograms
+        """
+        if (passwordHasher is None):
+            raise ValueError("passwordHasher must be defined!")
+        if (maxConcurrency < 1):
+            raise ValueError("maxConcurrency must be greater than 0!")
+
+        self.__passwordHasher = passwordHasher
+        self.__queueDeadline = queueDeadline
+        self.__maxInFlight = maxConcurrency + maxQueueSize
+        self.__executor = ThreadPoolExecutor(max_workers=maxConcurrency, thread_name_prefix="argon2")
+        self.__lock = threading.Lock()
+        self.__bucketBoundsMs = tuple(bucketBoundsMs)
+        self.__inFlight = 0
+        self.__running = 0
+        self.__reset_stats()
+
+    def __reset_stats(self) -> None:
+        # Note: The lock must be held by the caller (except in the constructor)
+        self.__maxQueueDepth = 0
+        self.__rejected = 0
+        self.__timedOut = 0
+        self.__hashLatency = LatencyHistogram(self.__bucketBoundsMs)
+        self.__queueWait = LatencyHistogram(self.__bucketBoundsMs)
+
+    def __run_task(self, enqueuedAt:float, func:Callable, args:tuple) -> Any:
+        startTime = perf_counter()
+        with self.__lock:
+            self.__running += 1
+            self.__queueWait.record((startTime - enqueuedAt) * 1000, 0)
+        try:
+            return func(*args)
+        finally:
+            with self.__lock:
+                self.__running -= 1
+                self.__hashLatency.record((perf_counter() - startTime) * 1000, 0)
+
+    def __release(self, _) -> None:
+        with self.__lock:
+            self.__inFlight -= 1
+
+    def __submit(self, func:Callable, *args) -> Any:
+        with self.__lock:
+            if (self.__inFlight >= self.__maxInFlight):
+                self.__rejected += 1
+                raise PasswordHashingBusyError("The password hashing queue is full!")
+            self.__inFlight += 1
+            self.__maxQueueDepth = max(self.__maxQueueDepth, self.__inFlight - self.__running)
+
+        future = self.__executor.submit(self.__run_task, perf_counter(), func, args)
+        # called when the hash has finished or has been cancelled
+        future.add_done_callback(self.__release)
+        try:
+            return future.result(timeout=self.__queueDeadline)
+        except (FutureTimeoutError):
+            if (future.cancel()):
+                # the hash had not started before the queue deadline
+                with self.__lock:
+                    self.__timedOut += 1
+                raise PasswordHashingBusyError("The password hashing queue deadline was exceeded!")
+
+            # the hash has started, hence wait for it to finish
+            return future.result()
+
+    def hash(self, password:str) -> str:
+        """
+        Hash the password like PasswordHasher.hash().
+
+        Raises:
+        - PasswordHashingBusyError: If the executor is saturated
+        """
+        return self.__submit(self.__passwordHasher.hash, password)
+
+    def verify(self, passwordHash:str, password:str) -> bool:
+        """
+        Verify the password against the hash like PasswordHasher.verify().
+
+        Raises:
+        - PasswordHashingBusyError: If the executor is saturated
+        - The exceptions of PasswordHasher.verify(), e.g. VerifyMismatchError
+        """
+        return self.__submit(self.__passwordHasher.verify, passwordHash, password)
+
+    def check_needs_rehash(self, passwordHash:str) -> bool:
+        """
+        Check if the hash was not hashed with the current parameters of the password hasher
+        like PasswordHasher.check_needs_rehash() (which does not hash, hence not run on the executor).
+        """
+        return self.__passwordHasher.check_needs_rehash(passwordHash)
+
+    def get_stats(self, reset:bool=False) -> dict:
+        """
+        Get the stats of the executor, e.g.
+        {"running": 1, "queued": 0, "max_queue_depth": 3, "rejected": 0, "timed_out": 0,
+        "hash_latency": {"count": 20, ...}, "queue_wait": {"count": 20, ...}}
+
+        Args:
+        - reset (bool): Whether to reset the counters and histograms after taking the stats
+        """
+        with self.__lock:
+            stats = {
+                "running": self.__running,
+                "queued": self.__inFlight - self.__running,
+                "max_queue_depth": self.__maxQueueDepth,
+                "rejected": self.__rejected,
+                "timed_out": self.__timedOut,
+                "hash_latency": self.__hashLatency.to_dict(),
+                "queue_wait": self.__queueWait.to_dict()
+            }
+            if (reset):
+                self.__reset_stats()
+        return stats
@@ -0,0 +1,77 @@
+"""
+The batched deletes of the maintenance jobs (see purge_in_batches() in SQLFunctions.py).
+
+Only uses the python standard library so that the queries can also be checked
+with EXPLAIN by test/performance/explain_time_predicates.py without the web app's dependencies.
+"""
+# import python standard libraries
+from dataclasses import dataclass
+
+@dataclass(frozen=True)
+class PurgeQuery:
+    """
+    The rows of a table to delete in batches by their primary key.
+
+    Attributes:
+    - table (str): The table to delete from (not user input)
+    - primaryKey (tuple): The primary key column(s) of the table, e.g. ("user_id", "ip_address")
+    - condition (str): The WHERE condition of the rows to delete, e.g. "expiry_date < %(now)s"
+    - orderBy (str): The indexed column(s) that the condition is a range on, e.g. "expiry_date"
+    """
+    table: str
+    primaryKey: tuple
+    condition: str
+    orderBy: str
+
+    def get_select_query(self, batchSize:int) -> str:
+        """Returns the query that selects the primary keys of the next batch of matching rows"""
+        return f"SELECT {', '.join(self.primaryKey)} FROM {self.table} WHERE {self.condition} ORDER BY {self.orderBy} LIMIT {int(batchSize)}"
+
+    def get_delete_query(self, numOfKeys:int) -> str:
+        """
+        Returns the query that deletes the batch of rows by their primary keys (positional parameters)
+        which is followed by get_condition_clause() (named parameters) to re-check the condition.
+        """
+        keyPlaceholder = "(" + ", ".join(["%s"] * len(self.primaryKey)) + ")"
+        return f"DELETE FROM {self.table} WHERE ({', '.join(self.primaryKey)}) IN ({', '.join([keyPlaceholder] * numOfKeys)})"
+
+    def get_condition_clause(self) -> str:
+        return f" AND {self.condition}"
+
+# The batched deletes of the maintenance jobs, key: table name
+PURGE_QUERIES = {
+    purgeQuery.table: purgeQuery for purgeQuery in (
+        PurgeQuery(
+            table="session", primaryKey=("session_id",),
+            condition="expiry_date < %(now)s", orderBy="expiry_date"
+        ),
+        PurgeQuery(
+            table="user_ip_addresses", primaryKey=("user_id", "ip_address"),
+            condition="last_accessed < %(lastAccessedBound)s", orderBy="last_accessed"
+        ),
+        PurgeQuery(
+            table="guard_token", primaryKey=("token", "user_id"),
+            condition="expiry_date < %(now)s", orderBy="expiry_date"
+        ),
+        PurgeQuery(
+            table="expirable_token", primaryKey=("token",),
+            condition="expiry_date < %(now)s", orderBy="expiry_date"
+        ),
+        PurgeQuery(
+            table="used_url_token", primaryKey=("nonce",),
+            condition="expiry_date < %(now)s", orderBy="expiry_date"
+        ),
+        PurgeQuery(
+            table="login_attempts", primaryKey=("user_id",),
+            condition="reset_date < %(now)s", orderBy="reset_date"
+        ),
+        PurgeQuery(
+            table="stripe_payments", primaryKey=("stripe_payment_intent",),
+            condition="payment_time IS NULL AND created_time <= %(createdBefore)s", orderBy="payment_time, created_time"
+        ),
+        PurgeQuery(
+            table="user", primaryKey=("id",),
+            condition="email_verified=0 AND date_joined < %(joinedBefore)s", orderBy="date_joined"
+        )
+    )
+}
@@ -1,3 +1,9 @@
+# import python standard libraries
+import threading
+from time import monotonic
+from types import MappingProxyType
+from typing import Optional
+
 # import third party libraries
 from .Constants import CONSTANTS
 
@@ -22,6 +28,7 @@ class RoleInfo:
         self.__teacherBP = bool(tupleData[7])
         self.__userBP = bool(tupleData[8])
         self.__superAdminBP = bool(tupleData[9])
+        self.__version = tupleData[10]
 
     def format_blueprints_to_array(self) -> tuple:
         """
@@ -71,4 +78,120 @@ class RoleInfo:
         return self.__userBP
     @property
     def superAdminBP(self) -> bool:
-        return self.__superAdminBP
\ No newline at end of file
+        return self.__superAdminBP
+    @property
+    def version(self) -> int:
+        return self.__version
+
+class RBACDecisionTable:
+    """
+    An immutable lookup table of the RBAC decisions compiled from the role table
+    and the redirect tables in Constants.py so that the RBAC check in before_request
+    is a single dictionary lookup instead of rebuilding the roles on every request.
+
+    The principal types are "Student", "Teacher", "Admin", "SuperAdmin" and "Guest".
+    """
+    def __init__(self, roleList:list, endpointInfo:dict):
+        """
+        Constructor for the RBAC decision table.
+
+        Args:
+        - roleList (list): The role rows retrieved from role_sql_operation's "retrieve_all" mode
+        - endpointInfo (dict): The endpoints of the web app mapped to their (blueprint, route) tuples
+        """
+        roleBlueprints = {}
+        version = 0
+        for role in roleList:
+            roleInfo = RoleInfo(role)
+            roleBlueprints[roleInfo.roleName] = frozenset(roleInfo.format_blueprints_for_checking())
+            version += roleInfo.version
+
+        # teachers are also allowed to access the pages that the students are allowed to access
+        allowedBlueprints = {roleName: roleBlueprints.get(roleName, frozenset()) for roleName in CONSTANTS.ROLE_NAME_ORDER_TUPLE}
+        allowedBlueprints["Teacher"] = allowedBlueprints["Teacher"] | allowedBlueprints["Student"]
+
+        redirectTables = {
+            "Student": CONSTANTS.USER_REDIRECT_TABLE,
+            "Teacher": CONSTANTS.TEACHER_REDIRECT_TABLE,
+            "Admin": CONSTANTS.ADMIN_REDIRECT_TABLE,
+            "SuperAdmin": CONSTANTS.SUPERADMIN_REDIRECT_TABLE,
+            "Guest": CONSTANTS.GUEST_REDIRECT_TABLE
+        }
+
+        # decision: (is allowed, the endpoint to redirect to or None to abort(404) if not allowed)
+        decisions = {}
+        for principal, blueprints in allowedBlueprints.items():
+            redirectTable = redirectTables[principal]
+            for endpoint, (blueprint, _) in endpointInfo.items():
+                if (blueprint in blueprints):
+                    decisions[(principal, endpoint)] = (True, None)
+                else:
+                    # Note: request.endpoint takes precedence before the blueprint custom redirect
+                    decisions[(principal, endpoint)] = (False, redirectTable.get(endpoint, redirectTable.get(blueprint)))
+
+        self.__decisions = MappingProxyType(decisions)
+        self.__endpointInfo = MappingProxyType(dict(endpointInfo))
+        self.__version = version
+
+    def get_decision(self, principal:str, endpoint:str) -> tuple:
+        """
+        Returns the RBAC decision of the principal for the endpoint.
+
+        Args:
+        - principal (str): "Student", "Teacher", "Admin", "SuperAdmin" or "Guest"
+        - endpoint (str): The request's endpoint
+
+        Returns:
+        - A tuple of (isAllowed, redirectEndpoint) where redirectEndpoint is None if
+            the request should be aborted with a 404 instead of being redirected
+        """
+        return self.__decisions.get((principal, endpoint), (False, None))
+
+    def get_endpoint_info(self, endpoint:str) -> Optional[tuple]:
+        """
+        Returns the (blueprint, route) tuple of the endpoint or None if the endpoint has no blueprint.
+        """
+        return self.__endpointInfo.get(endpoint)
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+class RBACDecisionTableCache:
+    """
+    Holds the RBAC decision table of the worker and tracks when to check if
+    the roles were updated by another worker by comparing the role version.
+    """
+    def __init__(self, versionCheckInterval:float=CONSTANTS.RBAC_VERSION_CHECK_INTERVAL):
+        self.__versionCheckInterval = versionCheckInterval
+        self.__lock = threading.Lock()
+        self.__table: Optional[RBACDecisionTable] = None
+        self.__nextVersionCheck = 0.0
+
+    def needs_version_check(self) -> bool:
+        """Returns True if there is no decision table or if it is time to check the role version."""
+        return (self.__table is None or monotonic() >= self.__nextVersionCheck)
+
+    def try_acquire_version_check(self) -> bool:
+        """
+        Returns True if the caller should check the role version,
+        so that only one thread per worker checks the version at a time.
+        """
+        with self.__lock:
+            if (not self.needs_version_check()):
+                return False
+            self.__nextVersionCheck = monotonic() + self.__versionCheckInterval
+            return True
+
+    def set_table(self, table:RBACDecisionTable) -> None:
+        self.__table = table
+
+    def invalidate(self) -> None:
+        """Check the role version on the next request, e.g. after the roles were updated by this worker."""
+        self.__nextVersionCheck = 0.0
+
+    @property
+    def table(self) -> Optional[RBACDecisionTable]:
+        return self.__table
+
+RBAC_DECISION_TABLE_CACHE = RBACDecisionTableCache()
@@ -0,0 +1,129 @@
+# import third party libraries
+import pymysql
+
+# import python standard libraries
+import threading
+from bisect import bisect_left
+from time import perf_counter
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+# The (table, mode) of the sql_operation() that is currently running in this thread/context
+CURRENT_SQL_OPERATION: ContextVar[tuple] = ContextVar("CURRENT_SQL_OPERATION", default=("other", "other"))
+
+class LatencyHistogram:
+    """
+    A fixed-bucket histogram of the query latencies of one (table, mode) SQL operation.
+
+    Not thread-safe on its own, SQLMetrics holds the lock when updating it.
+    """
+    def __init__(self, bucketBoundsMs:tuple):
+        self.__bucketBoundsMs = bucketBoundsMs
+        # the last bucket is for the latencies above the largest bound
+        self.__bucketCounts = [0] * (len(bucketBoundsMs) + 1)
+        self.__count = 0
+        self.__totalMs = 0.0
+        self.__maxMs = 0.0
+        self.__totalRows = 0
+
+    def record(self, durationMs:float, rows:int) -> None:
+        self.__bucketCounts[bisect_left(self.__bucketBoundsMs, durationMs)] += 1
+        self.__count += 1
+        self.__totalMs += durationMs
+        self.__maxMs = max(self.__maxMs, durationMs)
+        self.__totalRows += max(rows, 0)
+
+    def to_dict(self) -> dict:
+        """
+        Returns the histogram as a dict, e.g.
+        {"count": 3, "total_ms": 4.2, "max_ms": 2.1, "rows": 12, "buckets": {"<=1ms": 1, "<=5ms": 2, ..., ">1000ms": 0}}
+        """
+        buckets = {f"<={bound}ms": count for bound, count in zip(self.__bucketBoundsMs, self.__bucketCounts)}
+        buckets[f">{self.__bucketBoundsMs[-1]}ms"] = self.__bucketCounts[-1]
+        return {
+            "count": self.__count,
+            "total_ms": round(self.__totalMs, 2),
+            "max_ms": round(self.__maxMs, 2),
+            "rows": self.__totalRows,
+            "buckets": buckets
+        }
+
+class SQLMetrics:
+    """
+    Collects the latency histograms of the executed queries per (table, mode) SQL operation
+    for the current process (i.e. per gunicorn worker) and notifies the query listeners,
+    e.g. for the per-request query counts and the slow query log.
+    """
+    def __init__(self, bucketBoundsMs:tuple=(1, 5, 10, 25, 50, 100, 250, 500, 1000)):
+        """
+        Constructor for the SQL metrics.
+
+        Args:
+        - bucketBoundsMs (tuple): The sorted upper bounds (in milliseconds) of the histogram buckets
+        """
+        self.__bucketBoundsMs = tuple(bucketBoundsMs)
+        self.__lock = threading.Lock()
+        self.__histograms: dict[tuple, LatencyHistogram] = {}
+        self.__queryListeners: list[Callable[[dict], None]] = []
+
+    def add_query_listener(self, listener:Callable[[dict], None]) -> None:
+        """
+        Add a function that is called after every query with the query info, e.g.
+        {"table": "course", "mode": "get_course_data", "query": "SELECT ...", "duration_ms": 1.2, "rows": 1}
+        """
+        self.__queryListeners.append(listener)
+
+    def record(self, query:str, durationMs:float, rows:int) -> None:
+        """
+        Record the latency and the number of rows returned or affected of a query.
+
+        Args:
+        - query (str): The query before the parameters were escaped into it
+        - durationMs (float): The time taken to execute the query and retrieve its results
+        - rows (int): The number of rows returned or affected (-1 if unknown)
+        """
+        table, mode = CURRENT_SQL_OPERATION.get()
+        with self.__lock:
+            histogram = self.__histograms.get((table, mode))
+            if (histogram is None):
+                histogram = self.__histograms[(table, mode)] = LatencyHistogram(self.__bucketBoundsMs)
+            histogram.record(durationMs, rows)
+
+        queryInfo = {"table": table, "mode": mode, "query": query, "duration_ms": durationMs, "rows": rows}
+        for listener in self.__queryListeners:
+            listener(queryInfo)
+
+    def get_snapshot(self, reset:bool=False) -> dict:
+        """
+        Get the latency histograms of all the SQL operations.
+
+        Args:
+        - reset (bool): Whether to clear the histograms after taking the snapshot
+
+        Returns:
+        - A dict of "table:mode" to the histogram dict, e.g. {"session:check_if_valid": {"count": 120, ...}}
+        """
+        with self.__lock:
+            snapshot = {f"{table}:{mode}": histogram.to_dict() for (table, mode), histogram in self.__histograms.items()}
+            if (reset):
+                self.__histograms.clear()
+        return snapshot
+
+# The SQL metrics of this process, the cursors of the MySQL connections report to it
+SQL_METRICS = SQLMetrics()
+
+class InstrumentedCursor(pymysql.cursors.Cursor):
+    """
+    A pymysql cursor that times every executed query (including the ones run by executemany())
+    and records it in SQL_METRICS under the (table, mode) of the running sql_operation().
+
+    Since the default cursor is buffered, the time includes retrieving all the rows of the result.
+    """
+    def execute(self, query:str, args:Optional[object]=None) -> int:
+        startTime = perf_counter()
+        rows = -1
+        try:
+            rows = super().execute(query, args)
+            return rows
+        finally:
+            SQL_METRICS.record(query, (perf_counter() - startTime) * 1000, rows)
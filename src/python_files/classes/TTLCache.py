@@ -0,0 +1,109 @@
+# import python standard libraries
+import threading
+from time import monotonic
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class TTLCache:
+    """
+    A thread-safe in-memory cache where each entry expires after a time-to-live (TTL)
+    and the least recently used entries are evicted when the cache is full.
+
+    Used for caching values that are expensive to compute per request in a gunicorn worker
+    (e.g. total number of rows for the pagination), hence the values may be stale for up to the TTL
+    unless the entry is invalidated when the underlying data is changed.
+    """
+    def __init__(self, ttl:float=60, maxSize:int=1024):
+        """
+        Constructor for the TTL cache.
+
+        Args:
+        - ttl (float): The number of seconds before a cached value expires.
+        - maxSize (int): The maximum number of cached values.
+        """
+        if (maxSize < 1):
+            raise ValueError("maxSize must be greater than 0!")
+
+        self.__ttl = ttl
+        self.__maxSize = maxSize
+        self.__lock = threading.Lock()
+        self.__cache: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key:Hashable, default:Any=None) -> Any:
+        """
+        Get the cached value of the key.
+
+        Args:
+        - key (Hashable): The key of the cached value.
+        - default (Any): The value to return if the key is not cached or has expired.
+
+        Returns:
+        - The cached value or the default value
+        """
+        with self.__lock:
+            cachedEntry = self.__cache.get(key)
+            if (cachedEntry is None):
+                return default
+
+            expiryTime, value = cachedEntry
+            if (monotonic() >= expiryTime):
+                del self.__cache[key]
+                return default
+
+            self.__cache.move_to_end(key)
+            return value
+
+    def set(self, key:Hashable, value:Any, ttl:Optional[float]=None) -> None:
+        """
+        Cache the value of the key.
+
+        Args:
+        - key (Hashable): The key of the value.
+        - value (Any): The value to cache.
+        - ttl (float, Optional): The number of seconds before the value expires.
+            - Default: None, will use the TTL of the cache.
+        """
+        ttl = self.__ttl if (ttl is None) else ttl
+        with self.__lock:
+            self.__cache[key] = (monotonic() + ttl, value)
+            self.__cache.move_to_end(key)
+            while (len(self.__cache) > self.__maxSize):
+                self.__cache.popitem(last=False)
+
+    def get_or_set(self, key:Hashable, valueFactory:Callable[[], Any], ttl:Optional[float]=None) -> Any:
+        """
+        Get the cached value of the key or compute and cache it using the value factory if it is not cached.
+
+        Args:
+        - key (Hashable): The key of the value.
+        - valueFactory (Callable): A function that returns the value to cache.
+        - ttl (float, Optional): The number of seconds before the value expires.
+            - Default: None, will use the TTL of the cache.
+
+        Returns:
+        - The cached or computed value
+        """
+        sentinel = object()
+        value = self.get(key, default=sentinel)
+        if (value is sentinel):
+            value = valueFactory()
+            self.set(key, value, ttl=ttl)
+        return value
+
+    def invalidate(self, key:Optional[Hashable]=None) -> None:
+        """
+        Remove the cached value of the key.
+
+        Args:
+        - key (Hashable, Optional): The key of the value to remove.
+            - Default: None, will remove all cached values.
+        """
+        with self.__lock:
+            if (key is None):
+                self.__cache.clear()
+            else:
+                self.__cache.pop(key, None)
+
+    def __len__(self) -> int:
+        with self.__lock:
+            return len(self.__cache)
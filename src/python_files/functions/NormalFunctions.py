@@ -5,17 +5,17 @@ flask web application's app variable from app.py or current_app from flask libra
 This is to allow this file to be run as a standalone script.
 """
 # import python standard libraries
-import requests as req, uuid, re, json, pathlib
+import requests as req, uuid, re, json, pathlib, threading
 from six import ensure_binary
 from typing import Union, Optional
 from binascii import Error as BinasciiError
 from base64 import urlsafe_b64encode, urlsafe_b64decode
-from time import sleep
+from time import sleep, monotonic
 from hashlib import sha1
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from io import IOBase, BytesIO
-from secrets import token_bytes, token_hex, token_urlsafe
+from secrets import token_bytes, token_hex
 from inspect import stack, getframeinfo
 from os import environ
 from pathlib import Path
@@ -25,16 +25,30 @@ if (__name__ == "__main__"):
     from sys import path as sys_path
     sys_path.append(str(pathlib.Path(__file__).parent.parent.parent.absolute()))
     from python_files.classes.Constants import CONSTANTS, SECRET_CONSTANTS
+    from python_files.classes.ConnectionPool import MySQLConnectionPool
+    from python_files.classes.SQLInstrumentation import InstrumentedCursor
+    from python_files.classes.EntropyPool import EntropyPool
+    from python_files.classes.PasswordHashing import PasswordHashingExecutor
     from python_files.classes.Errors import *
 elif (__package__ is None or __package__ == ""):
     from classes.Constants import CONSTANTS, SECRET_CONSTANTS
+    from classes.ConnectionPool import MySQLConnectionPool
+    from classes.SQLInstrumentation import InstrumentedCursor
+    from classes.EntropyPool import EntropyPool
+    from classes.PasswordHashing import PasswordHashingExecutor
     from classes.Errors import *
 else:
     from python_files.classes.Constants import CONSTANTS, SECRET_CONSTANTS
+    from python_files.classes.ConnectionPool import MySQLConnectionPool
+    from python_files.classes.SQLInstrumentation import InstrumentedCursor
+    from python_files.classes.EntropyPool import EntropyPool
+    from python_files.classes.PasswordHashing import PasswordHashingExecutor
     from python_files.classes.Errors import *
 
 # import third party libraries
 import PIL, pymysql
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
 from PIL import Image as PillowImage
 from dicebear import DAvatar, DStyle
 
@@ -64,21 +78,26 @@ from google.cloud.kms_v1.types import resources
 from google.cloud import recaptchaenterprise_v1
 from google.cloud.recaptchaenterprise_v1 import Assessment
 
-def decode_and_decrypt_token(tokenInput:str) ->Union[str, None]:
+def decode_and_decrypt_token(tokenInput:str, decode:bool=True) ->Union[str, bytes, None]:
     """
     Decodes the URL-safe base64 encoded token and decrypts it using the token-key in GCP KMS.
 
     Args:
     - tokenInput (str): The token to decode and decrypt.
+    - decode (bool): Whether to decode the decrypted token to string and check that it is a 240 characters token.
+        - Defaults to True
 
     Returns:
-    - The decrypted token (str) if successful, None if not.
+    - The decrypted token (str|bytes) if successful, None if not.
     """
     try:
         token = symmetric_decrypt(
             ciphertext=urlsafe_b64decode(tokenInput),
-            keyID=CONSTANTS.TOKEN_ENCRYPTION_KEY_ID
+            keyID=CONSTANTS.TOKEN_ENCRYPTION_KEY_ID,
+            decode=decode
         )
+        if (not decode):
+            return token
 
         # if the token is not equal to 240 characters,
         # return None because it is not a valid token
@@ -93,6 +112,84 @@ def decode_and_decrypt_token(tokenInput:str) ->Union[str, None]:
         )
         return None
 
+URL_TOKEN_NONCE_LENGTH = 16
+URL_TOKEN_EXPIRY_LENGTH = 8
+
+def generate_url_token(purpose:str="", userID:str="", expiryDate:datetime=None) -> str:
+    """
+    Generate a stateless token for the URL in the emails (e.g. reset password link)
+    which can be verified without any database lookup by decode_url_token().
+
+    The payload is: prefix (1 byte) | expiry UNIX timestamp (8 bytes) | nonce (16 bytes) | "<purpose>:<user ID>"
+    and is encrypted with AES-256-GCM using the latest DEK of the token-key (see symmetric_encrypt())
+    which is rotated by the maintenance scheduler, hence the token cannot be forged or altered.
+    The random nonce is the key of the token in the used_url_token table to only allow the token to be used once.
+
+    Args:
+    - purpose (str): The purpose of the token, must be in URL_TOKEN_PURPOSES defined in Constants.py
+    - userID (str): The ID of the user the token is for
+    - expiryDate (datetime): The timezone aware expiry date of the token
+
+    Returns:
+    - The URL-safe base64 encoded token (str)
+    """
+    if (purpose not in CONSTANTS.URL_TOKEN_PURPOSES):
+        raise ValueError(f"Invalid URL token purpose: {purpose}")
+
+    payload = CONSTANTS.URL_TOKEN_PAYLOAD_PREFIX \
+              + int(expiryDate.timestamp()).to_bytes(URL_TOKEN_EXPIRY_LENGTH, "big") \
+              + token_bytes(URL_TOKEN_NONCE_LENGTH) \
+              + f"{purpose}:{userID}".encode("utf-8")
+    return urlsafe_b64encode(
+        symmetric_encrypt(plaintext=payload, keyID=CONSTANTS.TOKEN_ENCRYPTION_KEY_ID)
+    ).decode("utf-8")
+
+def decode_url_token(tokenInput:str, purpose:str="") -> Union[tuple, str, None]:
+    """
+    Decrypts and verifies the token from the URL in the emails locally with the cached DEK of the token-key.
+
+    Note: This does not check if the token has already been used (see the used_url_token table).
+
+    Args:
+    - tokenInput (str): The URL-safe base64 encoded token from the URL
+    - purpose (str): The expected purpose of the token
+
+    Returns:
+    - A tuple of (user ID, nonce in hex, expiry date) for a valid stateless token from generate_url_token()
+    - The 240 characters token (str) for a token that is stored in the expirable_token table
+        (e.g. "recover_account" tokens or tokens sent before the stateless tokens were used)
+    - None if the token is invalid, has expired or is for another purpose
+    """
+    payload = decode_and_decrypt_token(tokenInput=tokenInput, decode=False)
+    if (payload is None):
+        return None
+
+    if (not payload.startswith(CONSTANTS.URL_TOKEN_PAYLOAD_PREFIX)):
+        # a stored token, which has to be looked up in the expirable_token table
+        try:
+            token = payload.decode("utf-8")
+        except (UnicodeDecodeError):
+            return None
+        return token if (len(token) == 240) else None
+
+    prefixLength = len(CONSTANTS.URL_TOKEN_PAYLOAD_PREFIX)
+    nonceStart = prefixLength + URL_TOKEN_EXPIRY_LENGTH
+    try:
+        tokenPurpose, userID = payload[nonceStart + URL_TOKEN_NONCE_LENGTH:].decode("utf-8").split(":", 1)
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if (tokenPurpose != purpose):
+        return None
+
+    expiryDate = datetime.fromtimestamp(
+        int.from_bytes(payload[prefixLength:nonceStart], "big"), tz=ZoneInfo("Asia/Singapore")
+    )
+    if (expiryDate < datetime.now(tz=ZoneInfo("Asia/Singapore"))):
+        return None
+
+    nonce = payload[nonceStart:nonceStart + URL_TOKEN_NONCE_LENGTH].hex()
+    return userID, nonce, expiryDate.replace(tzinfo=None)
+
 def get_pagination_arr(pageNum:int=1, maxPage:int=1) -> tuple:
     """
     Returns a tuple of pagination button integers.
@@ -144,6 +241,55 @@ def get_pagination_arr(pageNum:int=1, maxPage:int=1) -> tuple:
         # then the array will be: (5, 6, 7, 8, 9)
         return tuple(range(pageNum-2, pageNum+3))
 
+def encode_pagination_cursor(pageNum:int=1, sortKey:Optional[tuple]=None, isBackward:bool=False) -> str:
+    """
+    Encodes the position of a page for keyset pagination into an opaque URL-safe cursor token.
+
+    Args:
+    - pageNum (int): The page number that the cursor leads to
+    - sortKey (tuple, Optional): The (datetime, ID) sort key of the row to seek from (exclusive)
+        - Default: None, will seek from the start (or from the end if isBackward is True) of the results
+    - isBackward (bool): If True, the page consists of the rows before the sortKey instead of after it
+
+    Returns:
+    - The cursor token (str)
+    """
+    cursorData = {"p": pageNum, "b": isBackward}
+    if (sortKey is not None):
+        cursorData["k"] = [sortKey[0].isoformat(), sortKey[1]]
+    return urlsafe_b64encode(json.dumps(cursorData, separators=(",", ":")).encode("utf-8")).decode("utf-8").rstrip("=")
+
+def decode_pagination_cursor(cursor:Optional[str]=None, pageNum:int=1) -> Optional[dict]:
+    """
+    Decodes the cursor token from encode_pagination_cursor().
+
+    Args:
+    - cursor (str, Optional): The cursor token from the URL
+    - pageNum (int): The page number in the URL which must match the cursor's page number
+
+    Returns:
+    - A dict, {"sortKey": (datetime, str)|None, "isBackward": bool}, if the cursor is valid
+    - None if the cursor is invalid or was for a different page
+        (in which case, the page should be retrieved by its page number instead)
+    """
+    if (not cursor or len(cursor) > 200):
+        return None
+
+    try:
+        cursorData = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if (cursorData["p"] != pageNum or not isinstance(cursorData["b"], bool)):
+            return None
+
+        sortKey = cursorData.get("k")
+        if (sortKey is not None):
+            if (not isinstance(sortKey[1], str) or len(sortKey[1]) > 32):
+                return None
+            sortKey = (datetime.fromisoformat(sortKey[0]), sortKey[1])
+        return {"sortKey": sortKey, "isBackward": cursorData["b"]}
+    except (BinasciiError, ValueError, TypeError, KeyError, IndexError):
+        # If the user tampers with the cursor in the url
+        return None
+
 def upload_from_stream(
     bucketName:Optional[str]=CONSTANTS.PUBLIC_BUCKET_NAME,
     fileObj:IOBase=None,
@@ -278,7 +424,7 @@ def get_mysql_connection(
         password = SECRET_CONSTANTS.get_secret_payload(secretID="sql-coursefinity-password")
 
     if (debug):
-        LOCAL_SQL_CONFIG = {"host": "localhost", "user": user, "password": password}
+        LOCAL_SQL_CONFIG = {"host": "localhost", "user": user, "password": password, "cursorclass": InstrumentedCursor}
         if (database is not None):
             LOCAL_SQL_CONFIG["database"] = database
         connection = pymysql.connect(**LOCAL_SQL_CONFIG)
@@ -288,10 +434,32 @@ def get_mysql_connection(
             driver="pymysql",
             user=user,
             password=password,
-            database=database
+            database=database,
+            cursorclass=InstrumentedCursor
         )
     return connection
 
+# The MySQL connection pool for the web application's "coursefinity" MySQL account.
+# Each gunicorn worker imports this module and hence gets its own pool.
+# Note: Connections are only opened when they are first borrowed.
+MYSQL_POOL = MySQLConnectionPool(
+    connectionFactory=get_mysql_connection,
+    maxSize=CONSTANTS.SQL_POOL_MAX_SIZE,
+    acquireTimeout=CONSTANTS.SQL_POOL_ACQUIRE_TIMEOUT,
+    maxConnectionAge=CONSTANTS.SQL_POOL_MAX_CONNECTION_AGE,
+    maxIdleTime=CONSTANTS.SQL_POOL_MAX_IDLE_TIME,
+    pingAfterIdle=CONSTANTS.SQL_POOL_PING_AFTER_IDLE
+)
+
+# The bounded executor for the Argon2 password hashing and verification of this gunicorn worker
+# which raises PasswordHashingBusyError when it is saturated.
+PASSWORD_HASHING_EXECUTOR = PasswordHashingExecutor(
+    passwordHasher=CONSTANTS.PH,
+    maxConcurrency=CONSTANTS.PASSWORD_HASHING_MAX_CONCURRENCY,
+    maxQueueSize=CONSTANTS.PASSWORD_HASHING_MAX_QUEUE_SIZE,
+    queueDeadline=CONSTANTS.PASSWORD_HASHING_QUEUE_DEADLINE
+)
+
 def get_dicebear_image(username:str) -> str:
     """
     Returns a random dicebear image from the database
@@ -540,6 +708,51 @@ def write_log_entry(logName:str=CONSTANTS.LOGGING_NAME, logMessage:Union[str, di
     else:
         raise ValueError("logMessage must be a str or dict")
 
+def kms_generate_random_bytes(nBytes:int=1024) -> bytes:
+    """
+    Generate random bytes from Google Cloud Platform KMS API's random number generator in the HSM.
+
+    Note: Makes an API call per 1024 bytes (the limit of GCP KMS RNG Cloud HSM),
+    hence the callers should take the random bytes from HSM_ENTROPY_POOL instead.
+
+    Args:
+    - nBytes (int): The number of random bytes to generate (at least 8 bytes).
+
+    Returns:
+    - The random bytes
+    """
+    if (nBytes < 8):
+        raise ValueError("nBytes must be at least 8 bytes for GCP KMS RNG Cloud HSM!")
+
+    # Construct the location name
+    locationName = SECRET_CONSTANTS.KMS_CLIENT.common_location_path(CONSTANTS.GOOGLE_PROJECT_ID, CONSTANTS.LOCATION_ID)
+
+    # make multiple API calls to generate the random bytes if it exceeds GCP KMS RNG Cloud HSM limit
+    bytesArr = []
+    while (nBytes > 0):
+        # the last call is made for at least 8 bytes as it is the minimum length
+        lengthBytes = min(CONSTANTS.KMS_RANDOM_BYTES_MAX_LENGTH, max(nBytes, 8))
+        bytesArr.append(
+            SECRET_CONSTANTS.KMS_CLIENT.generate_random_bytes(
+                request={
+                    "location": locationName,
+                    "length_bytes": lengthBytes,
+                    "protection_level": kms.ProtectionLevel.HSM
+                }
+            ).data
+        )
+        nBytes -= lengthBytes
+    return b"".join(bytesArr)
+
+# The pool of random bytes from GCP KMS Cloud HSM of this gunicorn worker,
+# refilled in the background so that generating random bytes does not wait for the API.
+HSM_ENTROPY_POOL = EntropyPool(
+    fetchFunc=kms_generate_random_bytes,
+    highWaterMark=CONSTANTS.HSM_ENTROPY_POOL_HIGH_WATER_MARK,
+    lowWaterMark=CONSTANTS.HSM_ENTROPY_POOL_LOW_WATER_MARK,
+    name="HSM entropy pool"
+)
+
 def generate_secure_random_bytes(nBytes:int=512, generateFromHSM:bool=False, returnHex:bool=False) -> Union[bytes, str]:
     """
     Generate a random byte/hex string of length nBytes that is cryptographicy secure.
@@ -553,6 +766,8 @@ def generate_secure_random_bytes(nBytes:int=512, generateFromHSM:bool=False, ret
             - The random number generator is generated in the HSM
             - Higher entropy than generating by your own
             - More details: https://cloud.google.com/kms/docs/generate-random
+        - The random bytes are taken from HSM_ENTROPY_POOL without any API call and if the pool
+          does not have enough bytes, it falls back to the secrets library (counted in the pool's stats).
         - Defaults to False to use the secrets library to generate random bytes.
             - Recommended by OWASP to use secrets library to ensure higher entropy
             - More details: https://cheatsheetseries.owasp.org/cheatsheets/Cryptographic_Storage_Cheat_Sheet.html#secure-random-number-generation
@@ -565,53 +780,13 @@ def generate_secure_random_bytes(nBytes:int=512, generateFromHSM:bool=False, ret
     if (nBytes < 1):
         raise ValueError("nBytes must be greater than 0!")
 
-    # Since GCP KMS RNG Cloud HSM's minimum length is 8 bytes, 
-    # fallback to secrets library if nBytes is less than 8
-    if (not generateFromHSM or nBytes < 8):
+    randomBytes = HSM_ENTROPY_POOL.take(nBytes) if (generateFromHSM) else None
+    if (randomBytes is None):
         if (returnHex):
             return token_hex(nBytes)
         else:
             return token_bytes(nBytes)
 
-    # Construct the location name
-    locationName = SECRET_CONSTANTS.KMS_CLIENT.common_location_path(CONSTANTS.GOOGLE_PROJECT_ID, CONSTANTS.LOCATION_ID)
-
-    # Check if the number of bytes exceeds GCP KMS RNG Cloud HSM limit
-    if (nBytes > 1024):
-        # if exceeded, make multiple API calls to generate the random bytes
-        bytesArr = []
-        maxBytes = 1024
-        numOfMaxBytes = nBytes // maxBytes
-        for _ in range(numOfMaxBytes):
-            bytesArr.append(
-                SECRET_CONSTANTS.KMS_CLIENT.generate_random_bytes(
-                    request={
-                        "location": locationName,
-                        "length_bytes": maxBytes,
-                        "protection_level": kms.ProtectionLevel.HSM
-                    }
-                )
-            )
-
-        remainder = nBytes % maxBytes
-        if (remainder > 0):
-            bytesArr.append(
-                SECRET_CONSTANTS.KMS_CLIENT.generate_random_bytes(
-                    request={
-                        "location": locationName,
-                        "length_bytes": remainder,
-                        "protection_level": kms.ProtectionLevel.HSM
-                    }
-                )
-            )
-        randomBytes = b"".join(bytesArr)
-    else:
-        # Call the Google Cloud Platform API to generate a random byte string.
-        randomBytesResponse = SECRET_CONSTANTS.KMS_CLIENT.generate_random_bytes(
-            request={"location": locationName, "length_bytes": nBytes, "protection_level": kms.ProtectionLevel.HSM}
-        )
-        randomBytes = randomBytesResponse.data
-
     if (returnHex):
         return randomBytes.hex()
     else:
@@ -648,9 +823,10 @@ def crc32c(data:Union[bytes, str]) -> int:
     """
     return int(g_crc32c(initial_value=ensure_binary(data)).hexdigest(), 16)
 
-def symmetric_encrypt(plaintext:Union[str, bytes]="", keyRingID:str=CONSTANTS.APP_KEY_RING_ID, keyID:str="") -> bytes:
+def kms_symmetric_encrypt(plaintext:Union[str, bytes]="", keyRingID:str=CONSTANTS.APP_KEY_RING_ID, keyID:str="") -> bytes:
     """
-    Using Google Symmetric Encryption Algorithm, encrypt the provided plaintext.
+    Using Google Symmetric Encryption Algorithm, encrypt the provided plaintext
+    with Google Cloud KMS API (one API call per plaintext).
 
     Args:
     - plaintext (str|bytes): the plaintext to encrypt
@@ -686,14 +862,15 @@ def symmetric_encrypt(plaintext:Union[str, bytes]="", keyRingID:str=CONSTANTS.AP
 
     return response.ciphertext
 
-def symmetric_decrypt(
+def kms_symmetric_decrypt(
     ciphertext:bytes=b"", 
     keyRingID:str=CONSTANTS.APP_KEY_RING_ID, 
     keyID:str="", 
     decode:Optional[bool]=True
 ) -> Union[str, bytes]:
     """
-    Using Google Symmetric Encryption Algorithm, decrypt the provided ciphertext.
+    Using Google Symmetric Encryption Algorithm, decrypt the provided ciphertext
+    with Google Cloud KMS API (one API call per ciphertext).
 
     Args:
     - ciphertext (bytes): the ciphertext to decrypt
@@ -750,6 +927,240 @@ def symmetric_decrypt(
 
     return response.plaintext.decode("utf-8") if (decode) else response.plaintext
 
+# The unwrapped data encryption keys (DEK) for envelope encryption,
+# key: (KMS key ID, DEK secret version ID), value: AESGCM object of the DEK
+DATA_ENCRYPTION_KEYS: dict[tuple, AESGCM] = {}
+DATA_ENCRYPTION_KEYS_LOCK = threading.Lock()
+# The DEK secret versions that were not found, key: (KMS key ID, DEK secret version ID),
+# value: the monotonic time it was checked so that Google Cloud Secret Manager API is not called
+# on every encryption until the DEK is created or on every decryption of a destroyed DEK version
+MISSING_DATA_ENCRYPTION_KEYS: dict[tuple, float] = {}
+# The monotonic time that the latest DEK version of the KMS key ID was last refreshed for a newer DEK version
+LATEST_DEK_VERSION_REFRESHES: dict[str, float] = {}
+ENVELOPE_HEADER_LENGTH = len(CONSTANTS.ENVELOPE_CIPHERTEXT_PREFIX) + 4 # prefix + 4 bytes DEK version
+ENVELOPE_NONCE_LENGTH = 12
+
+def get_data_encryption_key(keyID:str, versionID:str="latest") -> tuple:
+    """
+    Get the data encryption key (DEK) for envelope encryption which is stored in Google Cloud Secret Manager API
+    wrapped (encrypted) by the KMS key. The DEK is only unwrapped with Google Cloud KMS API once per version.
+
+    Args:
+    - keyID (str): The KMS key ID that wraps the DEK
+    - versionID (str): The version ID of the DEK secret
+        - Defaults to "latest" which is refreshed with the secret cache (to pick up rotated DEKs)
+
+    Returns:
+    - A tuple of the AESGCM object and the DEK version (int), or (None, None) if the DEK does not exist
+    """
+    if (versionID != "latest"):
+        # the DEK versions are immutable, hence the unwrapped DEK is used without checking the secret
+        dataEncryptionKey = DATA_ENCRYPTION_KEYS.get((keyID, versionID))
+        if (dataEncryptionKey is not None):
+            return dataEncryptionKey, int(versionID)
+        if (not is_existing_dek_version(keyID, versionID)):
+            return None, None
+
+    missingKey = (keyID, versionID)
+    if (monotonic() - MISSING_DATA_ENCRYPTION_KEYS.get(missingKey, float("-inf")) < CONSTANTS.SECRET_CACHE_TTL):
+        return None, None
+
+    wrappedKey, resolvedVersionID = SECRET_CONSTANTS.get_secret_payload(
+        secretID=f"{keyID}{CONSTANTS.ENVELOPE_DEK_SECRET_SUFFIX}", versionID=versionID, decodeSecret=False, returnVersionID=True
+    )
+    if (wrappedKey is None):
+        MISSING_DATA_ENCRYPTION_KEYS[missingKey] = monotonic()
+        return None, None
+
+    cacheKey = (keyID, resolvedVersionID)
+    dataEncryptionKey = DATA_ENCRYPTION_KEYS.get(cacheKey)
+    if (dataEncryptionKey is None):
+        with DATA_ENCRYPTION_KEYS_LOCK:
+            dataEncryptionKey = DATA_ENCRYPTION_KEYS.get(cacheKey)
+            if (dataEncryptionKey is None):
+                dataEncryptionKey = DATA_ENCRYPTION_KEYS[cacheKey] = AESGCM(
+                    kms_symmetric_decrypt(ciphertext=wrappedKey, keyID=keyID, decode=False)
+                )
+    return dataEncryptionKey, int(resolvedVersionID)
+
+def is_existing_dek_version(keyID:str, versionID:str) -> bool:
+    """
+    Check that the DEK version (e.g. from a ciphertext header which can be forged)
+    is not newer than the latest DEK version before retrieving it from Google Cloud Secret Manager API.
+
+    If it is newer, the DEK might have been rotated by another worker, hence the latest DEK version is
+    refreshed but only once every DEK_VERSION_REFRESH_INTERVAL seconds per KMS key ID.
+
+    Args:
+    - keyID (str): The KMS key ID that wraps the DEK
+    - versionID (str): The version ID of the DEK secret
+
+    Returns:
+    - True if the DEK version is not newer than the latest DEK version (bool)
+    """
+    if (not versionID.isdigit() or int(versionID) < 1):
+        return False
+
+    _, latestVersion = get_data_encryption_key(keyID)
+    if (latestVersion is not None and int(versionID) <= latestVersion):
+        return True
+
+    with DATA_ENCRYPTION_KEYS_LOCK:
+        now = monotonic()
+        if (now - LATEST_DEK_VERSION_REFRESHES.get(keyID, float("-inf")) < CONSTANTS.DEK_VERSION_REFRESH_INTERVAL):
+            return False
+        LATEST_DEK_VERSION_REFRESHES[keyID] = now
+
+    SECRET_CONSTANTS.invalidate_secret(secretID=f"{keyID}{CONSTANTS.ENVELOPE_DEK_SECRET_SUFFIX}", versionID="latest")
+    MISSING_DATA_ENCRYPTION_KEYS.pop((keyID, "latest"), None)
+    _, latestVersion = get_data_encryption_key(keyID)
+    return (latestVersion is not None and int(versionID) <= latestVersion)
+
+def rotate_data_encryption_key(keyID:str) -> None:
+    """
+    Generate a new 256-bit data encryption key (DEK) from GCP KMS Cloud HSM, wrap it with the KMS key
+    and add it as a new version of the DEK secret in Google Cloud Secret Manager API.
+    The secret will be created if it does not exist yet.
+
+    The past versions are NOT destroyed as they are needed to decrypt the data encrypted with them.
+    Use sample/reencrypt_database.py to re-encrypt the data with the latest DEK.
+
+    Args:
+    - keyID (str): The KMS key ID that wraps the DEK
+    """
+    secretID = f"{keyID}{CONSTANTS.ENVELOPE_DEK_SECRET_SUFFIX}"
+    try:
+        SECRET_CONSTANTS.SM_CLIENT.create_secret(request={
+            "parent": f"projects/{CONSTANTS.GOOGLE_PROJECT_ID}",
+            "secret_id": secretID,
+            "secret": {"replication": {"automatic": {}}}
+        })
+    except (GoogleErrors.AlreadyExists):
+        pass
+
+    wrappedKey = kms_symmetric_encrypt(
+        plaintext=generate_secure_random_bytes(nBytes=32, generateFromHSM=True), keyID=keyID
+    )
+    upload_new_secret_version(secretID=secretID, secret=wrappedKey, destroyPastVer=False)
+    MISSING_DATA_ENCRYPTION_KEYS.pop((keyID, "latest"), None)
+
+def create_missing_data_encryption_keys() -> int:
+    """
+    Create the first version of the data encryption keys (DEK) of ENVELOPE_ENCRYPTION_KEY_IDS that do not exist yet.
+
+    Returns:
+    - The number of DEKs created (int)
+    """
+    numOfCreatedKeys = 0
+    for keyID in CONSTANTS.ENVELOPE_ENCRYPTION_KEY_IDS:
+        wrappedKey = SECRET_CONSTANTS.get_secret_payload(
+            secretID=f"{keyID}{CONSTANTS.ENVELOPE_DEK_SECRET_SUFFIX}", decodeSecret=False, useCache=False
+        )
+        if (wrappedKey is None):
+            rotate_data_encryption_key(keyID)
+            numOfCreatedKeys += 1
+    return numOfCreatedKeys
+
+def symmetric_encrypt(plaintext:Union[str, bytes]="", keyRingID:str=CONSTANTS.APP_KEY_RING_ID, keyID:str="") -> bytes:
+    """
+    Encrypt the provided plaintext.
+
+    For the KMS keys in ENVELOPE_ENCRYPTION_KEY_IDS, the plaintext is encrypted locally using AES-256-GCM
+    with the latest data encryption key (DEK) wrapped by the KMS key (see get_data_encryption_key()).
+    The ciphertext format is: prefix (4 bytes) | DEK version (4 bytes) | nonce (12 bytes) | ciphertext and tag
+    where the header (prefix and DEK version) and the KMS key ID are authenticated as associated data.
+
+    Otherwise (or if the DEK has not been created), the plaintext is encrypted by Google Cloud KMS API.
+
+    Args:
+    - plaintext (str|bytes): the plaintext to encrypt
+    - keyRingID (str): the key ring ID
+        - Defaults to APP_KEY_RING_ID defined in Constants.py
+    - keyID (str): the key ID/name of the key
+
+    Returns:
+    - ciphertext (bytes): the ciphertext
+    """
+    if (keyRingID != CONSTANTS.APP_KEY_RING_ID or keyID not in CONSTANTS.ENVELOPE_ENCRYPTION_KEY_IDS):
+        return kms_symmetric_encrypt(plaintext=plaintext, keyRingID=keyRingID, keyID=keyID)
+
+    dataEncryptionKey, dekVersion = get_data_encryption_key(keyID)
+    if (dataEncryptionKey is None):
+        # the DEK has not been created yet, see rotate_data_encryption_key()
+        return kms_symmetric_encrypt(plaintext=plaintext, keyRingID=keyRingID, keyID=keyID)
+
+    if (isinstance(plaintext, str)):
+        plaintext = plaintext.encode("utf-8")
+
+    header = CONSTANTS.ENVELOPE_CIPHERTEXT_PREFIX + dekVersion.to_bytes(4, "big")
+    nonce = token_bytes(ENVELOPE_NONCE_LENGTH)
+    return header + nonce + dataEncryptionKey.encrypt(nonce, plaintext, header + keyID.encode("utf-8"))
+
+def symmetric_decrypt(
+    ciphertext:bytes=b"", 
+    keyRingID:str=CONSTANTS.APP_KEY_RING_ID, 
+    keyID:str="", 
+    decode:Optional[bool]=True
+) -> Union[str, bytes]:
+    """
+    Decrypt the provided ciphertext that was encrypted by symmetric_encrypt().
+
+    Ciphertexts with the envelope header are decrypted locally with the DEK version in the header.
+    Otherwise, the ciphertext is decrypted by Google Cloud KMS API (e.g. data encrypted
+    before envelope encryption was used) so that the existing data can still be decrypted.
+
+    Args:
+    - ciphertext (bytes): the ciphertext to decrypt
+    - keyRingID (str): the key ring ID
+        - Defaults to APP_KEY_RING_ID defined in Constants.py
+    - keyID (str): the key ID/name of the key
+    - decode (bool): whether to decode the decrypted plaintext to string
+        - Defaults to True
+
+    Returns:
+    - plaintext (str): the plaintext
+
+    Raises:
+    - CiphertextIsNotBytesError: If the ciphertext is not bytes
+    - DecryptionError: If the decryption failed
+    - CRC32ChecksumError: If the CRC32C checksum does not match
+    """
+    if (isinstance(ciphertext, bytearray)):
+        ciphertext = bytes(ciphertext)
+
+    if (not isinstance(ciphertext, bytes)):
+        raise CiphertextIsNotBytesError(f"The ciphertext, {ciphertext} is in \"{type(ciphertext)}\" format. Please pass in a bytes type variable.")
+
+    # KMS ciphertexts are serialised protobufs which never start with the envelope prefix
+    if (not ciphertext.startswith(CONSTANTS.ENVELOPE_CIPHERTEXT_PREFIX)):
+        return kms_symmetric_decrypt(ciphertext=ciphertext, keyRingID=keyRingID, keyID=keyID, decode=decode)
+
+    if (keyRingID != CONSTANTS.APP_KEY_RING_ID or keyID not in CONSTANTS.ENVELOPE_ENCRYPTION_KEY_IDS):
+        raise DecryptionError("Symmetric Decryption failed.")
+
+    header = ciphertext[:ENVELOPE_HEADER_LENGTH]
+    nonce = ciphertext[ENVELOPE_HEADER_LENGTH:ENVELOPE_HEADER_LENGTH + ENVELOPE_NONCE_LENGTH]
+    dekVersion = int.from_bytes(header[len(CONSTANTS.ENVELOPE_CIPHERTEXT_PREFIX):], "big")
+    dataEncryptionKey, _ = get_data_encryption_key(keyID, versionID=str(dekVersion))
+    if (dataEncryptionKey is None or len(nonce) != ENVELOPE_NONCE_LENGTH):
+        raise DecryptionError("Symmetric Decryption failed.")
+
+    try:
+        plaintext = dataEncryptionKey.decrypt(
+            nonce, ciphertext[ENVELOPE_HEADER_LENGTH + ENVELOPE_NONCE_LENGTH:], header + keyID.encode("utf-8")
+        )
+    except (InvalidTag):
+        write_log_entry(
+            logMessage={
+                "Decryption Error": f"Invalid authentication tag with the DEK version {dekVersion} of {keyID}",
+                "URL-base64 Encoded Ciphertext": urlsafe_b64encode(ciphertext).decode("utf-8")
+            },
+            severity="INFO"
+        )
+        raise DecryptionError("Symmetric Decryption failed.")
+
+    return plaintext.decode("utf-8") if (decode) else plaintext
+
 class ExpiryProperties:
     """
     Class to format a timezone aware datetime object for expiry datetime used in tokens (NOT JWT).
@@ -933,6 +1344,9 @@ def upload_new_secret_version(secretID:Union[str, bytes]=None, secret:str=None,
     # Add the secret version and send to Google Secret Management API
     response = SECRET_CONSTANTS.SM_CLIENT.add_secret_version(parent=secretPath, payload={"data": secret, "data_crc32c": crc32cChecksum})
 
+    # remove the outdated cached secret so that the new version will be used on the next access
+    SECRET_CONSTANTS.invalidate_secret(secretID=secretID)
+
     # get the latest secret version
     latestVer = int(response.name.split("/")[-1])
     write_log_entry(
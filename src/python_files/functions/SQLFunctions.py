@@ -3,19 +3,21 @@ This python file contains all the functions that touches on the MySQL database.
 """
 # import python standard libraries
 import json
+from time import sleep, perf_counter
 from socket import inet_aton, inet_pton, AF_INET6
-from typing import Union, Optional
-from datetime import datetime, timedelta
+from typing import Union, Optional, Callable
+from datetime import datetime, timedelta, time
 from zoneinfo import ZoneInfo
 from hashlib import sha512
 from math import ceil
-from base64 import b85encode, urlsafe_b64decode, urlsafe_b64encode
+from base64 import b85encode, urlsafe_b64encode
 
 # import Flask web application configs
-from flask import url_for, current_app, abort
+from flask import url_for, current_app, abort, g, has_request_context, session, request
 
 # import third party libraries
 from argon2.exceptions import VerificationError, VerifyMismatchError, InvalidHash
+import pymysql
 import pymysql.err as MySQLErrors
 from pymysql.connections import Connection as MySQLConnection
 import requests
@@ -25,9 +27,16 @@ from python_files.classes.Course import CourseInfo
 from python_files.classes.User import UserInfo
 from python_files.classes.Errors import *
 from python_files.classes.Reviews import ReviewInfo, Reviews
+from python_files.classes.ConnectionPool import UnitOfWorkConnection
+from python_files.classes.TTLCache import TTLCache
+from python_files.classes.PurgeQueries import PurgeQuery, PURGE_QUERIES
+from python_files.classes.Roles import RBAC_DECISION_TABLE_CACHE
+from python_files.classes.SQLInstrumentation import SQL_METRICS, CURRENT_SQL_OPERATION
 from .NormalFunctions import generate_id, pwd_has_been_pwned, pwd_is_strong, \
                              symmetric_encrypt, symmetric_decrypt, get_dicebear_image, \
-                             send_email, write_log_entry, get_mysql_connection, delete_blob, generate_secure_random_bytes, ExpiryProperties, decode_and_decrypt_token
+                             send_email, write_log_entry, MYSQL_POOL, delete_blob, generate_secure_random_bytes, ExpiryProperties, decode_and_decrypt_token, \
+                             generate_url_token, decode_url_token, \
+                             encode_pagination_cursor, decode_pagination_cursor, PASSWORD_HASHING_EXECUTOR
 from python_files.classes.Constants import CONSTANTS
 from .VideoFunctions import delete_video, add_video_tag, check_video, edit_video_tag
 
@@ -159,6 +168,104 @@ def send_unlock_locked_acc_email(email:str="", userID:str="") -> None:
     )
     send_email(to=email, subject="Unlock your account!", body="<br>".join(htmlBody))
 
+def get_sgt_now() -> datetime:
+    """
+    Returns the current SGT (UTC+8) datetime without the timezone info,
+    the same value as the SGT_NOW() MySQL function.
+
+    Used to pass the time bounds of the queries as parameters so that the bounds are constants
+    to the MySQL optimizer and the datetime columns' indexes can be used for range scans.
+    Calling SGT_NOW() in a WHERE clause is evaluated per row as it is a stored function.
+    """
+    return datetime.now(tz=ZoneInfo("Asia/Singapore")).replace(tzinfo=None, microsecond=0)
+
+def get_last_accessed_bound(days:int=10) -> datetime:
+    """
+    Returns the earliest last_accessed datetime of the user_ip_addresses rows that were
+    accessed within the last x days, same as the DATEDIFF(SGT_NOW(), last_accessed) <= x check
+    which compares the dates only.
+
+    Args:
+    - days (int): The number of days
+
+    Returns:
+    - The start of the day (SGT) x days ago
+    """
+    return datetime.combine(get_sgt_now().date() - timedelta(days=days), time.min)
+
+def purge_in_batches(
+    connection:MySQLConnection,
+    purgeQuery:PurgeQuery,
+    params:dict,
+    batchSize:int=CONSTANTS.PURGE_BATCH_SIZE,
+    sleepBetweenBatches:float=CONSTANTS.PURGE_BATCH_SLEEP,
+    onProgress:Optional[Callable[[dict], None]]=None
+) -> int:
+    """
+    Delete the rows matching the condition in batches by their primary key,
+    committing after every batch so that each transaction only holds the
+    row locks of one batch instead of the locks of all the matching rows.
+
+    Each batch selects the primary keys of the next matching rows using the index of the orderBy column
+    and deletes them with the condition re-checked in case the rows were updated in the meantime.
+
+    Note: Not meant for the request's connection as its commits are deferred to the end of the request.
+
+    Args:
+    - connection (MySQLConnection): The MySQL connection
+    - purgeQuery (PurgeQuery): The table, primary key, condition and orderBy column(s) from PURGE_QUERIES
+    - params (dict): The parameters of the condition
+    - batchSize (int): The number of rows to delete per transaction
+    - sleepBetweenBatches (float): The number of seconds to sleep between the batches
+    - onProgress (Callable, Optional): Called after every batch with the progress, e.g.
+        {"table": "session", "batches": 3, "rowsDeleted": 2500, "elapsedMs": 180}
+
+    Returns:
+    - The total number of rows deleted (int)
+    """
+    table = purgeQuery.table
+    selectQuery = purgeQuery.get_select_query(batchSize)
+
+    cur = connection.cursor()
+    startTime = perf_counter()
+    progress = {"table": table, "batches": 0, "rowsDeleted": 0, "elapsedMs": 0}
+    while (1):
+        cur.execute(selectQuery, params)
+        primaryKeys = cur.fetchall()
+        if (not primaryKeys):
+            break
+
+        # the primary keys are positional parameters while the condition's are named,
+        # hence the two parts of the query are escaped separately
+        cur.execute(
+            cur.mogrify(purgeQuery.get_delete_query(len(primaryKeys)), [value for key in primaryKeys for value in key])
+            + cur.mogrify(purgeQuery.get_condition_clause(), params)
+        )
+        connection.commit()
+
+        progress["batches"] += 1
+        progress["rowsDeleted"] += cur.rowcount
+        progress["elapsedMs"] = round((perf_counter() - startTime) * 1000)
+        if (onProgress is not None):
+            onProgress(progress.copy())
+
+        if (len(primaryKeys) < batchSize):
+            break # no more matching rows
+        if (sleepBetweenBatches > 0):
+            sleep(sleepBetweenBatches)
+
+    if (progress["rowsDeleted"] > 0):
+        write_log_entry(
+            logMessage={
+                "Purged table": table,
+                "Rows deleted": progress["rowsDeleted"],
+                "Batches": progress["batches"],
+                "Duration (ms)": progress["elapsedMs"]
+            },
+            severity="INFO"
+        )
+    return progress["rowsDeleted"]
+
 def get_image_path(userID:str, returnUserInfo:bool=False, getCart:Optional[bool]=False) -> Union[str, UserInfo]:
     """
     Returns the image path for the user.
@@ -168,6 +275,9 @@ def get_image_path(userID:str, returnUserInfo:bool=False, getCart:Optional[bool]
 
     If returnUserInfo is True, it will return a tuple of the user's record.
 
+    The current user's UserInfo object is memoized on flask.g for the rest of the request
+    (set when the session is validated in before_request) so that it is only retrieved once.
+
     Args:
     - userID (str): The user's ID
     - returnUserInfo (bool): If True, it will return a tuple of the user's record.
@@ -178,7 +288,20 @@ def get_image_path(userID:str, returnUserInfo:bool=False, getCart:Optional[bool]
     - The image path (str) only if returnUserInfo is False
     - The UserInfo object with the profile image path in the object if returnUserInfo is True
     """
-    userInfo = sql_operation(table="user", mode="get_user_data", userID=userID, getCart=getCart)
+    userInfo = None
+    if (has_request_context()):
+        currentUserInfo = g.get("currentUserInfo")
+        if (
+            currentUserInfo is not None and currentUserInfo.uid == userID and
+            (not getCart or g.get("currentUserInfoHasCart", False))
+        ):
+            userInfo = currentUserInfo
+
+    if (userInfo is None):
+        userInfo = sql_operation(table="user", mode="get_user_data", userID=userID, getCart=getCart)
+        if (has_request_context() and userID in (session.get("user"), session.get("admin"))):
+            g.currentUserInfo = userInfo
+            g.currentUserInfoHasCart = getCart
 
     # Since the admin user will not have an upload profile image feature,
     # return an empty string for the image profile src link if the user is the admin user.
@@ -189,6 +312,23 @@ def get_image_path(userID:str, returnUserInfo:bool=False, getCart:Optional[bool]
     imageSrcPath = userInfo.profileImage
     return imageSrcPath if (not returnUserInfo) else userInfo
 
+def get_reviewer_image_path(username:str, profileImage:Optional[str], roleName:str) -> str:
+    """
+    Returns the image path for the user from the columns already retrieved with
+    the user's review, following the same rules as get_image_path() without querying the database.
+
+    Args:
+    - username (str): The user's username
+    - profileImage (str, Optional): The user's profile_image column
+    - roleName (str): The user's role name
+
+    Returns:
+    - The image path (str)
+    """
+    if (roleName == "Admin"):
+        return "https://storage.googleapis.com/coursefinity/user-profiles/default.png"
+    return get_dicebear_image(username) if (profileImage is None) else profileImage
+
 def format_user_info(userInfo:tuple) -> UserInfo:
     """
     Format the user's information to be returned to the client.
@@ -202,9 +342,430 @@ def format_user_info(userInfo:tuple) -> UserInfo:
     userProfile = get_dicebear_image(userInfo[2]) if (userInfo[6] is None) else userInfo[6]
     return UserInfo(tupleData=userInfo, userProfile=userProfile)
 
+def get_course_purchase_flags(cur:pymysql.cursors.Cursor, userID:Optional[str], courseIDList:list) -> dict:
+    """
+    Get the purchased and in cart flags of the user for a page of courses
+    in a single query instead of querying the purchased_courses and cart tables per course.
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor of the SQL operation
+    - userID (str, Optional): The ID of the logged in user
+        - Default: None, the flags will all be False
+    - courseIDList (list): The IDs of the courses
+
+    Returns:
+    - A dict of the course IDs mapped to {"purchased": bool, "isInCart": bool}
+    """
+    flags = {courseID: {"purchased": False, "isInCart": False} for courseID in courseIDList}
+    if (userID is None or not courseIDList):
+        return flags
+
+    courseIDTuple = tuple(flags)
+    cur.execute("""
+        SELECT course_id, 'purchased' FROM purchased_courses WHERE user_id=%(userID)s AND course_id IN %(courseIDs)s
+        UNION ALL
+        SELECT course_id, 'isInCart' FROM cart WHERE user_id=%(userID)s AND course_id IN %(courseIDs)s
+    """, {"userID":userID, "courseIDs":courseIDTuple})
+    for courseID, flagName in cur.fetchall():
+        flags[courseID][flagName] = True
+    return flags
+
+def build_fulltext_search_query(searchInput:str) -> str:
+    """
+    Build a FULLTEXT boolean mode search query from the user's search input
+    where every word must be matched as a prefix of a word in the course name or description.
+
+    Characters that are FULLTEXT boolean operators are removed while stopwords and words
+    shorter than the FULLTEXT minimum token size are dropped as they are not indexed.
+
+    E.g. "Learn C++ & Python!" -> "+learn* +python*"
+
+    Args:
+    - searchInput (str): The user's search input
+
+    Returns:
+    - The boolean mode search query (str), an empty string if there are no searchable words
+    """
+    searchTerms = []
+    for term in CONSTANTS.SEARCH_TERM_REGEX.findall(searchInput.lower()):
+        if (
+            len(term) >= CONSTANTS.FULLTEXT_MIN_TOKEN_SIZE
+            and term not in CONSTANTS.FULLTEXT_STOPWORDS
+            and term not in searchTerms
+        ):
+            searchTerms.append(term)
+    return " ".join(f"+{term}*" for term in searchTerms[:CONSTANTS.FULLTEXT_MAX_SEARCH_TERMS])
+
+# Cache of the total number of rows of the paginated listings
+# that are not scoped to a single user/teacher/course (e.g. search results, user management)
+PAGINATION_COUNT_CACHE = TTLCache(
+    ttl=CONSTANTS.PAGINATION_COUNT_CACHE_TTL, maxSize=CONSTANTS.PAGINATION_COUNT_CACHE_MAX_SIZE
+)
+
+def get_total_count(cur:pymysql.cursors.Cursor, query:str, params:dict, cacheKey:Optional[tuple]=None) -> int:
+    """
+    Get the total number of rows for the pagination of a listing.
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor of the SQL operation
+    - query (str): The SELECT COUNT(*) query
+    - params (dict): The parameters of the query
+    - cacheKey (tuple, Optional): If defined, the count will be cached for PAGINATION_COUNT_CACHE_TTL seconds
+        - Default: None, will not cache the count
+
+    Returns:
+    - The total number of rows (int)
+    """
+    def count_rows() -> int:
+        cur.execute(query, params)
+        return cur.fetchone()[0]
+
+    if (cacheKey is None):
+        return count_rows()
+    return PAGINATION_COUNT_CACHE.get_or_set(cacheKey, count_rows)
+
+def paginate_by_keyset(
+    cur:pymysql.cursors.Cursor, procedureName:str, filterArgs:tuple, pageNum:int,
+    pageCursor:Optional[str], totalCount:int, sortKeyIndices:tuple
+) -> tuple:
+    """
+    Get a page of rows from a stored procedure created by create_keyset_pagination_procedure()
+    in sample/create_mysql_database.py.
+
+    If the page cursor is valid for the page number, the page is retrieved by seeking from the cursor's
+    sort key so that deep pages cost the same as the first page. Otherwise, e.g. when jumping
+    to a page number from the pagination buttons, the page is retrieved by its offset.
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor of the SQL operation
+    - procedureName (str): The name of the stored procedure
+    - filterArgs (tuple): The arguments for the procedure's filter parameters
+    - pageNum (int): The page number
+    - pageCursor (str, Optional): The cursor token from the URL
+    - totalCount (int): The total number of rows
+    - sortKeyIndices (tuple): The indices of the (datetime, ID) sort key columns in the returned rows
+
+    Returns:
+    - A tuple of (rows, maxPage, pageCursors) where pageCursors is a dict of
+        the "prev", "next" and "last" page cursor tokens (str|None)
+    """
+    pageSize = 10
+    maxPage = max(ceil(totalCount / pageSize), 1)
+    pageNum = min(pageNum, 2147483647)
+    if (pageNum > maxPage):
+        return ([], maxPage, {})
+
+    cursorInfo = decode_pagination_cursor(pageCursor, pageNum)
+    pageOffset, sortValue, sortID, isBackward = (pageNum - 1) * pageSize, None, None, False
+    if (cursorInfo is not None):
+        pageOffset, isBackward = 0, cursorInfo["isBackward"]
+        if (cursorInfo["sortKey"] is not None):
+            sortValue, sortID = cursorInfo["sortKey"]
+        elif (isBackward):
+            # the last page is retrieved by seeking backward from the end of the results
+            # (the cached total counts are invalidated after the writes to the listings, see invalidate_after_commit())
+            pageSize = totalCount - (maxPage - 1) * pageSize
+
+    placeholders = ", ".join(["%s"] * (len(filterArgs) + 5))
+    cur.execute(
+        f"CALL {procedureName}({placeholders})",
+        (*filterArgs, pageOffset, max(pageSize, 1), sortValue, sortID, isBackward)
+    )
+    rows = cur.fetchall() or ()
+
+    sortIndex, idIndex = sortKeyIndices
+    pageCursors = {"prev": None, "next": None, "last": None}
+    if (rows):
+        if (pageNum > 1):
+            pageCursors["prev"] = encode_pagination_cursor(
+                pageNum - 1, (rows[0][sortIndex], rows[0][idIndex]), isBackward=True
+            )
+        if (pageNum < maxPage):
+            pageCursors["next"] = encode_pagination_cursor(
+                pageNum + 1, (rows[-1][sortIndex], rows[-1][idIndex])
+            )
+            pageCursors["last"] = encode_pagination_cursor(maxPage, isBackward=True)
+    return (rows, maxPage, pageCursors)
+
+COURSE_CAROUSEL_CACHE = TTLCache(
+    ttl=CONSTANTS.COURSE_CAROUSEL_CACHE_TTL, maxSize=CONSTANTS.COURSE_CAROUSEL_CACHE_MAX_SIZE
+)
+
+def get_course_carousel(mode:str, userID:Optional[str]=None, teacherID:Optional[str]=None) -> tuple:
+    """
+    Get the courses of a course carousel ("get_3_latest_courses" or "get_3_highly_rated_courses")
+    from the in-memory cache, querying the database only if the carousel is not cached.
+
+    The cached carousels are shared by all users, hence the user's purchased and in cart
+    flags are retrieved separately and only if the user is logged in.
+
+    Args:
+    - mode (str): "get_3_latest_courses" or "get_3_highly_rated_courses"
+    - userID (str, Optional): The ID of the logged in user
+        - Default: None, the flags will all be False without querying the database
+    - teacherID (str, Optional): The ID of the teacher to get the courses of
+        - Default: None, will get the courses of all teachers
+
+    Returns:
+    - A tuple of (courseList, teacherUsername) where courseList is a list of (CourseInfo, flags) tuples
+        and teacherUsername is None if teacherID is not defined or if the teacher has no courses
+    """
+    cacheKey = (mode, teacherID)
+    carousel = COURSE_CAROUSEL_CACHE.get(cacheKey)
+    if (carousel is None):
+        carousel = sql_operation(table="course", mode=mode, teacherID=teacherID)
+        if (carousel is None):
+            # database is not available, e.g. in maintenance mode
+            return ([], None)
+        COURSE_CAROUSEL_CACHE.set(cacheKey, carousel)
+
+    courseInfoList, teacherUsername = carousel
+    courseIDList = [courseInfo.courseID for courseInfo in courseInfoList]
+    if (userID is not None and courseIDList):
+        purchaseFlags = sql_operation(
+            table="course", mode="get_purchase_flags", userID=userID, courseIDList=courseIDList
+        )
+    else:
+        purchaseFlags = {courseID: {"purchased": False, "isInCart": False} for courseID in courseIDList}
+
+    return (
+        [(courseInfo, purchaseFlags[courseInfo.courseID]) for courseInfo in courseInfoList],
+        teacherUsername
+    )
+
+def invalidate_after_commit(cache:TTLCache) -> None:
+    """
+    Remove all the cached values of the cache.
+
+    Within a request, the cache is invalidated again after the request's transaction
+    is committed so that concurrent requests cannot cache the values from before the commit.
+
+    Args:
+    - cache (TTLCache): The cache to invalidate
+    """
+    cache.invalidate()
+    if (has_request_context() and "dbConnection" in g):
+        g.setdefault("dbAfterCommitCallbacks", []).append(cache.invalidate)
+
+def invalidate_course_listings() -> None:
+    """
+    Remove all the cached course carousels and the cached total counts of the paginated listings
+    (e.g. search and explore) after a course or review is changed, so that the last page
+    which is sized by the total count does not drop or repeat rows.
+    """
+    invalidate_after_commit(COURSE_CAROUSEL_CACHE)
+    invalidate_after_commit(PAGINATION_COUNT_CACHE)
+
+# Cache of the (user ID, IP address hex) pairs whose last_accessed in the user_ip_addresses table
+# was updated by this worker within the last KNOWN_IP_ADDRESS_CACHE_TTL seconds
+KNOWN_IP_ADDRESS_CACHE = TTLCache(
+    ttl=CONSTANTS.KNOWN_IP_ADDRESS_CACHE_TTL, maxSize=CONSTANTS.KNOWN_IP_ADDRESS_CACHE_MAX_SIZE
+)
+
+def convert_ip_address_to_hex(ipAddress:str) -> tuple:
+    """
+    Convert the IP address to the hexadecimal format stored in the user_ip_addresses table.
+
+    Args:
+    - ipAddress (str): The IPv4 or IPv6 address
+
+    Returns:
+    - A tuple of the IP address in hexadecimal format (str) and whether it is an IPv4 address (bool)
+    """
+    try:
+        return inet_aton(ipAddress).hex(), True
+    except (OSError):
+        return inet_pton(AF_INET6, ipAddress).hex(), False
+
+def mark_ip_address_as_known(userID:str, ipAddressHex:str) -> None:
+    """
+    Add the user's IP address to KNOWN_IP_ADDRESS_CACHE once its last_accessed has been committed,
+    i.e. after the request's transaction is committed if called within a request.
+
+    Args:
+    - userID (str): The user ID
+    - ipAddressHex (str): The IP address in hexadecimal format
+    """
+    cacheKey = (userID, ipAddressHex)
+    if (has_request_context() and "dbConnection" in g):
+        g.setdefault("dbAfterCommitCallbacks", []).append(lambda: KNOWN_IP_ADDRESS_CACHE.set(cacheKey, True))
+    else:
+        KNOWN_IP_ADDRESS_CACHE.set(cacheKey, True)
+
+def get_request_sql_stats() -> dict:
+    """
+    Get the SQL statistics of the current request which are stored on flask.g.
+
+    Returns:
+    - A dict, e.g. {"queries": 4, "connections": 1, "duration_ms": 3.2, "rows": 25}
+    """
+    if ("sqlStats" not in g):
+        g.sqlStats = {"queries": 0, "connections": 0, "duration_ms": 0.0, "rows": 0}
+    return g.sqlStats
+
+def record_sql_query(queryInfo:dict) -> None:
+    """
+    Query listener of SQL_METRICS which adds the query to the current request's SQL statistics
+    and logs the query if it took longer than the slow query threshold.
+
+    Args:
+    - queryInfo (dict): The query info from SQLMetrics.record()
+    """
+    isRequestScoped = has_request_context()
+    if (isRequestScoped):
+        sqlStats = get_request_sql_stats()
+        sqlStats["queries"] += 1
+        sqlStats["duration_ms"] += queryInfo["duration_ms"]
+        sqlStats["rows"] += max(queryInfo["rows"], 0)
+
+    if (queryInfo["duration_ms"] >= CONSTANTS.SQL_SLOW_QUERY_THRESHOLD_MS):
+        write_log_entry(
+            logMessage={
+                "Slow SQL query": str(queryInfo["query"])[:500],
+                "Table": queryInfo["table"],
+                "Mode": queryInfo["mode"],
+                "Duration (ms)": round(queryInfo["duration_ms"], 2),
+                "Rows": queryInfo["rows"],
+                "Endpoint": request.endpoint if (isRequestScoped) else None
+            },
+            severity="WARNING"
+        )
+
+SQL_METRICS.add_query_listener(record_sql_query)
+
+def get_request_connection() -> UnitOfWorkConnection:
+    """
+    Get the MySQL connection of the current request, borrowing one from the
+    MySQL connection pool if it is the first SQL operation of the request.
+
+    The connection is stored on flask.g until end_request_transaction() is called
+    at the teardown of the request (after commit_request_transaction() in after_request()).
+
+    Returns:
+    - The MySQL connection wrapped in a UnitOfWorkConnection
+    """
+    if ("dbConnection" not in g):
+        g.dbConnection = UnitOfWorkConnection(MYSQL_POOL.get_connection())
+        g.dbRollbackOnly = False
+        get_request_sql_stats()["connections"] += 1
+    return g.dbConnection
+
+def commit_request_transaction(isErrorResponse:bool=False) -> None:
+    """
+    Commit the transaction of the current request if any SQL operations had called commit()
+    and no errors had occurred, then call the callbacks registered in g.dbAfterCommitCallbacks.
+
+    Called in after_request() so that the response is only sent after the request's writes
+    have been committed (e.g. a password reset or a purchase is never lost after a success response).
+
+    Args:
+    - isErrorResponse (bool): Whether the response is a server error (5xx), in which case nothing is committed
+
+    Raises:
+    - InternalServerError (abort(500)): If the commit failed, the request's writes are rolled back at its teardown
+    """
+    unitOfWork = g.get("dbConnection")
+    if (unitOfWork is None):
+        return
+    if (isErrorResponse):
+        g.dbRollbackOnly = True
+    if (g.get("dbRollbackOnly", False) or not unitOfWork.hasPendingCommit):
+        return
+
+    try:
+        unitOfWork.commit_pending()
+    except (MySQLErrors.Error) as e:
+        # do not retry the commit when the error response goes through after_request() again
+        g.dbRollbackOnly = True
+        write_log_entry(
+            logMessage=f"Error caught when committing the request transaction: {e}",
+            severity="ERROR"
+        )
+        abort(500)
+
+    for callback in g.pop("dbAfterCommitCallbacks", []):
+        callback()
+
+def end_request_transaction(exception:Optional[BaseException]=None) -> None:
+    """
+    Return the connection of the current request to the MySQL connection pool
+    which rolls back any writes that were not committed by commit_request_transaction()
+    (e.g. the request had an unhandled exception or a server error response).
+
+    Args:
+    - exception (BaseException, Optional): The unhandled exception of the request, if any
+    """
+    unitOfWork = g.pop("dbConnection", None)
+    g.pop("dbAfterCommitCallbacks", None)
+    isRollbackOnly = g.pop("dbRollbackOnly", False)
+    if (unitOfWork is None):
+        return
+
+    if (exception is None and not isRollbackOnly and unitOfWork.hasPendingCommit):
+        # a SQL operation wrote to the database after the transaction was committed in after_request()
+        write_log_entry(
+            logMessage=f"Uncommitted writes of the request to {request.endpoint} were rolled back",
+            severity="WARNING"
+        )
+    # uncommitted writes will be rolled back by the connection pool
+    MYSQL_POOL.release_connection(unitOfWork.connection)
+
+# The (table, mode) of the SQL operations that write the user's data returned by get_user_info()
+# (the get_user_data procedure reads the user, role, cart and twofa_token tables)
+# so that the user info memoised for the request is only invalidated by these operations
+USER_INFO_WRITE_OPERATIONS = frozenset((
+    ("user", "update_email_to_verified"),
+    ("user", "login_google_oauth2"),
+    ("user", "login"), # the password hash might be upgraded on login
+    ("user", "change_profile_picture"),
+    ("user", "delete_profile_picture"),
+    ("user", "change_username"),
+    ("user", "deactivate_user"),
+    ("user", "reactivate_user"),
+    ("user", "ban_user"),
+    ("user", "unban_user"),
+    ("user", "recover_account"),
+    ("user", "change_email"),
+    ("user", "change_password"),
+    ("user", "reset_password"),
+    ("user", "delete_user"),
+    ("user", "delete_user_data"),
+    ("user", "update_to_teacher"),
+    ("user", "add_to_cart"),
+    ("user", "remove_from_cart"),
+    ("user", "purchase_courses"),
+    ("2fa_token", "add_token"),
+    ("2fa_token", "delete_token"),
+    ("2fa_token", "delete_token_and_backup_codes"),
+    ("2fa_token", "disable_2fa_with_backup_code"),
+    ("acc_recovery_token", "revoke_token"),
+    ("expirable_token", "verify_email_token")
+))
+
+# The (table, mode) of the SQL operations that add, remove or rename the users in the user management listings
+# so that the cached total counts of the listings are invalidated after these operations
+USER_LISTING_WRITE_OPERATIONS = frozenset((
+    ("user", "signup"),
+    ("user", "login_google_oauth2"),
+    ("user", "create_admin"),
+    ("user", "change_username"),
+    ("user", "change_email"),
+    ("user", "recover_account"),
+    ("user", "delete_user"),
+    ("user", "delete_user_data"),
+    ("user", "update_to_teacher"),
+    ("user", "remove_unverified_users_more_than_30_days"),
+    ("acc_recovery_token", "revoke_token")
+))
+
 def sql_operation(table:str=None, mode:str=None, **kwargs) -> Union[str, list, tuple, bool, dict, None]:
     """
-    Connects to the database and returns the connection object
+    Runs the SQL operation of the given table and mode.
+
+    Within a request, all SQL operations share the request's connection and transaction
+    which will be committed once at the end of the request (see commit_request_transaction()).
+    Otherwise, e.g. for the scheduled jobs, a connection is borrowed from the
+    MySQL connection pool for this SQL operation only.
 
     Args:
     - table: The table to connect to ("course", "user")
@@ -214,8 +775,18 @@ def sql_operation(table:str=None, mode:str=None, **kwargs) -> Union[str, list, t
     Returns the returned value from the SQL operation.
     """
     returnValue = con = None
+    isRequestScoped = has_request_context()
     try:
-        con = get_mysql_connection(debug=CONSTANTS.DEBUG_MODE, user="coursefinity")
+        con = get_request_connection() if (isRequestScoped) else MYSQL_POOL.get_connection()
+    except (ConnectionPoolExhaustedError) as e:
+        write_log_entry(
+            logMessage={
+                "Connection Pool Error": str(e),
+                "Connection Pool Stats": MYSQL_POOL.get_stats()
+            },
+            severity="WARNING"
+        )
+        abort(503)
     except (MySQLErrors.OperationalError):
         print("Fatal Error: Database Not Found...")
         if (CONSTANTS.DEBUG_MODE):
@@ -228,59 +799,76 @@ def sql_operation(table:str=None, mode:str=None, **kwargs) -> Union[str, list, t
             current_app.config["MAINTENANCE_MODE"] = True
             return None
 
-    with con:
-        try:
-            if (table == "user"):
-                returnValue = user_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "course"):
-                returnValue = course_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "session"):
-                returnValue = session_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "login_attempts"):
-                returnValue = login_attempts_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "2fa_token"):
-                returnValue = twofa_token_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "user_ip_addresses"):
-                returnValue = user_ip_addresses_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "review"):
-                returnValue = review_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "expirable_token"):
-                returnValue = expirable_token_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "guard_token"):
-                returnValue = guard_token_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "role"):
-                returnValue = role_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "acc_recovery_token"):
-                returnValue = acc_recovery_token_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "stripe_payments"):
-                returnValue = stripe_payments_sql_operation(connection=con, mode=mode, **kwargs)
-            elif (table == "cart"):
-                returnValue = cart_sql_operation(connection=con, mode=mode, **kwargs)
-            else:
-                raise ValueError("Invalid table name")
-        except (
-            MySQLErrors.MySQLError,
-            MySQLErrors.Warning,
-            MySQLErrors.Error,
-            MySQLErrors.InterfaceError,
-            MySQLErrors.DatabaseError,
-            MySQLErrors.DataError,
-            MySQLErrors.OperationalError,
-            MySQLErrors.IntegrityError,
-            MySQLErrors.InternalError,
-            MySQLErrors.ProgrammingError,
-            MySQLErrors.NotSupportedError,
-            KeyError, ValueError
-        ) as e:
-            # to ensure that the connection is closed even if an error with mysql occurs
-            print("Error caught:")
-            print(e)
-            write_log_entry(
-                logMessage=f"Error caught: {e}",
-                severity="ERROR"
-            )
-            abort(500)
+    if (isRequestScoped and (table, mode) in USER_INFO_WRITE_OPERATIONS):
+        # the user's data is changed by the operation, e.g. username, cart or 2FA changes
+        g.pop("currentUserInfo", None)
 
+    # label the queries of this SQL operation for the SQL metrics
+    sqlOperationToken = CURRENT_SQL_OPERATION.set((table, mode))
+    try:
+        if (table == "user"):
+            returnValue = user_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "course"):
+            returnValue = course_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "session"):
+            returnValue = session_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "login_attempts"):
+            returnValue = login_attempts_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "2fa_token"):
+            returnValue = twofa_token_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "user_ip_addresses"):
+            returnValue = user_ip_addresses_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "review"):
+            returnValue = review_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "expirable_token"):
+            returnValue = expirable_token_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "guard_token"):
+            returnValue = guard_token_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "role"):
+            returnValue = role_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "acc_recovery_token"):
+            returnValue = acc_recovery_token_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "stripe_payments"):
+            returnValue = stripe_payments_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "cart"):
+            returnValue = cart_sql_operation(connection=con, mode=mode, **kwargs)
+        elif (table == "maintenance_job_run"):
+            returnValue = maintenance_job_run_sql_operation(connection=con, mode=mode, **kwargs)
+        else:
+            raise ValueError("Invalid table name")
+    except (
+        MySQLErrors.MySQLError,
+        MySQLErrors.Warning,
+        MySQLErrors.Error,
+        MySQLErrors.InterfaceError,
+        MySQLErrors.DatabaseError,
+        MySQLErrors.DataError,
+        MySQLErrors.OperationalError,
+        MySQLErrors.IntegrityError,
+        MySQLErrors.InternalError,
+        MySQLErrors.ProgrammingError,
+        MySQLErrors.NotSupportedError,
+        KeyError, ValueError
+    ) as e:
+        print("Error caught:")
+        print(e)
+        write_log_entry(
+            logMessage=f"Error caught: {e}",
+            severity="ERROR"
+        )
+        if (isRequestScoped):
+            # roll back the writes of the whole request
+            g.dbRollbackOnly = True
+        abort(500)
+    finally:
+        CURRENT_SQL_OPERATION.reset(sqlOperationToken)
+        # return the connection to the pool even if an error occurs
+        # (the request's connection is returned at the teardown of the request)
+        if (not isRequestScoped):
+            MYSQL_POOL.release_connection(con)
+
+    if ((table, mode) in USER_LISTING_WRITE_OPERATIONS):
+        invalidate_after_commit(PAGINATION_COUNT_CACHE)
     return returnValue
 
 def guard_token_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs) ->  Union[str, bool, None]:
@@ -312,8 +900,8 @@ def guard_token_sql_operation(connection:MySQLConnection=None, mode:str=None, **
             return False
 
         cur.execute(
-            "SELECT * FROM guard_token WHERE token = %(token)s AND user_id = %(userID)s AND expiry_date >= SGT_NOW()",
-            {"token": tokenInput, "userID": userID}
+            "SELECT * FROM guard_token WHERE token = %(token)s AND user_id = %(userID)s AND expiry_date >= %(now)s",
+            {"token": tokenInput, "userID": userID, "now": get_sgt_now()}
         )
         write_log_entry(
             logMessage=f"UserID : {userID} - Input for {mode} SQL Command : {tokenInput}",
@@ -332,20 +920,78 @@ def guard_token_sql_operation(connection:MySQLConnection=None, mode:str=None, **
         return isValid
 
     elif (mode == "remove_expired_tokens"):
-        cur.execute("DELETE FROM guard_token WHERE expiry_date < SGT_NOW()")
-        connection.commit()
+        return purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["guard_token"], params={"now": get_sgt_now()},
+            onProgress=kwargs.get("onProgress")
+        )
 
     else:
         raise ValueError("Invalid mode specified in guard_token_sql_operation function!")
 
+def get_url_token_info(cur:pymysql.cursors.Cursor, tokenInput:str, purpose:str) -> Union[tuple, None]:
+    """
+    Get the info of the token from the URL in the emails.
+
+    The stateless tokens are verified locally without any query (see decode_url_token())
+    while the stored tokens (e.g. "recover_account" tokens) are looked up in the expirable_token table.
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor of the MySQL connection
+    - tokenInput (str): The URL-safe base64 encoded token from the URL
+    - purpose (str): The expected purpose of the token
+
+    Returns:
+    - A tuple of (user ID, single-use key, expiry date) if the token is valid, None otherwise
+    """
+    urlToken = decode_url_token(tokenInput=tokenInput, purpose=purpose)
+    if (not isinstance(urlToken, str)):
+        return urlToken
+
+    cur.execute(
+        "SELECT user_id, expiry_date FROM expirable_token WHERE token = %(token)s AND purpose = %(purpose)s AND expiry_date >= %(now)s",
+        {"token": urlToken, "purpose": purpose, "now": get_sgt_now()}
+    )
+    matched = cur.fetchone()
+    return (matched[0], urlToken, matched[1]) if (matched is not None) else None
+
+def consume_url_token(cur:pymysql.cursors.Cursor, tokenKey:str, expiryDate:datetime) -> bool:
+    """
+    Use up the token from the URL with a single indexed write so that it cannot be used again.
+
+    Note: The caller has to commit the transaction.
+
+    Args:
+    - cur (pymysql.cursors.Cursor): The cursor of the MySQL connection
+    - tokenKey (str): The single-use key of the token from get_url_token_info()
+        - the nonce (hex) of a stateless token which is added to the used_url_token table
+        - the 240 characters token of a stored token which is deleted from the expirable_token table
+    - expiryDate (datetime): The expiry date of the token, for purging the used_url_token table
+
+    Returns:
+    - True if the token has not been used before, False otherwise
+    """
+    if (len(tokenKey) == 240):
+        # Note: deleting a "recover_account" token also deletes its acc_recovery_token row
+        cur.execute("DELETE FROM expirable_token WHERE token = %(token)s", {"token": tokenKey})
+    else:
+        cur.execute(
+            "INSERT IGNORE INTO used_url_token (nonce, expiry_date) VALUES (%(nonce)s, %(expiryDate)s)",
+            {"nonce": tokenKey, "expiryDate": expiryDate}
+        )
+    return (cur.rowcount == 1)
+
 def expirable_token_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs) ->  Union[str, bytes, bool, None]:
     if (mode is None):
         raise ValueError("You must specify a mode in the expirable_token_sql_operation function!")
 
     cur = connection.cursor()
     if (mode == "add_token"):
-        expiryDatetime = kwargs["expiryDate"].expiryDate.replace(microsecond=0, tzinfo=None)
         purpose = kwargs["purpose"]
+        if (purpose in CONSTANTS.URL_TOKEN_PURPOSES):
+            # Stateless token that is verified locally, hence nothing is stored in the database
+            return generate_url_token(purpose=purpose, userID=kwargs["userID"], expiryDate=kwargs["expiryDate"].expiryDate)
+
+        expiryDatetime = kwargs["expiryDate"].expiryDate.replace(microsecond=0, tzinfo=None)
 
         # Generate a 1536 bits random token and encode it
         # as comparing binary data in MySQL may not work properly
@@ -370,56 +1016,49 @@ def expirable_token_sql_operation(connection:MySQLConnection=None, mode:str=None
         return encryptedToken if (not kwargs.get("getPlaintextToken", False)) else (encryptedToken, tokenStr)
 
     elif (mode == "verify_reset_pass_token"):
-        token = decode_and_decrypt_token(tokenInput=kwargs["token"])
-        if (token is None):
+        # Note: The token is only used up when the password is reset (see the "consume_token" mode)
+        tokenInfo = get_url_token_info(cur, tokenInput=kwargs["token"], purpose="reset_password")
+        if (tokenInfo is None):
             return None
+        userID, tokenKey, _ = tokenInfo
 
         cur.execute(
             """
             SELECT
-            e.user_id, u.status, t.token
-            FROM expirable_token AS e
-            INNER JOIN user AS u ON e.user_id=u.id
-            LEFT OUTER JOIN twofa_token AS t ON e.user_id=t.user_id
-            WHERE e.token = %(token)s AND e.expiry_date >= SGT_NOW();
+            u.id, u.status, t.token
+            FROM user AS u
+            LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
+            WHERE u.id = %(userID)s AND NOT EXISTS (SELECT 1 FROM used_url_token WHERE nonce = %(nonce)s);
             """,
-            {"token": token}
+            {"userID": userID, "nonce": tokenKey}
         )
         matched = cur.fetchone()
         return matched if (matched is not None) else None
 
     elif (mode == "verify_unlock_acc_token"):
-        token = decode_and_decrypt_token(tokenInput=kwargs["token"])
-        if (token is None):
+        tokenInfo = get_url_token_info(cur, tokenInput=kwargs["token"], purpose="unlock_account")
+        if (tokenInfo is None):
             return False
 
-        cur.execute(
-            "SELECT e.user_id FROM expirable_token AS e INNER JOIN user AS u ON e.user_id = u.id WHERE e.token = %(token)s AND e.expiry_date >= SGT_NOW() AND u.status = 'Active'",
-            {"token": token}
-        )
+        userID, tokenKey, expiryDate = tokenInfo
+
+        # Only unlock active accounts (e.g. not banned or recovering)
+        cur.execute("SELECT status FROM user WHERE id = %(userID)s", {"userID": userID})
         matched = cur.fetchone()
-        if (matched is None):
+        if (matched is None or matched[0] != "Active"):
             return False
-        userID = matched[0]
-        login_attempts_sql_operation(connection=connection, mode="reset_user_attempts_for_user", userID=userID)
 
-        cur.execute("DELETE FROM expirable_token WHERE token = %(token)s;", {"token": token})
-        connection.commit()
+        # Use up the token in the same transaction as resetting the login attempts
+        if (not consume_url_token(cur, tokenKey=tokenKey, expiryDate=expiryDate)):
+            return False
+        login_attempts_sql_operation(connection=connection, mode="reset_user_attempts_for_user", userID=userID)
         return True
 
     elif (mode == "verify_email_token"):
-        token = decode_and_decrypt_token(tokenInput=kwargs["token"])
-        if (token is None):
+        tokenInfo = get_url_token_info(cur, tokenInput=kwargs["token"], purpose="verify_email")
+        if (tokenInfo is None):
             return False
-
-        cur.execute(
-            "SELECT e.user_id, u.email_verified FROM expirable_token AS e INNER JOIN user AS u ON e.user_id = u.id WHERE e.token = %(token)s AND e.expiry_date >= SGT_NOW() AND u.status = 'Active'",
-            {"token": token}
-        )
-        matched = cur.fetchone()
-        if (matched is None):
-            return False
-        userID, emailVerified = matched
+        userID, tokenKey, expiryDate = tokenInfo
 
         # If the user is logged in and is verifying their email
         # Note: This happens when the user is logged in and changes their email address
@@ -427,39 +1066,45 @@ def expirable_token_sql_operation(connection:MySQLConnection=None, mode:str=None
         if (curUserID is not None and curUserID != userID):
             raise EmailIsNotUserEmailError("The email token is not for the current user!")
 
-        # Delete the token
-        cur.execute("DELETE FROM expirable_token WHERE token = %(token)s;", {"token": token})
-        connection.commit()
+        cur.execute("SELECT email_verified FROM user WHERE id = %(userID)s AND status = 'Active'", {"userID": userID})
+        matched = cur.fetchone()
+        if (matched is None):
+            return False
 
         # Check if the user has already verified their email
-        if (not emailVerified):
-            user_sql_operation(connection=connection, mode="update_email_to_verified", userID=userID)
-            return True
-        else:
+        if (matched[0]):
             raise EmailIsAlreadyVerifiedError("The email has already been verified!")
 
+        # Use up the token in the same transaction as updating the email verification status
+        if (not consume_url_token(cur, tokenKey=tokenKey, expiryDate=expiryDate)):
+            return False
+        user_sql_operation(connection=connection, mode="update_email_to_verified", userID=userID)
+        return True
+
     elif (mode == "verify_recover_acc_token"):
         token = decode_and_decrypt_token(tokenInput=kwargs["token"])
         if (token is None):
             return None
 
         cur.execute(
-            "SELECT e.user_id FROM expirable_token AS e INNER JOIN user AS u ON e.user_id = u.id WHERE e.token = %(token)s AND e.expiry_date >= SGT_NOW() AND u.status = 'Inactive'",
-            {"token": token}
+            "SELECT e.user_id FROM expirable_token AS e INNER JOIN user AS u ON e.user_id = u.id WHERE e.token = %(token)s AND e.expiry_date >= %(now)s AND u.status = 'Inactive'",
+            {"token": token, "now": get_sgt_now()}
         )
         matched = cur.fetchone()
         if (matched is None):
             return None
         return matched[0]
 
-    elif (mode == "delete_encrypted_token"):
-        token = symmetric_decrypt(
-            ciphertext=urlsafe_b64decode(kwargs["token"]),
-            keyID=current_app.config["CONSTANTS"].TOKEN_ENCRYPTION_KEY_ID,
-            decode=False
-        )
-        cur.execute("DELETE FROM expirable_token WHERE token = %(token)s", {"token": token})
+    elif (mode == "consume_token"):
+        # Use up the token from the URL after it has been verified, returns False if it has already been used
+        tokenInfo = get_url_token_info(cur, tokenInput=kwargs["token"], purpose=kwargs["purpose"])
+        if (tokenInfo is None):
+            return False
+
+        _, tokenKey, expiryDate = tokenInfo
+        consumed = consume_url_token(cur, tokenKey=tokenKey, expiryDate=expiryDate)
         connection.commit()
+        return consumed
 
     elif (mode == "delete_token"):
         token = kwargs["token"]
@@ -471,12 +1116,44 @@ def expirable_token_sql_operation(connection:MySQLConnection=None, mode:str=None
         connection.commit()
 
     elif (mode == "delete_all_expired_tokens"):
-        cur.execute("DELETE FROM expirable_token WHERE expiry_date < SGT_NOW()")
-        connection.commit()
+        now = get_sgt_now()
+        numOfDeletedRows = purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["expirable_token"], params={"now": now},
+            onProgress=kwargs.get("onProgress")
+        )
+        # the expired stateless tokens are rejected by decode_url_token(), hence their nonces are no longer needed
+        numOfDeletedRows += purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["used_url_token"], params={"now": now},
+            onProgress=kwargs.get("onProgress")
+        )
+        return numOfDeletedRows
 
     else:
         raise ValueError("Invalid mode in expirable_token_sql_operation function!")
 
+def maintenance_job_run_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs) -> None:
+    """
+    Do CRUD operations on the maintenance_job_run table
+
+    insert keywords: runDetails (dict from LeaderElectedScheduler's onJobRun callback)
+    """
+    if (mode is None):
+        raise ValueError("You must specify a mode in the maintenance_job_run_sql_operation function!")
+
+    cur = connection.cursor()
+    if (mode == "insert"):
+        runDetails = kwargs["runDetails"]
+        cur.execute(
+            """INSERT INTO maintenance_job_run
+            (job_id, started_at, duration_ms, rows_affected, status, error_message, leader)
+            VALUES (%(job_id)s, %(started_at)s, %(duration_ms)s, %(rows_affected)s, %(status)s, %(error_message)s, %(leader)s)""",
+            runDetails
+        )
+        connection.commit()
+
+    else:
+        raise ValueError("Invalid mode in the maintenance_job_run_sql_operation function!")
+
 def cart_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs) ->  Union[bool, None]:
     if (mode is None):
         raise ValueError("You must specify a mode in the cart_sql_operation function!")
@@ -552,8 +1229,13 @@ def stripe_payments_sql_operation(connection:MySQLConnection=None, mode:str=None
             return stripePaymentIntent[0]
 
     elif mode == "delete_expired_payment_sessions":
-        cur.execute("DELETE FROM stripe_payments WHERE TIMESTAMPDIFF(hour, created_time, now()) > 1 AND payment_time IS NULL")
-        connection.commit()
+        # created_time is stored in the web server's local time (see StripeFunctions.py),
+        # same as the previous TIMESTAMPDIFF(hour, created_time, now()) > 1 check of at least 2 hours
+        return purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["stripe_payments"],
+            params={"createdBefore": datetime.now().replace(microsecond=0) - timedelta(hours=2)},
+            onProgress=kwargs.get("onProgress")
+        )
 
 def acc_recovery_token_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs) ->  Union[bool, None]:
     """For recovering user's account (from user management)"""
@@ -612,33 +1294,52 @@ def user_ip_addresses_sql_operation(connection:MySQLConnection=None, mode:str=No
     cur = connection.cursor()
     if (mode == "add_ip_address"):
         userID = kwargs["userID"]
-        ipAddress = kwargs["ipAddress"]
+        ipAddress, isIpv4 = convert_ip_address_to_hex(kwargs["ipAddress"])
 
-        # Convert the IP address to binary format
-        try:
-            ipAddress = inet_aton(ipAddress).hex()
-            isIpv4 = True
-        except (OSError):
-            isIpv4 = False
-            ipAddress = inet_pton(AF_INET6, ipAddress).hex()
+        # skip the write if the last_accessed was recently updated by this worker
+        if (KNOWN_IP_ADDRESS_CACHE.get((userID, ipAddress)) is not None):
+            return
 
-        cur.execute("SELECT * FROM user_ip_addresses WHERE user_id = %(userID)s AND ip_address = %(ipAddress)s", {"userID": userID, "ipAddress": ipAddress})
-        matched = cur.fetchone()
+        # Add the user's IP address or update its last_accessed datetime if it is already in the database
+        cur.execute(
+            """INSERT INTO user_ip_addresses (user_id, ip_address, last_accessed, is_ipv4)
+            VALUES (%(userID)s, %(ipAddress)s, %(now)s, %(isIpv4)s)
+            ON DUPLICATE KEY UPDATE last_accessed = %(now)s""",
+            {"userID":userID, "ipAddress":ipAddress, "now":get_sgt_now(), "isIpv4":isIpv4}
+        )
+        connection.commit()
+        mark_ip_address_as_known(userID, ipAddress)
+
+    elif (mode == "check_and_update_known_ip_address"):
+        # Returns True if the user had accessed from the IP address within the last 10 days
+        # and updates its last_accessed datetime, otherwise False without adding the IP address
+        userID = kwargs["userID"]
+        ipAddress, isIpv4 = convert_ip_address_to_hex(kwargs["ipAddress"])
+
+        if (KNOWN_IP_ADDRESS_CACHE.get((userID, ipAddress)) is not None):
+            return True
+
+        # A single write that only updates the IP address if it was accessed within the last 10 days.
+        # Note: If another worker updated it within the same second, no row is changed
+        # and it is treated as a new IP address (the user is asked to verify the login).
+        cur.execute(
+            """UPDATE user_ip_addresses SET last_accessed = %(now)s
+            WHERE user_id = %(userID)s AND ip_address = %(ipAddress)s AND last_accessed >= %(lastAccessedBound)s""",
+            {"userID":userID, "ipAddress":ipAddress, "now":get_sgt_now(), "lastAccessedBound":get_last_accessed_bound(days=10)}
+        )
+        if (cur.rowcount <= 0):
+            return False
 
-        if (matched is not None):
-            # If the user IP address is already in the database, update the last_accessed datetime
-            cur.execute("UPDATE user_ip_addresses SET last_accessed = SGT_NOW() WHERE user_id = %(userID)s AND ip_address = %(ipAddress)s", {"userID": userID, "ipAddress": ipAddress})
-        else:
-            # If the user IP address is not in the database, add it
-            cur.execute("INSERT INTO user_ip_addresses (user_id, ip_address, last_accessed, is_ipv4) VALUES (%(userID)s, %(ipAddress)s, SGT_NOW(), %(isIpv4)s)", {"userID":userID, "ipAddress":ipAddress, "isIpv4":isIpv4})
         connection.commit()
+        mark_ip_address_as_known(userID, ipAddress)
+        return True
 
     elif (mode == "get_ip_addresses"):
         userID = kwargs["userID"]
 
         cur.execute(
-            "SELECT ip_address FROM user_ip_addresses WHERE user_id = %(userID)s AND DATEDIFF(SGT_NOW(), last_accessed) <= 10",
-            {"userID":userID}
+            "SELECT ip_address FROM user_ip_addresses WHERE user_id = %(userID)s AND last_accessed >= %(lastAccessedBound)s",
+            {"userID":userID, "lastAccessedBound":get_last_accessed_bound(days=10)}
         )
         returnValue = cur.fetchall()
         ipAddressList = [ipAddress[0] for ipAddress in returnValue]
@@ -646,25 +1347,21 @@ def user_ip_addresses_sql_operation(connection:MySQLConnection=None, mode:str=No
 
     elif (mode == "add_ip_address_only_if_unique"):
         userID = kwargs["userID"]
-        ipAddress = kwargs["ipAddress"]
+        ipAddress, isIpv4 = convert_ip_address_to_hex(kwargs["ipAddress"])
 
-        # Convert the IP address to binary format
-        try:
-            ipAddress = inet_aton(ipAddress).hex()
-            isIpv4 = True
-        except (OSError):
-            isIpv4 = False
-            ipAddress = inet_pton(AF_INET6, ipAddress).hex()
-
-        cur.execute("SELECT * FROM user_ip_addresses WHERE user_id = %(userID)s AND ip_address = %(ipAddress)s AND is_ipv4=0", {"userID":userID, "ipAddress":ipAddress})
-
-        if (cur.fetchone() is None):
-            cur.execute("INSERT INTO user_ip_addresses (user_id, ip_address, last_accessed, is_ipv4) VALUES (%(userID)s, %(ipAddress)s, SGT_NOW(), %(isIpv4)s)", {"userID":userID, "ipAddress":ipAddress, "isIpv4":isIpv4})
-            connection.commit()
+        # Add the user's IP address without updating the last_accessed datetime if it is already in the database
+        cur.execute(
+            """INSERT IGNORE INTO user_ip_addresses (user_id, ip_address, last_accessed, is_ipv4)
+            VALUES (%(userID)s, %(ipAddress)s, %(now)s, %(isIpv4)s)""",
+            {"userID":userID, "ipAddress":ipAddress, "now":get_sgt_now(), "isIpv4":isIpv4}
+        )
+        connection.commit()
 
     elif (mode == "remove_last_accessed_more_than_10_days"):
-        cur.execute("DELETE FROM user_ip_addresses WHERE DATEDIFF(SGT_NOW(), last_accessed) > 10")
-        connection.commit()
+        return purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["user_ip_addresses"], params={"lastAccessedBound":get_last_accessed_bound(days=10)},
+            onProgress=kwargs.get("onProgress")
+        )
 
     else:
         raise ValueError("Invalid mode in the user_ip_addresses_sql_operation function!")
@@ -854,10 +1551,8 @@ def login_attempts_sql_operation(connection:MySQLConnection, mode:str=None, **kw
         if (attempts is None):
             cur.execute("INSERT INTO login_attempts (user_id, attempts, reset_date) VALUES (%(userID)s, %(attempts)s, SGT_NOW() + INTERVAL %(intervalMins)s MINUTE)", {"userID":userID, "attempts":1, "intervalMins":CONSTANTS.LOCKED_ACCOUNT_DURATION})
         else:
-            cur.execute("SELECT SGT_NOW()")
-            now = cur.fetchone()[0]
             # comparing the reset datetime with the current datetime
-            if (attempts[1] > now):
+            if (attempts[1] > get_sgt_now()):
                 # if not past the reset datetime
                 currentAttempts = attempts[0]
             else:
@@ -880,12 +1575,14 @@ def login_attempts_sql_operation(connection:MySQLConnection, mode:str=None, **kw
         connection.commit()
 
     elif (mode == "reset_attempts_past_reset_date"):
-        cur.execute("DELETE FROM login_attempts WHERE reset_date < SGT_NOW()")
-        connection.commit()
+        return purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["login_attempts"], params={"now":get_sgt_now()},
+            onProgress=kwargs.get("onProgress")
+        )
 
     elif (mode == "reset_attempts_past_reset_date_for_user"):
         userID = kwargs["userID"]
-        cur.execute("DELETE FROM login_attempts WHERE user_id = %(userID)s AND reset_date < SGT_NOW()", {"userID":userID})
+        cur.execute("DELETE FROM login_attempts WHERE user_id = %(userID)s AND reset_date < %(now)s", {"userID":userID, "now":get_sgt_now()})
         connection.commit()
 
         cur.execute("SELECT attempts FROM login_attempts WHERE user_id = %(userID)s", {"userID":userID})
@@ -927,36 +1624,53 @@ def session_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwar
             [kwargs["userIP"].encode("utf-8"), kwargs["userAgent"].encode("utf-8")]
         )).hexdigest()
 
-        # Get the session data from the database
-        # if the session ID exists, the fingerprint hash matches, and is not expired
-        cur.execute(
-            "SELECT * FROM session WHERE session_id = %(sessionID)s AND expiry_date > SGT_NOW() AND fingerprint_hash = %(fingerprintHash)s AND user_id = %(userID)s",
-            {"sessionID":sessionID, "fingerprintHash":fingerprintHash, "userID":userID}
-        )
-        if (cur.fetchone() is None):
-            return False
+        now = get_sgt_now()
 
-        # Check if user is active or exists in the database
-        cur.execute("SELECT status FROM user WHERE id = %(userID)s", {"userID":userID})
-        matchedStatus = cur.fetchone()
-        if (matchedStatus is None):
+        # Get the session and the user's data from the database in one query
+        # if the session ID exists, the fingerprint hash matches, and is not expired.
+        # The columns before needs_extension are the same as the get_user_data stored procedure.
+        cur.execute("""
+            SELECT
+            u.id, r.role_name, u.username,
+            u.email, u.email_verified, u.password,
+            u.profile_image, u.date_joined, NULL AS cart_courses,
+            u.status, t.token AS has_two_fa,
+            s.expiry_date < %(extendBound)s AS needs_extension
+            FROM session AS s
+            INNER JOIN user AS u ON s.user_id=u.id
+            INNER JOIN role AS r ON u.role=r.role_id
+            LEFT OUTER JOIN twofa_token AS t ON u.id=t.user_id
+            WHERE s.session_id=%(sessionID)s AND s.expiry_date > %(now)s
+            AND s.fingerprint_hash=%(fingerprintHash)s AND s.user_id=%(userID)s
+        """, {
+            "sessionID":sessionID, "fingerprintHash":fingerprintHash, "userID":userID, "now":now,
+            "extendBound":now + timedelta(minutes=CONSTANTS.SESSION_EXPIRY_INTERVALS - CONSTANTS.SESSION_EXPIRY_EXTENSION_INTERVAL)
+        })
+        matched = cur.fetchone()
+        if (matched is None):
             return False
-        elif (matchedStatus[0] != "Active"):
+
+        # Check if user is active
+        if (matched[9] != "Active"):
             cur.execute("DELETE FROM session WHERE session_id = %(sessionID)s", {"sessionID":sessionID})
             connection.commit()
             return False
 
         # Session ID is valid, update the expiry date by adding an interval to the current time
-        cur.execute(
-            "UPDATE session SET expiry_date=SGT_NOW() + INTERVAL %(interval)s MINUTE WHERE session_id=%(sessionID)s",
-            {"interval":CONSTANTS.SESSION_EXPIRY_INTERVALS, "sessionID":sessionID}
-        )
-        connection.commit()
-        return True
+        # only if it was not extended in the last SESSION_EXPIRY_EXTENSION_INTERVAL minutes
+        if (matched[-1]):
+            cur.execute(
+                "UPDATE session SET expiry_date=SGT_NOW() + INTERVAL %(interval)s MINUTE WHERE session_id=%(sessionID)s",
+                {"interval":CONSTANTS.SESSION_EXPIRY_INTERVALS, "sessionID":sessionID}
+            )
+            connection.commit()
+        return format_user_info(matched[:-1])
 
     elif (mode == "delete_expired_sessions"):
-        cur.execute("DELETE FROM session WHERE expiry_date < SGT_NOW()")
-        connection.commit()
+        return purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["session"], params={"now":get_sgt_now()},
+            onProgress=kwargs.get("onProgress")
+        )
 
     else:
         raise ValueError("Invalid mode in the session_sql_operation function!")
@@ -1010,8 +1724,10 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
         return matched if (getEmail) else matched[0]
 
     elif (mode == "remove_unverified_users_more_than_30_days"):
-        cur.execute("DELETE FROM user WHERE email_verified=0 AND date_joined < SGT_NOW() - INTERVAL 30 DAY")
-        connection.commit()
+        return purge_in_batches(
+            connection=connection, purgeQuery=PURGE_QUERIES["user"], params={"joinedBefore":get_sgt_now() - timedelta(days=30)},
+            batchSize=CONSTANTS.PURGE_USER_BATCH_SIZE, onProgress=kwargs.get("onProgress")
+        )
 
     elif (mode == "update_email_to_verified"):
         userID = kwargs["userID"]
@@ -1134,16 +1850,6 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
         cur.execute("SELECT attempts FROM login_attempts WHERE user_id= %(userID)s", {"userID":userID})
         loginAttempts = cur.fetchone()
 
-        requestIpAddress = kwargs["ipAddress"]
-
-        # Convert request IP address to hexadecimal format
-        try:
-            requestIPAddressHex = inet_aton(requestIpAddress).hex()
-        except (OSError):
-            requestIPAddressHex = inet_pton(AF_INET6, requestIpAddress).hex()
-
-        ipAddressList = user_ip_addresses_sql_operation(connection=connection, mode="get_ip_addresses", userID=userID)
-
         # send an email to the authentic user if their account got locked
         if (loginAttempts and loginAttempts[0] >= CONSTANTS.MAX_LOGIN_ATTEMPTS):
             resetAttempts = login_attempts_sql_operation(
@@ -1161,11 +1867,10 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
             send_verification_email(email=emailInput, userID=userID, username=username)
             raise EmailNotVerifiedError("Email has not been verified, please verify your email!")
 
-        newIpAddress = False
         decryptedPasswordHash = symmetric_decrypt(ciphertext=encryptedPasswordHash, keyID=CONSTANTS.PEPPER_KEY_ID)
         try:
             # verify if the password input matches the password hash in the database 
-            CONSTANTS.PH.verify(decryptedPasswordHash, passwordInput)
+            PASSWORD_HASHING_EXECUTOR.verify(decryptedPasswordHash, passwordInput)
         except (VerifyMismatchError):
             # if the hash does not match
             raise IncorrectPwdError("Incorrect password!")
@@ -1180,13 +1885,27 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
             )
             raise IncorrectPwdError("Incorrect password!")
 
-        # check if the login request is from the same IP address as the one that made the request
-        if (requestIPAddressHex not in ipAddressList):
-            newIpAddress = True
-        else:
-            # Update last accessed upon successful login
-            cur.execute("UPDATE user_ip_addresses SET last_accessed = SGT_NOW() WHERE user_id = %(userID)s AND ip_address = %(ipAddress)s", {"userID": userID, "ipAddress": requestIPAddressHex})
-            connection.commit()
+        # upgrade the hash if the Argon2 parameters in Constants.py have changed since the password was hashed
+        # so that the new parameters are rolled out as the users log in
+        if (PASSWORD_HASHING_EXECUTOR.check_needs_rehash(decryptedPasswordHash)):
+            try:
+                cur.execute(
+                    "UPDATE user SET password=%(password)s WHERE id=%(userID)s",
+                    {
+                        "password": symmetric_encrypt(plaintext=PASSWORD_HASHING_EXECUTOR.hash(passwordInput), keyID=CONSTANTS.PEPPER_KEY_ID),
+                        "userID": userID
+                    }
+                )
+                connection.commit()
+            except (PasswordHashingBusyError):
+                # not needed for the login, hence it will be retried on the user's next login
+                pass
+
+        # check if the user had logged in from the request's IP address within the last 10 days
+        # (last accessed is updated upon successful login and the write is skipped if it was recently updated)
+        newIpAddress = not user_ip_addresses_sql_operation(
+            connection=connection, mode="check_and_update_known_ip_address", userID=userID, ipAddress=kwargs["ipAddress"]
+        )
 
         # convert the role id to a readable format
         cur.execute("CALL get_role_name(%(roleID)s)", {"roleID":roleID})
@@ -1360,7 +2079,7 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
         currentPassword = symmetric_decrypt(ciphertext=cur.fetchone()[0], keyID=CONSTANTS.PEPPER_KEY_ID)
         try:
             # verify if the password input matches the password hash in the database 
-            CONSTANTS.PH.verify(currentPassword, currentPasswordInput)
+            PASSWORD_HASHING_EXECUTOR.verify(currentPassword, currentPasswordInput)
         except (VerifyMismatchError):
             # if the hash does not match
             raise IncorrectPwdError("Incorrect password!")
@@ -1393,7 +2112,7 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
 
         try:
             # verify if the supplied old password matches the current password hash in the database
-            CONSTANTS.PH.verify(currentPasswordHash, oldPasswordInput)
+            PASSWORD_HASHING_EXECUTOR.verify(currentPasswordHash, oldPasswordInput)
         except (VerifyMismatchError):
             # if the the supplied old password does not match the current password hash in the database
             raise IncorrectPwdError("Incorrect password!")
@@ -1423,20 +2142,30 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
 
         cur.execute(
             "UPDATE user SET password=%(password)s WHERE id=%(userID)s",
-            {"password": symmetric_encrypt(plaintext=CONSTANTS.PH.hash(passwordInput), keyID=CONSTANTS.PEPPER_KEY_ID), "userID": userID}
+            {"password": symmetric_encrypt(plaintext=PASSWORD_HASHING_EXECUTOR.hash(passwordInput), keyID=CONSTANTS.PEPPER_KEY_ID), "userID": userID}
         )
         connection.commit()
 
     elif (mode == "reset_password"):
+        # Returns False if the token has already been used (e.g. the form was submitted twice)
         userID = kwargs["userID"]
         newPassword = kwargs["newPassword"]
 
+        # Hash the password before using up the token in case hashing fails
+        encryptedPassword = symmetric_encrypt(plaintext=PASSWORD_HASHING_EXECUTOR.hash(newPassword), keyID=CONSTANTS.PEPPER_KEY_ID)
+
+        # Use up the token first so that only one request can reset the password with it
+        if (not expirable_token_sql_operation(
+            connection=connection, mode="consume_token", token=kwargs["token"], purpose=kwargs.get("purpose", "reset_password")
+        )):
+            return False
+
         cur.execute(
             "UPDATE user SET password=%(password)s WHERE id=%(userID)s",
-            {"password": symmetric_encrypt(plaintext=CONSTANTS.PH.hash(newPassword), keyID=CONSTANTS.PEPPER_KEY_ID), "userID": userID}
+            {"password": encryptedPassword, "userID": userID}
         )
         connection.commit()
-        expirable_token_sql_operation(connection=connection, mode="delete_encrypted_token", token=kwargs["token"])
+        return True
 
     elif (mode == "delete_user"):
         # Delete user from the database unlike deleting user's data from the database
@@ -1476,62 +2205,53 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
 
     elif (mode == "paginate_users"):
         pageNum = kwargs["pageNum"]
-        if (pageNum > 2147483647):
-            pageNum = 2147483647
-
         userInput = kwargs.get("userInput")
         filterType = kwargs.get("filterType", "username") # To determine what the user input is (UID or username)
 
         paginationRole = kwargs["role"]
         if (paginationRole != "Admin"):
             # Students/Teachers (users) pagination
-            if (userInput is None):
-                cur.execute("CALL paginate_users(%(pageNum)s)", {"pageNum":pageNum})
-            elif (filterType == "uid"):
-                cur.execute("CALL paginate_users_by_uid(%(pageNum)s, %(userInput)s)", {"pageNum":pageNum, "userInput":userInput})
-            elif (filterType == "email"):
-                cur.execute("CALL paginate_users_by_email(%(pageNum)s, %(userInput)s)", {"pageNum":pageNum, "userInput":userInput})
-            else:
-                # Paginate by username by default in the HTML,
-                # but this is also a fallback if the user has tampered with the HTML value
-                cur.execute("CALL paginate_users_by_username(%(pageNum)s, %(userInput)s)", {"pageNum":pageNum, "userInput":userInput})
+            procedureName, roleCondition = "paginate_users", "r.role_name IN ('Student', 'Teacher')"
         else:
             # Admin users pagination
-            if (userInput is None):
-                cur.execute("CALL paginate_admins(%(pageNum)s)", {"pageNum":pageNum})
-            elif (filterType == "uid"):
-                cur.execute("CALL paginate_admins_by_uid(%(pageNum)s, %(userInput)s)", {"pageNum":pageNum, "userInput":userInput})
+            procedureName, roleCondition = "paginate_admins", "r.role_name='Admin'"
+
+        filterCondition, filterArgs = "", ()
+        if (userInput is not None):
+            filterArgs = (userInput,)
+            if (filterType == "uid"):
+                procedureName += "_by_uid"
+                filterCondition = "u.id LIKE %(userInput)s AND "
             elif (filterType == "email"):
-                cur.execute("CALL paginate_admins_by_email(%(pageNum)s, %(userInput)s)", {"pageNum":pageNum, "userInput":userInput})
+                procedureName += "_by_email"
+                filterCondition = "u.email LIKE %(userInput)s AND "
             else:
                 # Paginate by username by default in the HTML,
                 # but this is also a fallback if the user has tampered with the HTML value
-                cur.execute("CALL paginate_admins_by_username(%(pageNum)s, %(userInput)s)", {"pageNum":pageNum, "userInput":userInput})
-
-        matched = cur.fetchall() or []
-        maxPage = 1
-        if (len(matched) > 0):
-            maxPage = ceil(matched[0][-1] / 10)
-
-        # To prevent infinite redirects
-        if (maxPage <= 0):
-            maxPage = 1
-
-        if (pageNum > maxPage):
-            return [], maxPage
+                procedureName += "_by_username"
+                filterCondition = "u.username LIKE %(userInput)s AND "
+
+        totalCount = get_total_count(
+            cur,
+            f"""SELECT COUNT(*) FROM user AS u INNER JOIN role AS r ON u.role=r.role_id
+            WHERE {filterCondition}{roleCondition} AND u.status <> 'Deleted'""",
+            {"userInput":f"%{userInput}%"}, cacheKey=(procedureName, userInput)
+        )
+        matched, maxPage, pageCursors = paginate_by_keyset(
+            cur, procedureName, filterArgs, pageNum, kwargs.get("pageCursor"), totalCount, sortKeyIndices=(7, 0)
+        )
 
         courseArr = []
         for data in matched:
-            userInfo = format_user_info(data[1:])
+            userInfo = format_user_info(data)
             if (paginationRole != "Admin"):
-                isInRecovery = acc_recovery_token_sql_operation(
-                    connection=connection, mode="check_if_recovering", userID=userInfo.uid
-                )
+                # is_in_recovery column from the LEFT JOIN on the acc_recovery_token table
+                isInRecovery = bool(data[11])
                 courseArr.append((userInfo, isInRecovery))
             else:
                 courseArr.append(userInfo)
 
-        return courseArr, maxPage
+        return courseArr, maxPage, pageCursors
 
     # elif (mode == "get_user_purchases"):
     #     userID = kwargs["userID"]
@@ -1540,32 +2260,21 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
 
     elif (mode == "paginate_user_purchases"):
         userID = kwargs["userID"]
-        pageNum = kwargs["pageNum"]
-        if (pageNum > 2147483647):
-            pageNum = 2147483647
-
-        cur.execute("CALL paginate_purchased_courses(%(userID)s, %(pageNum)s)", {"userID":userID, "pageNum":pageNum})
-        matched = cur.fetchall() or []
-        maxPage = 1
-        if (len(matched) > 0):
-            maxPage = ceil(matched[0][-1] / 10)
-
-        # To prevent infinite redirects
-        if (maxPage <= 0):
-            maxPage = 1
-
-        if (pageNum > maxPage):
-            return [], maxPage
+        totalCount = get_total_count(
+            cur, "SELECT COUNT(*) FROM purchased_courses WHERE user_id=%(userID)s", {"userID":userID}
+        )
+        matched, maxPage, pageCursors = paginate_by_keyset(
+            cur, "paginate_purchased_courses", (userID,), kwargs["pageNum"], kwargs.get("pageCursor"), totalCount, sortKeyIndices=(9, 0)
+        )
 
         courseArr = []
         for data in matched:
-            data = data[1:]
             # Get the teacher's profile image from the first tuple
             teacherProfile = get_dicebear_image(data[2]) if (data[3] is None) \
                                                          else data[3]
             courseArr.append(CourseInfo(data, profilePic=teacherProfile, truncateData=True, getReadableCategory=True))
 
-        return courseArr, maxPage
+        return courseArr, maxPage, pageCursors
 
     elif mode == "get_user_cart":
         userID = kwargs["userID"]
@@ -1640,21 +2349,28 @@ def user_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
         userID = kwargs["userID"]
         cartCourseIDs = kwargs["cartCourseIDs"]
 
-        for courseID in cartCourseIDs:
-            try:
-                cur.execute(
-                    "INSERT INTO purchased_courses (user_id, course_id) VALUES (%(userID)s, %(courseID)s)",
-                    {"userID":userID, "courseID":courseID}
-                )
-                connection.commit()
-            except (MySQLErrors.IntegrityError):
-                # Catches if the for any duplicate key error
+        cartCourseIDs = list(dict.fromkeys(cartCourseIDs)) # remove duplicates while keeping the order
+
+        if (cartCourseIDs):
+            # pymysql's executemany() sends the rows as a single multi-row INSERT statement
+            # while INSERT IGNORE skips the courses that the user had already purchased
+            insertedRows = cur.executemany(
+                "INSERT IGNORE INTO purchased_courses (user_id, course_id) VALUES (%s, %s)",
+                [(userID, courseID) for courseID in cartCourseIDs]
+            )
+            numOfDuplicates = len(cartCourseIDs) - (insertedRows or 0)
+            if (numOfDuplicates > 0):
                 write_log_entry(
-                    logMessage=f"User {userID}, has purchased the course, {courseID}, but he/she had already purchased it",
+                    logMessage={
+                        "User ID": userID,
+                        "Purpose": "Purchase Courses",
+                        "Warning": f"{numOfDuplicates} of the {len(cartCourseIDs)} purchased courses had already been purchased",
+                        "Purchased Course IDs": cartCourseIDs
+                    },
                     severity="WARNING"
                 )
 
-        # Empty user's cart
+        # Empty user's cart in the same transaction
         cur.execute("DELETE FROM cart WHERE user_id=%(userID)s", {"userID":userID})
         connection.commit()
 
@@ -1705,6 +2421,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
             {"courseID":courseID, "teacherID":teacherID, "courseName":courseName, "courseDescription":courseDescription, "courseImagePath":courseImagePath, "coursePrice":coursePrice, "courseCategory":courseCategory, "videoPath":videoPath}
         )
         connection.commit()
+        invalidate_course_listings()
 
     elif (mode == "insert_draft"):
         teacherID = kwargs["teacherID"]
@@ -1795,6 +2512,30 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
         teacherProfile = get_dicebear_image(matched[2]) if matched[3] is None else matched[3]
         return CourseInfo(tupleInfo=matched, profilePic=teacherProfile, truncateData=False, getReadableCategory=True)
 
+    elif (mode == "get_course_data_list"):
+        # same columns as the get_course_data stored procedure but for multiple courses in one query
+        courseIDList = kwargs["courseIDList"]
+        if (not courseIDList):
+            return []
+
+        cur.execute(
+            f"""SELECT 
+            course_id, teacher_id, 
+            teacher_username, teacher_profile_image, course_name, course_description,
+            course_image_path, course_price, course_category, date_created, 
+            avg_rating, video_path, active
+            FROM course_card
+            WHERE course_id IN ({", ".join(["%s"] * len(courseIDList))})""",
+            courseIDList
+        )
+        courseDict = {}
+        for matched in cur.fetchall():
+            teacherProfile = get_dicebear_image(matched[2]) if matched[3] is None else matched[3]
+            courseDict[matched[0]] = CourseInfo(tupleInfo=matched, profilePic=teacherProfile, truncateData=False, getReadableCategory=True)
+
+        # return the courses in the same order as the given course IDs
+        return [courseDict[courseID] for courseID in courseIDList if (courseID in courseDict)]
+
     elif (mode == "get_draft_course_data"):
         courseID = kwargs["courseID"]
 
@@ -1815,6 +2556,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
             severity="NOTICE"
         )
         connection.commit()
+        invalidate_course_listings()
 
     elif (mode == "update_course_description"):
         courseID = kwargs["courseID"]
@@ -1825,6 +2567,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
             severity="NOTICE"
         )
         connection.commit()
+        invalidate_course_listings()
 
     elif (mode == "update_course_category"):
         courseID = kwargs["courseID"]
@@ -1835,6 +2578,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
             severity="NOTICE"
         )
         connection.commit()
+        invalidate_course_listings()
 
     elif (mode == "update_course_price"):
         courseID = kwargs["courseID"]
@@ -1845,6 +2589,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
         )
         cur.execute("UPDATE course SET course_price=%(coursePrice)s WHERE course_id=%(courseID)s", {"coursePrice":coursePrice, "courseID":courseID})
         connection.commit()
+        invalidate_course_listings()
 
     elif (mode == "update_course_thumbnail"):
         courseID = kwargs["courseID"]
@@ -1868,6 +2613,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
 
         cur.execute("UPDATE course SET course_image_path=%(courseImagePath)s WHERE course_id=%(courseID)s", {"courseImagePath":courseImagePath, "courseID":courseID})
         connection.commit()
+        invalidate_course_listings()
 
     elif (mode == "delete_from_draft"):
         courseID = kwargs["courseID"]
@@ -1879,6 +2625,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
         cur.execute("UPDATE course SET active=0 WHERE course_id=%(courseID)s", {"courseID":courseID})
         # cur.execute("DELETE FROM course WHERE course_id=%(courseID)s", {"courseID":courseID})
         connection.commit()
+        invalidate_course_listings()
 
     elif (mode == "get_all_courses_by_teacher"):
         teacherID = kwargs["teacherID"]
@@ -1887,54 +2634,32 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
 
         pageNum = kwargs["pageNum"]
         getTeacherName = kwargs.get("getTeacherName", False)
-        if (pageNum > 2147483647):
-            pageNum = 2147483647
 
-        cur.execute("CALL paginate_teacher_courses(%(teacherID)s, %(pageNum)s)", {"teacherID":teacherID, "pageNum":pageNum})
-        resultsList = cur.fetchall()
-        if (resultsList is None or len(resultsList) < 1):
-            return ([], 1, "") if (getTeacherName) else ([], 1)
-
-        maxPage = ceil(resultsList[0][-1] / 10)
-        if (maxPage <= 0):
-            maxPage = 1
+        totalCount = get_total_count(
+            cur, "SELECT COUNT(*) FROM course_card WHERE teacher_id=%(teacherID)s AND active=1", {"teacherID":teacherID}
+        )
+        resultsList, maxPage, pageCursors = paginate_by_keyset(
+            cur, "paginate_teacher_courses", (teacherID,), pageNum, kwargs.get("pageCursor"), totalCount, sortKeyIndices=(9, 0)
+        )
+        if (not resultsList):
+            return ([], maxPage, "", pageCursors) if (getTeacherName) else ([], maxPage, pageCursors)
 
-        teacherName = ""
-        if (getTeacherName):
-            cur.execute("SELECT username FROM user WHERE id=%(teacherID)s", {"teacherID":teacherID})
-            teacherName = cur.fetchone()
-            if (teacherName is None):
-                return ([], 1, "")
-            teacherName = teacherName[0]
-
-        # Get the teacher's profile image from the first tuple
-        teacherProfile = get_dicebear_image(resultsList[0][3]) if (resultsList[0][4] is None) \
-                                                               else resultsList[0][4]
+        # Get the teacher's username and profile image from the first tuple
+        teacherName = resultsList[0][2] if (getTeacherName) else ""
+        teacherProfile = get_dicebear_image(resultsList[0][2]) if (resultsList[0][3] is None) \
+                                                               else resultsList[0][3]
 
         courseList = []
-        loggedInUserID = kwargs.get("userID")
+        purchaseFlags = get_course_purchase_flags(
+            cur, kwargs.get("userID"), [tupleInfo[0] for tupleInfo in resultsList]
+        )
         for tupleInfo in resultsList:
-            foundResultsTuple = tupleInfo[1:]
-
-            purchased = isInCart = False
-            if (loggedInUserID is not None):
-                cur.execute(
-                    "SELECT * FROM purchased_courses WHERE course_id=%(courseID)s AND user_id=%(userID)s",
-                    {"courseID":foundResultsTuple[0], "userID":loggedInUserID}
-                )
-                purchased = True if (cur.fetchone() is not None) else False
-                cur.execute(
-                    "SELECT * FROM cart WHERE course_id=%(courseID)s AND user_id=%(userID)s",
-                    {"courseID":foundResultsTuple[0], "userID":loggedInUserID}
-                )
-                isInCart = True if (cur.fetchone() is not None) else False
-
             courseList.append(
-                (CourseInfo(foundResultsTuple, profilePic=teacherProfile, truncateData=True),
-                {"purchased":purchased, "isInCart":isInCart})
+                (CourseInfo(tupleInfo, profilePic=teacherProfile, truncateData=True),
+                purchaseFlags[tupleInfo[0]])
             )
 
-        return (courseList, maxPage, teacherName) if (getTeacherName) else (courseList, maxPage)
+        return (courseList, maxPage, teacherName, pageCursors) if (getTeacherName) else (courseList, maxPage, pageCursors)
 
     elif (mode == "get_all_draft_courses"):
         teacherID = kwargs["teacherID"]
@@ -1956,8 +2681,7 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
                                                                else resultsList[0][4]
 
         courseList = []
-        cur.execute("SELECT SGT_NOW()")
-        currentDay = cur.fetchone()[0]
+        currentDay = get_sgt_now()
         for tupleInfo in resultsList:
             foundResultsTuple = tupleInfo[1:]
             if ((currentDay - foundResultsTuple[4]).days > 1):
@@ -1974,181 +2698,91 @@ def course_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
     elif (mode == "get_3_latest_courses" or mode == "get_3_highly_rated_courses"):
         teacherID = kwargs.get("teacherID")
 
-        if (mode == "get_3_latest_courses"):
-            # get the latest 3 courses
-            if (teacherID is None):
-                cur.execute("""
-                    SELECT
-                    c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created,
-                    ROUND(SUM(r.course_rating) / COUNT(*), 0) AS avg_rating, c.video_path
-                    FROM course AS c
-                    LEFT OUTER JOIN review AS r
-                    ON c.course_id = r.course_id
-                    INNER JOIN user AS u
-                    ON c.teacher_id=u.id
-                    WHERE c.active=1
-                    GROUP BY c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created
-                    ORDER BY c.date_created DESC LIMIT 3;
-                """)
-            else:
-                cur.execute("""
-                    SELECT
-                    c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created,
-                    ROUND(SUM(r.course_rating) / COUNT(*), 0) AS avg_rating, c.video_path
-                    FROM course AS c
-                    LEFT OUTER JOIN review AS r
-                    ON c.course_id = r.course_id
-                    INNER JOIN user AS u
-                    ON c.teacher_id=u.id
-                    WHERE c.teacher_id=%(teacherID)s AND c.active=1
-                    GROUP BY c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created
-                    ORDER BY c.date_created DESC LIMIT 3;
-                """, {"teacherID":teacherID})
-        else:
-            # get top 3 highly rated courses
-            if (teacherID is None):
-                cur.execute("""
-                    SELECT
-                    c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created,
-                    ROUND(SUM(r.course_rating) / COUNT(*), 0) AS avg_rating, c.video_path
-                    FROM course AS c
-                    LEFT OUTER JOIN review AS r
-                    ON c.course_id = r.course_id
-                    INNER JOIN user AS u
-                    ON c.teacher_id=u.id
-                    WHERE c.active=1
-                    GROUP BY c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created
-                    ORDER BY avg_rating DESC LIMIT 3;
-                """)
-            else:
-                cur.execute("""
-                    SELECT
-                    c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created,
-                    ROUND(SUM(r.course_rating) / COUNT(*), 0) AS avg_rating, c.video_path
-                    FROM course AS c
-                    LEFT OUTER JOIN review AS r
-                    ON c.course_id = r.course_id
-                    INNER JOIN user AS u
-                    ON c.teacher_id=u.id
-                    WHERE c.teacher_id=%(teacherID)s AND c.active=1
-                    GROUP BY c.course_id, c.teacher_id,
-                    u.username, u.profile_image, c.course_name, c.course_description,
-                    c.course_image_path, c.course_price, c.course_category, c.date_created
-                    ORDER BY avg_rating DESC LIMIT 3;
-                """, {"teacherID":teacherID})
-
-        loggedInUserID = kwargs.get("userID")
+        # get the latest 3 courses or the top 3 highly rated courses from the course_card read model
+        orderBy = "date_created DESC" if (mode == "get_3_latest_courses") else "avg_rating DESC"
+        teacherFilter = "teacher_id=%(teacherID)s AND " if (teacherID) else ""
+        cur.execute(f"""
+            SELECT
+            course_id, teacher_id,
+            teacher_username, teacher_profile_image, course_name, course_description,
+            course_image_path, course_price, course_category, date_created,
+            avg_rating, video_path
+            FROM course_card
+            WHERE {teacherFilter}active=1
+            ORDER BY {orderBy} LIMIT 3;
+        """, {"teacherID":teacherID})
+
         matchedList = cur.fetchall()
-        if (not matchedList):
-            return []
-        else:
-            courseInfoList = []
-            # get the teacher name for each course
-            if (not teacherID):
-                teacherIDList = [teacherID[1] for teacherID in matchedList]
-                for i, teacherID in enumerate(teacherIDList):
-                    cur.execute("SELECT username, profile_image FROM user WHERE id=%(teacherID)s", {"teacherID":teacherID})
-                    res = cur.fetchone()
-                    teacherProfile = get_dicebear_image(res[0]) if (res[1] is None) \
-                                                                        else res[1]
-
-                    purchased = isInCart = False
-                    if (loggedInUserID is not None):
-                        cur.execute(
-                            "SELECT * FROM purchased_courses WHERE course_id=%(courseID)s AND user_id=%(userID)s",
-                            {"courseID":matchedList[i][0], "userID":loggedInUserID}
-                        )
-                        purchased = True if (cur.fetchone() is not None) else False
-                        cur.execute(
-                            "SELECT * FROM cart WHERE course_id=%(courseID)s AND user_id=%(userID)s",
-                            {"courseID":matchedList[i][0], "userID":loggedInUserID}
-                        )
-                        isInCart = True if (cur.fetchone() is not None) else False
-
-                    courseInfoList.append(
-                        (CourseInfo(matchedList[i], profilePic=teacherProfile, truncateData=True),
-                        {"purchased":purchased, "isInCart":isInCart})
-                    )
-                return courseInfoList
-            else:
-                cur.execute("SELECT username, profile_image FROM user WHERE id=%(teacherID)s", {"teacherID":teacherID})
-                res = cur.fetchone()
-                teacherProfile = get_dicebear_image(res[0]) if (res[1] is None) \
-                                                                    else res[1]
-                for tupleInfo in matchedList:
-                    purchased = isInCart = False
-                    if (loggedInUserID is not None):
-                        cur.execute(
-                            "SELECT * FROM purchased_courses WHERE course_id=%(courseID)s AND user_id=%(userID)s",
-                            {"courseID":tupleInfo[0], "userID":loggedInUserID}
-                        )
-                        purchased = True if (cur.fetchone() is not None) else False
-                        cur.execute(
-                            "SELECT * FROM cart WHERE course_id=%(courseID)s AND user_id=%(userID)s",
-                            {"courseID":tupleInfo[0], "userID":loggedInUserID}
-                        )
-                        isInCart = True if (cur.fetchone() is not None) else False
-
-                    courseInfoList.append(
-                        (CourseInfo(tupleInfo, profilePic=teacherProfile, truncateData=True),
-                        {"purchased":purchased, "isInCart":isInCart})
-                    )
-
-                if (kwargs.get("getTeacherUsername")):
-                    return (courseInfoList, res[0])
-
-                return courseInfoList
+        courseInfoList = []
+        for tupleInfo in matchedList:
+            # the teacher's username and profile image are stored in the course_card read model
+            teacherProfile = get_dicebear_image(tupleInfo[2]) if (tupleInfo[3] is None) \
+                                                              else tupleInfo[3]
+            courseInfoList.append(CourseInfo(tupleInfo, profilePic=teacherProfile, truncateData=True))
+
+        # the purchased and in cart flags are not retrieved here so that
+        # the carousel can be cached for all users (see get_course_carousel())
+        teacherUsername = matchedList[0][2] if (teacherID and matchedList) else None
+        return (courseInfoList, teacherUsername)
+
+    elif (mode == "get_purchase_flags"):
+        return get_course_purchase_flags(cur, kwargs["userID"], kwargs["courseIDList"])
 
     elif (mode == "search") or (mode == "explore"):
         courseTag = kwargs.get("courseCategory")
         searchInput = kwargs.get("searchInput")
-        pageNum = kwargs.get("pageNum")
-        if (pageNum > 2147483647):
-            pageNum = 2147483647
+        pageNum = min(kwargs.get("pageNum"), 2147483647)
 
-        resultsList = []
         if (mode == "search"):
             write_log_entry(
                 logMessage=f"Input for {mode} SQL Command : {searchInput}",
                 severity="NOTICE"
             )
-            cur.execute("CALL search_course_paginate(%(pageNum)s, %(searchInput)s)", {"pageNum":pageNum,"searchInput":searchInput})
+            searchQuery = build_fulltext_search_query(searchInput)
         else:
             write_log_entry(
                 logMessage=f"Input for {mode} SQL Command : {courseTag}",
                 severity="NOTICE"
             )
-            cur.execute("CALL explore_course_paginate(%(pageNum)s, %(courseTag)s)", {"pageNum":pageNum,"courseTag":courseTag})
+            searchQuery = None
 
-        foundResults = cur.fetchall()
-        if (len(foundResults) == 0):
-            return []
+        if (searchQuery):
+            # the FULLTEXT search results are ranked by relevance, hence
+            # the pages are retrieved by offset and the total count is computed with the page
+            cur.execute(
+                "CALL search_course_fulltext_paginate(%(pageNum)s, %(searchQuery)s)",
+                {"pageNum":pageNum, "searchQuery":searchQuery}
+            )
+            foundResults = cur.fetchall() or ()
+            maxPage = max(ceil(foundResults[0][-1] / 10), 1) if (foundResults) else 1
+            foundResults = [tupleInfo[:-1] for tupleInfo in foundResults]
+            pageCursors = {}
+        elif (mode == "search"):
+            # fallback to the LIKE search for search inputs with only short words (e.g. "C") that are not indexed
+            totalCount = get_total_count(
+                cur, "SELECT COUNT(*) FROM course_card WHERE course_name LIKE %(searchQuery)s AND active=1",
+                {"searchQuery":f"%{searchInput}%"}, cacheKey=("search", searchInput)
+            )
+            foundResults, maxPage, pageCursors = paginate_by_keyset(
+                cur, "search_course_paginate", (searchInput,), pageNum, kwargs.get("pageCursor"), totalCount, sortKeyIndices=(9, 0)
+            )
+        else:
+            totalCount = get_total_count(
+                cur, "SELECT COUNT(*) FROM course_card WHERE course_category=%(courseTag)s AND active=1",
+                {"courseTag":courseTag}, cacheKey=("explore", courseTag)
+            )
+            foundResults, maxPage, pageCursors = paginate_by_keyset(
+                cur, "explore_course_paginate", (courseTag,), pageNum, kwargs.get("pageCursor"), totalCount, sortKeyIndices=(9, 0)
+            )
 
-        maxPage = ceil(foundResults[0][-1] / 10)
-        teacherIDList = [teacherID[2] for teacherID in foundResults]
-        for i, teacherID in enumerate(teacherIDList):
-            cur.execute("SELECT username, profile_image FROM user WHERE id=%(teacherID)s", {"teacherID":teacherID})
-            res = cur.fetchone()
-            teacherProfile = get_dicebear_image(res[0]) if (res[1] is None) \
-                                                                else res[1]
-            foundResultsTuple = foundResults[i][1:]
-            resultsList.append(CourseInfo(foundResultsTuple, profilePic=teacherProfile, truncateData=True))
+        resultsList = []
+        for tupleInfo in foundResults:
+            # the teacher's username and profile image are stored in the course_card read model
+            teacherProfile = get_dicebear_image(tupleInfo[2]) if (tupleInfo[3] is None) \
+                                                              else tupleInfo[3]
+            resultsList.append(CourseInfo(tupleInfo, profilePic=teacherProfile, truncateData=True))
 
-        return (resultsList, maxPage)
+        return (resultsList, maxPage, pageCursors)
 
     else:
         raise ValueError("Invalid mode in the course_sql_operation function!")
@@ -2184,6 +2818,7 @@ def review_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
             severity="NOTICE"
         )
         connection.commit()
+        invalidate_course_listings()
 
     elif mode == "retrieve_all":
         cur.execute("SELECT r.user_id, r.course_id, r.course_rating, r.course_review, r.review_date, u.username FROM review r INNER JOIN user u ON r.user_id = u.id WHERE r.course_id = %(courseID)s", {"courseID":courseID})
@@ -2205,45 +2840,38 @@ def review_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwarg
         return (True, ReviewInfo(matchedReview))
 
     elif (mode == "get_3_latest_user_review"):
-        cur.execute("SELECT r.user_id, r.course_id, r.course_rating, r.course_review, r.review_date, u.username FROM review r INNER JOIN user u ON r.user_id = u.id WHERE r.course_id = %(courseID)s ORDER BY r.review_date DESC LIMIT 3", {"courseID":courseID})
+        cur.execute("""
+            SELECT r.user_id, r.course_id, r.course_rating, r.course_review, r.review_date,
+            u.username, u.profile_image, ro.role_name
+            FROM review r
+            INNER JOIN user u ON r.user_id = u.id
+            INNER JOIN role ro ON u.role = ro.role_id
+            WHERE r.course_id = %(courseID)s ORDER BY r.review_date DESC LIMIT 3
+        """, {"courseID":courseID})
         matchedReview = cur.fetchall()
         if (matchedReview is None):
             return []
 
         reviewArr = []
         for tupleData in matchedReview:
-            reviewUserID = tupleData[0]
-            reviewInfo = get_image_path(reviewUserID, returnUserInfo=True)
-            imageSrcPath = reviewInfo.profileImage
+            imageSrcPath = get_reviewer_image_path(tupleData[5], tupleData[6], tupleData[7])
             reviewArr.append(Reviews(tupleData=tupleData, courseID=courseID, profileImage=imageSrcPath))
         return reviewArr
 
     elif (mode == "paginate_reviews"):
-        pageNum = kwargs["pageNum"]
-        if (pageNum > 2147483647):
-            pageNum = 2147483647
-
-        cur.execute("CALL paginate_review_by_course(%(pageNum)s, %(courseID)s)", {"courseID":courseID, "pageNum":pageNum})
-        matchedReview = cur.fetchall()
-        if (matchedReview is None or len(matchedReview) < 1):
-            return ([], 1)
-
-        maxPage = 1
-        if (len(matchedReview) > 0):
-            maxPage = ceil(matchedReview[0][-1] / 10)
-
-        # To prevent infinite redirects
-        if (maxPage <= 0):
-            maxPage = 1
+        # the number of reviews is maintained in the course_card read model
+        cur.execute("SELECT review_count FROM course_card WHERE course_id=%(courseID)s", {"courseID":courseID})
+        reviewCount = cur.fetchone()
+        matchedReview, maxPage, pageCursors = paginate_by_keyset(
+            cur, "paginate_review_by_course", (courseID,), kwargs["pageNum"], kwargs.get("pageCursor"),
+            reviewCount[0] if (reviewCount is not None) else 0, sortKeyIndices=(4, 0)
+        )
 
         reviewArr = []
         for tupleData in matchedReview:
-            tupleData = tupleData[1:]
-            reviewUserID = tupleData[0]
-            reviewInfo = get_image_path(reviewUserID, returnUserInfo=True)
-            imageSrcPath = reviewInfo.profileImage
+            imageSrcPath = get_reviewer_image_path(tupleData[5], tupleData[6], tupleData[7])
             reviewArr.append(Reviews(tupleData=tupleData, courseID=courseID, profileImage=imageSrcPath))
-        return (reviewArr, maxPage)
+        return (reviewArr, maxPage, pageCursors)
 
     else:
         raise ValueError("Invalid mode in the review_sql_operation function!")
@@ -2263,6 +2891,11 @@ def role_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
         role_list = cur.fetchall()
         return role_list if (role_list is not None) else []
 
+    elif mode == "get_version":
+        # the sum of the versions of all the roles which is incremented by the role_before_update trigger
+        cur.execute("SELECT COALESCE(SUM(version), 0) FROM role")
+        return int(cur.fetchone()[0])
+
     elif mode == "retrieve_admin":
         cur.execute("SELECT * FROM role WHERE role_name = 'Admin'")
         role_list = cur.fetchall()
@@ -2287,5 +2920,12 @@ def role_sql_operation(connection:MySQLConnection=None, mode:str=None, **kwargs)
         )
         connection.commit()
 
+        # rebuild the RBAC decision table of this worker after the update is committed
+        # while the other workers will rebuild theirs after detecting the new role version
+        if (has_request_context() and "dbConnection" in g):
+            g.setdefault("dbAfterCommitCallbacks", []).append(RBAC_DECISION_TABLE_CACHE.invalidate)
+        else:
+            RBAC_DECISION_TABLE_CACHE.invalidate()
+
     else:
         raise ValueError("Invalid mode in the role_sql_operation function!")
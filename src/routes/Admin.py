@@ -158,12 +158,14 @@ def userManagement():
             filterInput = "username"
 
         userInput = userInput[:100] # limit user input to 100 characters to avoid buffer overflow when querying in MySQL
-        userArr, maxPage = sql_operation(
-            table="user", mode="paginate_users", pageNum=pageNum, 
+        userArr, maxPage, pageCursors = sql_operation(
+            table="user", mode="paginate_users", pageNum=pageNum, pageCursor=request.args.get("c"),
             userInput=unquote_plus(userInput), filterType=filterInput, role="User"
         )
     else:
-        userArr, maxPage = sql_operation(table="user", mode="paginate_users", pageNum=pageNum, role="User")
+        userArr, maxPage, pageCursors = sql_operation(
+            table="user", mode="paginate_users", pageNum=pageNum, pageCursor=request.args.get("c"), role="User"
+        )
 
     if (pageNum > maxPage):
         return redirect(
@@ -175,4 +177,4 @@ def userManagement():
 
     # save the current URL in the session for when the admin searches and an error occurs
     session["relative_url"] = request.full_path
-    return render_template("users/admin/user_management.html", currentPage=pageNum, userArr=userArr, maxPage=maxPage, paginationArr=paginationArr, form=recoverUserForm)
\ No newline at end of file
+    return render_template("users/admin/user_management.html", currentPage=pageNum, userArr=userArr, maxPage=maxPage, paginationArr=paginationArr, pageCursors=pageCursors, form=recoverUserForm)
\ No newline at end of file
@@ -2,7 +2,10 @@
 Routes for error pages
 """
 # import flask libraries (Third-party libraries)
-from flask import Blueprint, render_template, abort, url_for, Markup
+from flask import Blueprint, render_template, abort, url_for, Markup, g, has_request_context
+
+# import local python libraries
+from python_files.classes.Errors import PasswordHashingBusyError
 
 errorBP = Blueprint("errorBP", __name__, static_folder="static", template_folder="template")
 
@@ -115,4 +118,15 @@ def error503(e):
     return render_template(
         "error_base.html", title="503 Service Temporarily Unavailable", errorNo=503,
         description="This could be due to maintenance downtime or capacity problems. Please try again later."
-    ), 503
\ No newline at end of file
+    ), 503
+
+# Password hashing executor is saturated (e.g. a burst of logins)
+@errorBP.app_errorhandler(PasswordHashingBusyError)
+def password_hashing_busy(e):
+    if (has_request_context()):
+        # do not commit the request's writes before the password was hashed/verified
+        g.dbRollbackOnly = True
+    return render_template(
+        "error_base.html", title="503 Service Temporarily Unavailable", errorNo=503,
+        description="We are currently receiving too many requests. Please try again in a few seconds."
+    ), 503, {"Retry-After": "5"}
@@ -40,8 +40,8 @@ def home():
     else:
         userID = session["user"]
 
-    latestThreeCourses = sql_operation(table="course", mode="get_3_latest_courses", userID=userID)
-    threeHighlyRatedCourses = sql_operation(table="course", mode="get_3_highly_rated_courses", userID=userID)
+    latestThreeCourses, _ = get_course_carousel(mode="get_3_latest_courses", userID=userID)
+    threeHighlyRatedCourses, _ = get_course_carousel(mode="get_3_highly_rated_courses", userID=userID)
 
     return render_template(
         "users/general/home.html", imageSrcPath=imageSrcPath,
@@ -87,8 +87,11 @@ def teacherPage(teacherID:str):
     else:
         userID = session["user"]
 
-    latestThreeCourses = sql_operation(table="course", mode="get_3_latest_courses", teacherID=teacherID, getTeacherUsername=False, userID=userID)
-    threeHighlyRatedCourses, teacherUsername = sql_operation(table="course", mode="get_3_highly_rated_courses", teacherID=teacherID, getTeacherUsername=True, userID=userID)
+    latestThreeCourses, _ = get_course_carousel(mode="get_3_latest_courses", teacherID=teacherID, userID=userID)
+    threeHighlyRatedCourses, teacherUsername = get_course_carousel(mode="get_3_highly_rated_courses", teacherID=teacherID, userID=userID)
+    if (teacherUsername is None):
+        # the teacher has no courses yet
+        teacherUsername = teacherInfo.username
 
     return render_template("users/general/teacher_page.html",
         imageSrcPath=imageSrcPath, teacherUsername=teacherUsername,
@@ -117,8 +120,8 @@ def allCourses(teacherID:str):
     else:
         userID = session["user"]
 
-    courseList, maxPage, teacherName = sql_operation(
-        table="course", mode="get_all_courses_by_teacher", pageNum=page, 
+    courseList, maxPage, teacherName, pageCursors = sql_operation(
+        table="course", mode="get_all_courses_by_teacher", pageNum=page, pageCursor=request.args.get("c"),
         teacherID=teacherID, getTeacherName=True, userID=userID
     )
     paginationArr = []  
@@ -131,7 +134,7 @@ def allCourses(teacherID:str):
     if (courseList):
         paginationArr = get_pagination_arr(pageNum=page, maxPage=maxPage)
 
-    return render_template("users/general/course_list.html", imageSrcPath=imageSrcPath, courseListLen=len(courseList), accType=accType, currentPage=page, maxPage=maxPage, courseList=courseList, teacherID=teacherID, isOwnself=False, paginationArr=paginationArr, userID=userID, teacherName=teacherName)
+    return render_template("users/general/course_list.html", imageSrcPath=imageSrcPath, courseListLen=len(courseList), accType=accType, currentPage=page, maxPage=maxPage, courseList=courseList, teacherID=teacherID, isOwnself=False, paginationArr=paginationArr, pageCursors=pageCursors, userID=userID, teacherName=teacherName)
 
 @generalBP.route("/course/<string:courseID>/reviews")
 def reviewPage(courseID:str):
@@ -153,17 +156,20 @@ def reviewPage(courseID:str):
         )
         accType = userInfo.role
 
-    reviewArr, maxPage = sql_operation(table="review", mode="paginate_reviews", courseID=courseID, pageNum=pageNum)
+    reviewArr, maxPage, pageCursors = sql_operation(
+        table="review", mode="paginate_reviews", courseID=courseID, pageNum=pageNum, pageCursor=request.args.get("c")
+    )
 
     if (pageNum > maxPage):
         return redirect(url_for("userBP.reviewPage", courseID=courseID) + f"?p={maxPage}")
 
+    paginationArr = []
     if (reviewArr):
         paginationArr = get_pagination_arr(pageNum=pageNum, maxPage=maxPage)
 
     return render_template(
         "users/general/review_page.html",
-        imageSrcPath=imageSrcPath, purchased=purchased, isInCart=isInCart, paginationArr=paginationArr,
+        imageSrcPath=imageSrcPath, purchased=purchased, isInCart=isInCart, paginationArr=paginationArr, pageCursors=pageCursors,
         accType=accType, reviewArr=reviewArr, courses=courses, maxPage=maxPage, currentPage=pageNum
     )
 
@@ -251,15 +257,15 @@ def search():
 
     if (courseCategory):
         if (get_readable_category(courseCategory) != "Unknown Category"):
-            listInfo = sql_operation(table="course", mode="explore", courseCategory=searchInput, pageNum=page)
+            foundResults, maxPage, pageCursors = sql_operation(
+                table="course", mode="explore", courseCategory=searchInput, pageNum=page, pageCursor=request.args.get("c")
+            )
         else: # if no such course category exist, default to "Programming" category
             return redirect(url_for("generalBP.search") + "?ct=Programming")
     else:
-        listInfo = sql_operation(table="course", mode="search", searchInput=searchInput, pageNum=page)
-
-    foundResults, maxPage = [], 1
-    if (listInfo):
-        foundResults, maxPage = listInfo[0], listInfo[1]
+        foundResults, maxPage, pageCursors = sql_operation(
+            table="course", mode="search", searchInput=searchInput, pageNum=page, pageCursor=request.args.get("c")
+        )
 
     if (page > maxPage):
         return redirect(
@@ -268,7 +274,7 @@ def search():
 
     # Compute the buttons needed for pagination
     paginationArr = []
-    if (listInfo):
+    if (foundResults):
         paginationArr = get_pagination_arr(pageNum=page, maxPage=maxPage)
 
     accType = imageSrcPath = None
@@ -279,7 +285,7 @@ def search():
     elif ("admin" in session):
         accType = "Admin"
 
-    return render_template("users/general/search.html", searchInput=searchInput, currentPage=page, foundResults=foundResults, foundResultsLen=len(foundResults), imageSrcPath=imageSrcPath, maxPage=maxPage, accType=accType, paginationArr=paginationArr, tagSearch=tagSearch)
+    return render_template("users/general/search.html", searchInput=searchInput, currentPage=page, foundResults=foundResults, foundResultsLen=len(foundResults), imageSrcPath=imageSrcPath, maxPage=maxPage, accType=accType, paginationArr=paginationArr, pageCursors=pageCursors, tagSearch=tagSearch)
 
 @generalBP.route("/verify-email/<string:token>")
 @limiter.limit(current_app.config["CONSTANTS"].SENSITIVE_PAGE_LIMIT)
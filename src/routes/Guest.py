@@ -66,7 +66,9 @@ def recoverAccount(token:str):
 
         # update the password, remove the token from the database, and reactivate the user's account
         try:
-            sql_operation(table="user", mode="reset_password", userID=userID, newPassword=passwordInput, token=token)
+            passwordReset = sql_operation(
+                table="user", mode="reset_password", userID=userID, newPassword=passwordInput, token=token, purpose="recover_account"
+            )
         except (HashingError) as e:
             write_log_entry(
                 logMessage={
@@ -79,6 +81,11 @@ def recoverAccount(token:str):
             flash("An error occurred while resetting your password! Please try again later.", "Danger")
             return render_template("users/guest/reset_password.html", form=resetPasswordForm)
 
+        if (not passwordReset):
+            # if the token was used by another request in the meantime
+            flash("Recovery account link is invalid or has expired!", "Danger")
+            return redirect(url_for("guestBP.login"))
+
         sql_operation(table="user", mode="reactivate_user", userID=userID)
         flash("Password has been reset successfully!", "Success")
         return redirect(url_for("guestBP.login"))
@@ -170,10 +177,8 @@ def resetPasswordRequest():
             flash("Reset password instructions has been sent to your email if it's in our database!", "Success")
             return redirect(url_for("guestBP.login"))
 
-        # create a token using the secrets library that is to be stored in the database 
-        # with an active duration of 30 mins before it expires
-        # and send the encrypted form of the token to user's email.
-        # Note: The token in the database is not encrypted.
+        # create a stateless token with an active duration of 30 mins before it expires
+        # and send it to user's email (see generate_url_token()).
         encryptedToken = sql_operation(
             table="expirable_token", mode="add_token", 
             userID=userInfo[0], purpose="reset_password",
@@ -243,8 +248,11 @@ def resetPassword(token:str):
             flash("Your password is not strong enough!", "Danger")
             return render_template("users/guest/reset_password.html", form=resetPasswordForm, twoFAEnabled=twoFAEnabled)
 
-        # update the password and delete the token from the database after usage
-        sql_operation(table="user", mode="reset_password", userID=userID, newPassword=passwordInput, token=token)
+        # update the password and use up the token so that it cannot be used again
+        if (not sql_operation(table="user", mode="reset_password", userID=userID, newPassword=passwordInput, token=token)):
+            flash("Reset password link is invalid or has expired!", "Danger")
+            return redirect(url_for("guestBP.login"))
+
         flash("Password has been reset successfully!", "Success")
         return redirect(url_for("guestBP.login"))
     else:
@@ -640,7 +648,7 @@ def signup():
             return render_template("users/guest/signup.html", form=signupForm)
 
         try:
-            passwordInput = current_app.config["CONSTANTS"].PH.hash(passwordInput)
+            passwordInput = PASSWORD_HASHING_EXECUTOR.hash(passwordInput)
         except (HashingError) as e:
             write_log_entry(
                 logMessage={
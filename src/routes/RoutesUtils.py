@@ -1,14 +1,17 @@
 # import flask libraries (Third-party libraries)
-from flask import render_template, request, session, abort, current_app, redirect, wrappers, url_for
+from flask import render_template, request, session, abort, current_app, redirect, wrappers, url_for, g
 from flask_limiter.util import get_remote_address
 
 # import local python libraries
-from python_files.functions.SQLFunctions import sql_operation
+from python_files.functions.SQLFunctions import sql_operation, commit_request_transaction, end_request_transaction, get_request_sql_stats
 from python_files.functions.NormalFunctions import upload_new_secret_version, generate_secure_random_bytes
-from python_files.classes.Roles import RoleInfo
+from python_files.classes.Roles import RBACDecisionTable, RBAC_DECISION_TABLE_CACHE
+from python_files.classes.IPAllowlist import IPAllowlist, JSONIPAllowlistCache
 
 # import python standard libraries
-import json, re
+import re
+from time import monotonic
+from typing import Union
 
 def get_user_ip() -> str:
     """Get the user's IP address"""
@@ -30,15 +33,101 @@ def update_secret_key() -> None:
     # Generate a new key using the secrets module from Python standard library
     # as recommended by OWASP to ensure higher entropy:
     # https://cheatsheetseries.owasp.org/cheatsheets/Cryptographic_Storage_Cheat_Sheet.html#secure-random-number-generation
-    current_app.config["SECRET_KEY"] = generate_secure_random_bytes(
+    secretKey = generate_secure_random_bytes(
         nBytes=current_app.config["CONSTANTS"].SESSION_NUM_OF_BYTES, generateFromHSM=True
     )
+    # upload before switching so that the other workers can switch to the new key as well
     upload_new_secret_version(
         secretID=current_app.config["CONSTANTS"].FLASK_SECRET_KEY_NAME,
-        secret=current_app.config["SECRET_KEY"],
+        secret=secretKey,
         destroyPastVer=True,
         destroyOptimise=True
     )
+    set_secret_key(secretKey)
+
+def set_secret_key(secretKey:bytes) -> None:
+    """
+    Sign the session cookies and the CSRF tokens with the new Flask secret key while
+    still accepting the previous key for SECRET_KEY_FALLBACK_DURATION seconds
+    as the other workers (and instances) might not have switched to the new key yet.
+
+    Args:
+    - secretKey (bytes): The new Flask secret key
+    """
+    previousKey = current_app.config.get("SECRET_KEY")
+    if (previousKey == secretKey):
+        return
+
+    fallbackKeys = [previousKey] if (previousKey) else []
+    current_app.config["SECRET_KEY_FALLBACKS"] = fallbackKeys
+    current_app.config["SECRET_KEY_FALLBACKS_EXPIRY"] = monotonic() + current_app.config["CONSTANTS"].SECRET_KEY_FALLBACK_DURATION
+    # itsdangerous signs with the last key and verifies with any of the keys
+    current_app.config["WTF_CSRF_SECRET_KEY"] = [*fallbackKeys, secretKey]
+    current_app.config["SECRET_KEY"] = secretKey
+
+def remove_expired_secret_key_fallbacks() -> None:
+    """Stop accepting the previous Flask secret key once every worker has switched to the new key"""
+    if (
+        current_app.config.get("SECRET_KEY_FALLBACKS") and
+        monotonic() > current_app.config.get("SECRET_KEY_FALLBACKS_EXPIRY", 0)
+    ):
+        current_app.config["SECRET_KEY_FALLBACKS"] = []
+        current_app.config["WTF_CSRF_SECRET_KEY"] = [current_app.config["SECRET_KEY"]]
+
+ADMIN_IP_ALLOWLIST_CACHE = JSONIPAllowlistCache()
+DEBUG_ADMIN_IP_ALLOWLIST = IPAllowlist(("127.0.0.1", "::1"))
+
+def get_admin_ip_allowlist() -> IPAllowlist:
+    """
+    Get the compiled allowlist of the IP addresses or CIDR ranges that admins can access the web app from.
+
+    The secret is served from the in-memory secret cache (refreshed in the background)
+    and the allowlist is only recompiled when a new secret version is retrieved.
+
+    Returns:
+    - The admin IP allowlist
+    """
+    if (current_app.config["DEBUG_FLAG"]):
+        return DEBUG_ADMIN_IP_ALLOWLIST
+
+    return ADMIN_IP_ALLOWLIST_CACHE.get(
+        current_app.config["SECRET_CONSTANTS"].get_secret_payload(
+            secretID=current_app.config["CONSTANTS"].ADMIN_IP_ALLOWLIST_NAME, decodeSecret=False
+        )
+    )
+
+def get_endpoint_info() -> dict:
+    """
+    Get the blueprint and route names of all the endpoints in the web app's URL map.
+
+    Returns:
+    - A dict of the endpoints mapped to their (blueprint, route) tuples
+        - Endpoints without a blueprint (e.g. static) are excluded
+    """
+    endpointInfo = {}
+    for rule in current_app.url_map.iter_rules():
+        if (re.fullmatch(current_app.config["CONSTANTS"].BLUEPRINT_ENDPOINT_REGEX, rule.endpoint)):
+            requestBlueprint, requestRoute = rule.endpoint.split(sep=".", maxsplit=1)
+            endpointInfo[rule.endpoint] = (requestBlueprint, requestRoute)
+    return endpointInfo
+
+def get_rbac_decision_table() -> Union[RBACDecisionTable, None]:
+    """
+    Get the RBAC decision table of this worker.
+
+    The role version is checked at most once every RBAC_VERSION_CHECK_INTERVAL seconds
+    and the decision table is only rebuilt if the roles were updated since it was compiled.
+
+    Returns:
+    - The RBAC decision table or None if the database is not available
+    """
+    if (RBAC_DECISION_TABLE_CACHE.try_acquire_version_check()):
+        decisionTable = RBAC_DECISION_TABLE_CACHE.table
+        if (decisionTable is None or sql_operation(table="role", mode="get_version") != decisionTable.version):
+            roles = sql_operation(table="role", mode="retrieve_all")
+            if (roles is not None):
+                RBAC_DECISION_TABLE_CACHE.set_table(RBACDecisionTable(roles, get_endpoint_info()))
+    return RBAC_DECISION_TABLE_CACHE.table
 
 @current_app.before_request
 def before_request() -> None:
@@ -60,20 +149,20 @@ def before_request() -> None:
     if (request.endpoint is None):
         abort(404)
 
-    # Check if the route has a blueprint
-    hasBlueprint = False
-    requestBlueprint = requestRoute = None
+    # Check if the route has a blueprint using the endpoints precomputed from the URL map
+    decisionTable = requestRoute = None
     if (isNotStaticEndpoint):
-        if (re.fullmatch(current_app.config["CONSTANTS"].BLUEPRINT_ENDPOINT_REGEX, request.endpoint)):
-            splittedRequestEndpoint = request.endpoint.split(sep=".", maxsplit=1)
-            requestBlueprint = splittedRequestEndpoint[0]
-            requestRoute = splittedRequestEndpoint[1]
-            hasBlueprint = True
-
-    if (isNotStaticEndpoint and not hasBlueprint):
-        # Since all routes except static endpoint have a blueprint,
-        # abort(404) if the request does not have a blueprint
-        abort(404)
+        decisionTable = get_rbac_decision_table()
+        if (decisionTable is None):
+            # database is not available, sql_operation() has enabled the maintenance mode
+            return render_template("maintenance.html", estimation="soon!")
+
+        endpointInfo = decisionTable.get_endpoint_info(request.endpoint)
+        if (endpointInfo is None):
+            # Since all routes except static endpoint have a blueprint,
+            # abort(404) if the request does not have a blueprint
+            abort(404)
+        requestRoute = endpointInfo[1]
 
     # check if state key is in session
     # remove if the user is no longer on the google OAuth2 routes
@@ -125,9 +214,9 @@ def before_request() -> None:
             userID = session.get("user") or session.get("admin")
             sessionID = session.get("sid")
 
-            if (
-                sessionID is not None and
-                sql_operation(
+            sessionUserInfo = None
+            if (sessionID is not None):
+                sessionUserInfo = sql_operation(
                     table="session",
                     mode="check_if_valid",
                     sessionID=sessionID,
@@ -135,9 +224,12 @@ def before_request() -> None:
                     userIP=get_user_ip(),
                     userAgent=request.user_agent.string
                 )
-            ):
-                # if session ID is valid
-                pass
+
+            if (sessionUserInfo):
+                # if session ID is valid, memoize the user's data for the rest of the request
+                # to avoid retrieving it again with get_image_path()
+                g.currentUserInfo = sessionUserInfo
+                g.currentUserInfoHasCart = False
             elif (sessionID is None):
                 # if session ID is missing from the cookie
                 print("Session cleared due to missing session ID!")
@@ -149,70 +241,34 @@ def before_request() -> None:
 
     # If the admin still has the session cookie but is not in a whitelisted IP address
     if ("admin" in session):
-        if (not current_app.config["DEBUG_FLAG"]):
-            adminWhitelistedIP = tuple(json.loads(
-                current_app.config["SECRET_CONSTANTS"].get_secret_payload(secretID="ip-address-whitelist")
-            ))
-        else:
-            adminWhitelistedIP = ("127.0.0.1",)
-
-        if (get_user_ip() not in adminWhitelistedIP):
+        if (get_user_ip() not in get_admin_ip_allowlist()):
             session.clear()
             abort(403)
 
     if (isNotStaticEndpoint):
-        # Retrieve the roles database, there could be a better way to do this
-        roles = sql_operation(table="role", mode="retrieve_all")
-        roleTable = {}
-        for idx, role in enumerate(roles): # iterate through each role and append the information to a list
-            currentRoleName = current_app.config["CONSTANTS"].ROLE_NAME_ORDER_TUPLE[idx]
-            roleTable[currentRoleName] = RoleInfo(role).format_blueprints_for_checking()
-
-        allowedAccess = False
-        if ("user" in session and requestBlueprint in roleTable["Student"]):
-            allowedAccess = True # allow the user to access the page
-        elif ("user" in session and requestBlueprint in roleTable["Teacher"]):
-            if (session.get("isTeacher", False)):
-                allowedAccess = True # allow the teacher to access the page
+        if ("user" in session):
+            principal = "Teacher" if (session.get("isTeacher", False)) else "Student"
         elif ("admin" in session):
-            isSuperAdmin = session.get("isSuperAdmin", False)
-            if (not isSuperAdmin and requestBlueprint in roleTable["Admin"]):
-                allowedAccess = True # allow the admin to access the page
-            elif (isSuperAdmin and requestBlueprint in roleTable["SuperAdmin"]):
-                allowedAccess = True # allow the superadmin to access the page
-        elif ("user" not in session and "admin" not in session and requestBlueprint in roleTable["Guest"]):
-            allowedAccess = True # allow the guest user to access the page
+            principal = "SuperAdmin" if (session.get("isSuperAdmin", False)) else "Admin"
+        else:
+            principal = "Guest"
 
+        allowedAccess, redirectEndpoint = decisionTable.get_decision(principal, request.endpoint)
         if (not allowedAccess):
-            blueprintRedirectTable = {}
-            if ("user" in session):
-                if (session.get("isTeacher", False)):
-                    # If the teacher user is not allowed to access the page
-                    blueprintRedirectTable = current_app.config["CONSTANTS"].TEACHER_REDIRECT_TABLE
-                else: # If the student user is not allowed to access the page
-                    blueprintRedirectTable = current_app.config["CONSTANTS"].USER_REDIRECT_TABLE
-            elif ("admin" in session):
-                if (session.get("isSuperAdmin", False)):
-                    # If the super-admin user is not allowed to access the page
-                    blueprintRedirectTable = current_app.config["CONSTANTS"].SUPERADMIN_REDIRECT_TABLE
-                else: # If the admin user is not allowed to access the page
-                    blueprintRedirectTable = current_app.config["CONSTANTS"].ADMIN_REDIRECT_TABLE
-            else:
-                # If the guest user is not allowed to access the page
-                blueprintRedirectTable = current_app.config["CONSTANTS"].GUEST_REDIRECT_TABLE
-
-            if (request.endpoint in blueprintRedirectTable):
-                return redirect(url_for(blueprintRedirectTable[request.endpoint], **request.view_args))
-            elif (requestBlueprint in blueprintRedirectTable):
-                return redirect(url_for(blueprintRedirectTable[requestBlueprint], **request.view_args))
+            if (redirectEndpoint is not None):
+                return redirect(url_for(redirectEndpoint, **request.view_args))
             else:
                 abort(404)
 
 @current_app.after_request # called after each request to the application
 def after_request(response:wrappers.Response) -> wrappers.Response:
     """
-    Add headers to the response after each request.
+    Commit the request's database transaction before the response is sent
+    and add headers to the response after each request.
     """
+    # a failed commit raises an InternalServerError so that the user gets an error response instead
+    commit_request_transaction(isErrorResponse=(response.status_code >= 500))
+
     if (not current_app.config["CONSTANTS"].DEBUG_MODE):
         if (request.endpoint == "static"):
             # Cache for 1 year for static files (except when in debug/dev mode)
@@ -221,4 +277,19 @@ def after_request(response:wrappers.Response) -> wrappers.Response:
             # cache control shld be private as we dont want our proxy to cache the response
             # Disable caching for state changing requests (if NOT in debug/dev mode)
             response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+    else:
+        # Show the request's SQL statistics in the browser's dev tools (Network > Timing)
+        sqlStats = get_request_sql_stats()
+        response.headers.add(
+            "Server-Timing",
+            f"sql;dur={sqlStats['duration_ms']:.2f};desc=\"{sqlStats['queries']} queries, {sqlStats['connections']} connections, {sqlStats['rows']} rows\""
+        )
     return response
+
+@current_app.teardown_request # called at the end of each request even if an unhandled exception occurred
+def teardown_request(exception:BaseException=None) -> None:
+    """
+    Roll back the request's uncommitted writes (if any)
+    and return its connection to the MySQL connection pool.
+    """
+    end_request_transaction(exception)
@@ -77,13 +77,14 @@ def adminManagement():
             filterInput = "username"
 
         userInput = userInput[:100] # limit user input to 100 characters to avoid buffer overflow when querying in MySQL
-        userArr, maxPage = sql_operation(
-            table="user", mode="paginate_users", pageNum=pageNum, 
+        userArr, maxPage, pageCursors = sql_operation(
+            table="user", mode="paginate_users", pageNum=pageNum, pageCursor=request.args.get("c"),
             userInput=unquote_plus(userInput), filterType=filterInput, role="Admin"
         )
     else:
-        # print(sql_operation(table="user", mode="paginate_users", pageNum=pageNum, role="Admin"))
-        userArr, maxPage = sql_operation(table="user", mode="paginate_users", pageNum=pageNum, role="Admin")
+        userArr, maxPage, pageCursors = sql_operation(
+            table="user", mode="paginate_users", pageNum=pageNum, pageCursor=request.args.get("c"), role="Admin"
+        )
 
     if (pageNum > maxPage):
         return redirect(
@@ -95,7 +96,7 @@ def adminManagement():
 
     # save the current URL in the session for when the admin searches and an error occurs
     session["relative_url"] = request.full_path
-    return render_template("users/superadmin/admin_management.html", currentPage=pageNum, userArr=userArr, maxPage=maxPage, paginationArr=paginationArr, form=recoverUserForm )
+    return render_template("users/superadmin/admin_management.html", currentPage=pageNum, userArr=userArr, maxPage=maxPage, paginationArr=paginationArr, pageCursors=pageCursors, form=recoverUserForm )
 
 @superAdminBP.route("/admin-rbac", methods=["GET","POST"])
 def roleManagement(): 
@@ -32,7 +32,9 @@ def courseList():
         )
 
     userInfo = get_image_path(session["user"], returnUserInfo=True)
-    courseList, maxPage = sql_operation(table="course", mode="get_all_courses_by_teacher", teacherID=userInfo.uid, pageNum=page)
+    courseList, maxPage, pageCursors = sql_operation(
+        table="course", mode="get_all_courses_by_teacher", teacherID=userInfo.uid, pageNum=page, pageCursor=request.args.get("c")
+    )
 
     if (page > maxPage):
         return redirect(url_for("teacherBP.courseList") + f"?p={maxPage}")
@@ -42,7 +44,7 @@ def courseList():
         # Compute the buttons needed for pagination
         paginationArr = get_pagination_arr(pageNum=page, maxPage=maxPage)
 
-    return render_template("users/general/course_list.html", imageSrcPath=userInfo.profileImage, courseListLen=len(courseList), accType=userInfo.role, currentPage=page, maxPage=maxPage, courseList=courseList, isOwnself=True, paginationArr=paginationArr)
+    return render_template("users/general/course_list.html", imageSrcPath=userInfo.profileImage, courseListLen=len(courseList), accType=userInfo.role, currentPage=page, maxPage=maxPage, courseList=courseList, isOwnself=True, paginationArr=paginationArr, pageCursors=pageCursors)
 
 @teacherBP.route("/draft-course-list")
 def draftCourseList():
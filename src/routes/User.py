@@ -424,7 +424,9 @@ def purchaseHistory():
         )
 
     userInfo = get_image_path(session["user"], returnUserInfo=True)
-    purchasedCourseArr, maxPage = sql_operation(table="user", mode="paginate_user_purchases", userID=session["user"], pageNum=pageNum)
+    purchasedCourseArr, maxPage, pageCursors = sql_operation(
+        table="user", mode="paginate_user_purchases", userID=session["user"], pageNum=pageNum, pageCursor=request.args.get("c")
+    )
 
     if (pageNum > maxPage):
         return redirect(url_for("userBP.purchaseHistory") + f"?p={maxPage}")
@@ -432,7 +434,7 @@ def purchaseHistory():
     paginationArr = get_pagination_arr(pageNum=pageNum, maxPage=maxPage) if (purchasedCourseArr) else []
     session["historyCurPage"] = str(pageNum)
 
-    return render_template("users/user/purchase_history.html", courseList=purchasedCourseArr, imageSrcPath=userInfo.profileImage, accType=userInfo.role, paginationArr=paginationArr, currentPage=pageNum, maxPage=maxPage)
+    return render_template("users/user/purchase_history.html", courseList=purchasedCourseArr, imageSrcPath=userInfo.profileImage, accType=userInfo.role, paginationArr=paginationArr, pageCursors=pageCursors, currentPage=pageNum, maxPage=maxPage)
 
 @userBP.route("/purchase-view/<string:courseID>")
 def purchaseView(courseID:str):
@@ -499,13 +501,8 @@ def shoppingCart():
         # print(userInfo)
         cartCourseIDs = userInfo.cartCourses
 
-        courseList = []
-        subtotal = 0
-
-        for courseID in cartCourseIDs:
-            course = sql_operation(table='course', mode = "get_course_data", courseID = courseID)
-            courseList.append(course)
-            subtotal += course.coursePrice
+        courseList = sql_operation(table="course", mode="get_course_data_list", courseIDList=cartCourseIDs)
+        subtotal = sum(course.coursePrice for course in courseList)
         return render_template("users/user/shopping_cart.html", courseList=courseList, subtotal=f"{subtotal:,.2f}", imageSrcPath=userInfo.profileImage, accType=userInfo.role, courseAddedStatus=courseAddedStatus)
 
 @userBP.route("/checkout", methods = ["GET", "POST"])
@@ -1,11 +1,32 @@
+"""
+Benchmarks the Argon2id password hashing on the target machine and recommends the
+time_cost, memory_cost and parallelism of the PasswordHasher (CONSTANTS.PH in Constants.py)
+for a hash latency budget under the expected hashing concurrency.
+
+The concurrency is the number of gunicorn workers on the machine multiplied by the
+number of concurrent hashes per worker (PASSWORD_HASHING_MAX_CONCURRENCY in Constants.py).
+Each candidate is benchmarked in a separate process that runs that many hashes at the same time
+(argon2-cffi releases the GIL) and reports the latencies and the peak memory (max RSS) of the process.
+
+The recommendation is the highest memory cost that fits the memory budget at full concurrency
+with the highest time cost whose 95th percentile latency is within the latency budget.
+Changing CONSTANTS.PH is safe for the existing users as their hashes are upgraded on their next login.
+
+Usage (Linux/macOS as it uses the resource module):
+    python argon2_config.py [--budget-ms 500] [--workers 4] [--concurrency 2] [--memory-budget-mib 1024]
+"""
+# import third party libraries
+from argon2 import PasswordHasher, Type as Argon2Type
+
 # import python standard libraries
 from sys import modules
-import pathlib
+from os import cpu_count, sysconf
+from multiprocessing import Process, Queue
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median, quantiles
 from importlib.util import spec_from_file_location, module_from_spec
-from timeit import repeat
-
-# import third party libraries
-from argon2 import PasswordHasher
+from time import perf_counter
+import pathlib, resource, argparse, platform
 
 # import Constants.py local python module using absolute path
 FILE_PATH = pathlib.Path(__file__).parent.absolute()
@@ -15,25 +36,137 @@ Constants = module_from_spec(spec)
 modules[spec.name] = Constants
 spec.loader.exec_module(Constants)
 
-DEFAULT_PH = PasswordHasher()
 CONFIGURED_PH = Constants.CONSTANTS.PH
-REPEAT_NUM = 5
-
-passwordInput = input("Enter password to hash: ")
-
-print("\nAverage time taken for hashing the password,\n\"", passwordInput, f"\", {REPEAT_NUM} times...", sep="", end="\n\n")
-
-print("Default:", sum(repeat(
-    stmt=f"DEFAULT_PH.hash('{passwordInput}')", 
-    setup="from __main__ import DEFAULT_PH",
-    repeat=REPEAT_NUM,
-    number=1)) / REPEAT_NUM,
-    sep="\t\t"
-)
-print("Manually configured:", sum(repeat(
-    stmt=f"CONFIGURED_PH.hash('{passwordInput}')", 
-    setup="from __main__ import CONFIGURED_PH",
-    repeat=REPEAT_NUM,
-    number=1)) / REPEAT_NUM,
-    sep="\t"
-)
\ No newline at end of file
+BENCHMARK_PASSWORD = "CourseFinity123!"
+
+# Memory costs (in MiB) to try from the highest, the lowest is OWASP's minimum for Argon2id
+# https://cheatsheetseries.owasp.org/cheatsheets/Password_Storage_Cheat_Sheet.html#argon2id
+MEMORY_COSTS_MIB = (256, 128, 64, 46, 19)
+MAX_TIME_COST = 10
+MAX_PARALLELISM = 4
+
+def benchmark_in_process(resultQueue:Queue, timeCost:int, memoryCostKiB:int, parallelism:int, concurrency:int, repeat:int) -> None:
+    """Hash the password concurrently and put the (latencies in ms, peak memory in MiB) into the queue"""
+    ph = PasswordHasher(
+        time_cost=timeCost, memory_cost=memoryCostKiB, parallelism=parallelism,
+        salt_len=CONFIGURED_PH.salt_len, hash_len=CONFIGURED_PH.hash_len, type=Argon2Type.ID
+    )
+    def timed_hash(_) -> float:
+        startTime = perf_counter()
+        ph.hash(BENCHMARK_PASSWORD)
+        return (perf_counter() - startTime) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed_hash, range(concurrency * repeat)))
+
+    # ru_maxrss is in KiB on Linux but in bytes on macOS
+    maxRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peakMemoryMiB = maxRss / (1024 * 1024) if (platform.system() == "Darwin") else maxRss / 1024
+    resultQueue.put((latencies, peakMemoryMiB))
+
+def benchmark(timeCost:int, memoryCostMiB:int, parallelism:int, concurrency:int, repeat:int) -> dict:
+    """Benchmark the parameters in a new process so that the peak memory is of this benchmark only"""
+    resultQueue = Queue()
+    process = Process(
+        target=benchmark_in_process,
+        args=(resultQueue, timeCost, memoryCostMiB * 1024, parallelism, concurrency, repeat)
+    )
+    process.start()
+    latencies, peakMemoryMiB = resultQueue.get()
+    process.join()
+    return {
+        "time_cost": timeCost,
+        "memory_cost_mib": memoryCostMiB,
+        "parallelism": parallelism,
+        "median_ms": median(latencies),
+        "p95_ms": quantiles(latencies, n=20)[-1] if (len(latencies) > 1) else latencies[0],
+        "peak_memory_mib": peakMemoryMiB
+    }
+
+def print_result(result:dict, note:str="") -> None:
+    print(
+        f"t={result['time_cost']:<3} m={result['memory_cost_mib']:>4}MiB p={result['parallelism']:<3}"
+        f"median: {result['median_ms']:>8.1f}ms   p95: {result['p95_ms']:>8.1f}ms   "
+        f"peak memory: {result['peak_memory_mib']:>7.1f}MiB   {note}"
+    )
+
+def get_total_memory_mib() -> float:
+    return sysconf("SC_PAGE_SIZE") * sysconf("SC_PHYS_PAGES") / (1024 * 1024)
+
+def calibrate(budgetMs:float, concurrency:int, memoryBudgetMiB:float, parallelism:int, repeat:int) -> dict:
+    """
+    Returns the benchmark result of the recommended parameters or None if even
+    the lowest memory cost with a time cost of 1 exceeds the latency budget.
+    """
+    for memoryCostMiB in MEMORY_COSTS_MIB:
+        if (memoryCostMiB * concurrency > memoryBudgetMiB and memoryCostMiB != MEMORY_COSTS_MIB[-1]):
+            print(f"m={memoryCostMiB}MiB skipped, {concurrency} concurrent hashes exceed the memory budget of {memoryBudgetMiB:.0f}MiB")
+            continue
+
+        recommended = None
+        for timeCost in range(1, MAX_TIME_COST + 1):
+            result = benchmark(timeCost, memoryCostMiB, parallelism, concurrency, repeat)
+            isWithinBudget = (result["p95_ms"] <= budgetMs)
+            print_result(result, "within budget" if (isWithinBudget) else "exceeds budget")
+            if (not isWithinBudget):
+                break
+            recommended = result
+
+        # OWASP recommends a time cost of at least 2 for the lower memory costs
+        if (recommended is not None and (recommended["time_cost"] >= 2 or memoryCostMiB >= 46)):
+            return recommended
+    return None
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark Argon2id on this machine and recommend its parameters.")
+    parser.add_argument("--budget-ms", default=500, type=float, help="95th percentile hash latency budget in milliseconds")
+    parser.add_argument("--workers", default=cpu_count(), type=int, help="Number of gunicorn workers on this machine")
+    parser.add_argument(
+        "--concurrency", default=Constants.CONSTANTS.PASSWORD_HASHING_MAX_CONCURRENCY, type=int,
+        help="Number of concurrent hashes per worker"
+    )
+    parser.add_argument(
+        "--memory-budget-mib", default=None, type=float,
+        help="Memory for the concurrent hashes of all the workers (defaults to a quarter of the machine's memory)"
+    )
+    parser.add_argument("--repeat", default=3, type=int, help="Number of rounds of concurrent hashes per candidate")
+    args = parser.parse_args()
+
+    concurrency = args.workers * args.concurrency
+    memoryBudgetMiB = args.memory_budget_mib if (args.memory_budget_mib is not None) else get_total_memory_mib() / 4
+    # spread the hashing threads of the concurrent hashes over the CPU cores
+    parallelism = max(1, min(MAX_PARALLELISM, cpu_count() // concurrency))
+
+    print(
+        f"Latency budget: {args.budget_ms:.0f}ms (p95), {concurrency} concurrent hashes "
+        f"({args.workers} workers x {args.concurrency}), memory budget: {memoryBudgetMiB:.0f}MiB, "
+        f"CPU cores: {cpu_count()}\n"
+    )
+
+    print("Configured in Constants.py:")
+    configured = benchmark(
+        CONFIGURED_PH.time_cost, CONFIGURED_PH.memory_cost // 1024, CONFIGURED_PH.parallelism, concurrency, args.repeat
+    )
+    print_result(configured, "within budget" if (configured["p95_ms"] <= args.budget_ms) else "exceeds budget")
+
+    print("\nCalibrating...")
+    recommended = calibrate(args.budget_ms, concurrency, memoryBudgetMiB, parallelism, args.repeat)
+    if (recommended is None):
+        print("\nNo parameters are within the latency budget, increase the budget or reduce the concurrency.")
+        return
+
+    print("\nRecommended:")
+    print_result(recommended)
+    print(
+        "\nPH: PasswordHasher = PasswordHasher(\n"
+        f"    time_cost={recommended['time_cost']},\n"
+        f"    salt_len={CONFIGURED_PH.salt_len},\n"
+        f"    hash_len={CONFIGURED_PH.hash_len},\n"
+        f"    parallelism={recommended['parallelism']},\n"
+        f"    memory_cost={recommended['memory_cost_mib']}*1024,\n"
+        "    type=Argon2Type.ID\n"
+        ")"
+    )
+
+if (__name__ == "__main__"):
+    main()
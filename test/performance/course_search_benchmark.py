@@ -0,0 +1,193 @@
+"""
+Benchmarks the course search latency of the FULLTEXT search path
+(search_course_fulltext_paginate) against the legacy LIKE search path (search_course_paginate)
+at 10k, 100k and 1M courses.
+
+The benchmark creates and afterwards drops its own database, "coursefinity_search_benchmark",
+with a copy of the course_card table, so it will not touch the "coursefinity" database.
+
+Usage:
+    python course_search_benchmark.py [--host localhost] [--user root] [--sizes 10000,100000,1000000]
+"""
+# import third party libraries
+import pymysql
+
+# import python standard libraries
+from random import Random
+from datetime import datetime, timedelta
+from statistics import median, quantiles
+from getpass import getpass
+from time import perf_counter
+import argparse
+
+BENCHMARK_DATABASE = "coursefinity_search_benchmark"
+INSERT_BATCH_SIZE = 5000
+REPEAT_NUM = 20
+
+# Words that are used as the "subjects" of the generated courses
+# with the first words being more common than the later ones
+SUBJECT_WORDS = (
+    "python", "javascript", "programming", "design", "marketing", "photography", "finance", "music",
+    "excel", "drawing", "cooking", "fitness", "writing", "security", "statistics", "physics", "chemistry",
+    "biology", "history", "economics", "accounting", "leadership", "negotiation", "animation", "guitar"
+)
+
+# (LIKE search input, FULLTEXT boolean mode search query) pairs,
+# the FULLTEXT queries are built the same way as build_fulltext_search_query() in SQLFunctions.py
+SEARCH_CASES = (
+    ("python", "+python*"),
+    ("guitar", "+guitar*"),
+    ("data science", "+data* +science*"),
+    ("nonexistent", "+nonexistent*")
+)
+
+COURSE_CARD_TABLE = """CREATE TABLE course_card (
+    course_id CHAR(32) PRIMARY KEY,
+    teacher_id VARCHAR(32) NOT NULL,
+    teacher_username VARCHAR(255) NOT NULL,
+    teacher_profile_image VARCHAR(255) DEFAULT NULL,
+    course_name VARCHAR(255) NOT NULL,
+    course_description VARCHAR(2000) DEFAULT NULL,
+    course_image_path VARCHAR(255) DEFAULT NULL,
+    course_price DECIMAL(6,2) NOT NULL,
+    course_category VARCHAR(255) NOT NULL,
+    date_created DATETIME NOT NULL,
+    video_path VARCHAR(255) NOT NULL,
+    active BOOL NOT NULL DEFAULT TRUE,
+    review_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    avg_rating INTEGER AS (IF(review_count > 0, ROUND(rating_sum / review_count, 0), NULL)) STORED
+)"""
+
+INSERT_COURSE_QUERY = """
+    INSERT INTO course_card (
+        course_id, teacher_id, teacher_username, teacher_profile_image, course_name, course_description,
+        course_image_path, course_price, course_category, date_created, video_path, active,
+        review_count, rating_sum
+    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+
+# Same statements as the search_course_paginate stored procedure
+LIKE_COUNT_QUERY = "SELECT COUNT(*) FROM course_card WHERE course_name LIKE %(searchQuery)s AND active=1"
+LIKE_PAGE_QUERY = """
+    SELECT course_id, teacher_id, teacher_username, teacher_profile_image, course_name, course_description,
+    course_image_path, course_price, course_category, date_created, avg_rating
+    FROM course_card
+    WHERE course_name LIKE %(searchQuery)s AND active=1
+    ORDER BY date_created DESC LIMIT 10
+"""
+
+# Same statement as the search_course_fulltext_paginate stored procedure
+FULLTEXT_PAGE_QUERY = """
+    SELECT ROW_NUMBER() OVER (ORDER BY relevance DESC, date_created DESC) AS row_num,
+    course_id, teacher_id, teacher_username, teacher_profile_image, course_name, course_description,
+    course_image_path, course_price, course_category, date_created, avg_rating,
+    COUNT(*) OVER () AS total_course_num
+    FROM (
+        SELECT course_id, teacher_id, teacher_username, teacher_profile_image, course_name, course_description,
+        course_image_path, course_price, course_category, date_created, avg_rating,
+        MATCH(course_name, course_description) AGAINST (%(searchQuery)s IN BOOLEAN MODE) AS relevance
+        FROM course_card
+        WHERE MATCH(course_name, course_description) AGAINST (%(searchQuery)s IN BOOLEAN MODE) AND active=1
+    ) AS course_info
+    ORDER BY row_num
+    LIMIT 10 OFFSET 0
+"""
+
+def generate_vocabulary(rng:Random, size:int=5000) -> list:
+    """Generate random filler words to pad the course names and descriptions with"""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choices(letters, k=rng.randint(4, 10))) for _ in range(size)] + ["data", "science"]
+
+def generate_courses(rng:Random, vocabulary:list, startNum:int, endNum:int):
+    """Generate the course_card rows from startNum (inclusive) to endNum (exclusive)"""
+    baseDate = datetime(2022, 1, 1)
+    for courseNum in range(startNum, endNum):
+        # skew the subjects so that the earlier subjects are more common
+        subject = SUBJECT_WORDS[min(int(rng.expovariate(0.25)), len(SUBJECT_WORDS) - 1)]
+        courseName = " ".join([subject] + rng.choices(vocabulary, k=rng.randint(2, 5)))
+        courseDescription = " ".join(rng.choices(vocabulary, k=rng.randint(20, 40)))
+        reviewCount = rng.randint(0, 50)
+        yield (
+            f"{courseNum:032x}", f"teacher{courseNum % 1000:025d}", f"teacher-{courseNum % 1000}", None,
+            courseName, courseDescription, None, rng.randint(0, 99999) / 100, "Programming",
+            baseDate + timedelta(minutes=courseNum), "/video.mp4", rng.random() > 0.05,
+            reviewCount, reviewCount * rng.randint(1, 5)
+        )
+
+def insert_courses(con:pymysql.connections.Connection, rng:Random, vocabulary:list, startNum:int, endNum:int) -> None:
+    """Bulk insert the generated courses in batches"""
+    cur = con.cursor()
+    batch = []
+    for course in generate_courses(rng, vocabulary, startNum, endNum):
+        batch.append(course)
+        if (len(batch) >= INSERT_BATCH_SIZE):
+            cur.executemany(INSERT_COURSE_QUERY, batch)
+            con.commit()
+            batch.clear()
+    if (batch):
+        cur.executemany(INSERT_COURSE_QUERY, batch)
+        con.commit()
+
+def time_queries(con:pymysql.connections.Connection, queries:tuple, searchQuery:str) -> tuple:
+    """
+    Run the queries REPEAT_NUM times and returns the median and
+    the 95th percentile latency (in milliseconds) of running all the queries
+    """
+    cur = con.cursor()
+    timings = []
+    for _ in range(REPEAT_NUM):
+        startTime = perf_counter()
+        for query in queries:
+            cur.execute(query, {"searchQuery": searchQuery})
+            cur.fetchall()
+        timings.append((perf_counter() - startTime) * 1000)
+    return median(timings), quantiles(timings, n=20)[-1]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the FULLTEXT course search against the LIKE course search.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="Comma separated number of courses to benchmark")
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+
+    con = pymysql.connect(host=args.host, user=args.user, password=getpass(f"Enter the MySQL password for {args.user}: "))
+    cur = con.cursor()
+    cur.execute(f"DROP DATABASE IF EXISTS {BENCHMARK_DATABASE}")
+    cur.execute(f"CREATE DATABASE {BENCHMARK_DATABASE}")
+    cur.execute(f"USE {BENCHMARK_DATABASE}")
+    cur.execute(COURSE_CARD_TABLE)
+    cur.execute("CREATE INDEX course_card_active_date_created_idx ON course_card(active, date_created)")
+
+    rng = Random(2022)
+    vocabulary = generate_vocabulary(rng)
+    try:
+        numOfCourses = 0
+        for size in sizes:
+            # the FULLTEXT index is rebuilt after each bulk insert as it is faster than maintaining it per row
+            print(f"Inserting courses up to {size:,}...")
+            if (numOfCourses > 0):
+                cur.execute("DROP INDEX course_card_search_idx ON course_card")
+            insert_courses(con, rng, vocabulary, numOfCourses, size)
+            cur.execute("CREATE FULLTEXT INDEX course_card_search_idx ON course_card(course_name, course_description)")
+            cur.execute("ANALYZE TABLE course_card")
+            cur.fetchall()
+            numOfCourses = size
+
+            print(f"\n{size:,} courses (median / p95 of {REPEAT_NUM} runs in ms)")
+            print(f"{'search input':<16}{'LIKE':>24}{'FULLTEXT':>24}")
+            for likeInput, fulltextQuery in SEARCH_CASES:
+                likeMedian, likeP95 = time_queries(con, (LIKE_COUNT_QUERY, LIKE_PAGE_QUERY), f"%{likeInput}%")
+                fulltextMedian, fulltextP95 = time_queries(con, (FULLTEXT_PAGE_QUERY,), fulltextQuery)
+                print(
+                    f"{likeInput:<16}{f'{likeMedian:.2f} / {likeP95:.2f}':>24}"
+                    f"{f'{fulltextMedian:.2f} / {fulltextP95:.2f}':>24}"
+                )
+            print()
+    finally:
+        cur.execute(f"DROP DATABASE IF EXISTS {BENCHMARK_DATABASE}")
+        con.close()
+
+if (__name__ == "__main__"):
+    main()
@@ -0,0 +1,282 @@
+"""
+Checks with EXPLAIN that the time bound predicates of the SQL operations in SQLFunctions.py
+(e.g. "expiry_date < %(now)s") use the expiry and last accessed indexes for range scans,
+unlike the previous predicates that called SGT_NOW() or wrapped the column in DATEDIFF().
+
+The batched purges of the maintenance jobs are built from PURGE_QUERIES in PurgeQueries.py,
+the same queries that purge_in_batches() in SQLFunctions.py executes:
+- the SELECT of a batch of primary keys must range scan the index of its orderBy column(s)
+- the DELETE of that batch by its primary keys (with the condition re-checked) must range scan the primary key
+
+The check creates and afterwards drops its own database, "coursefinity_explain_check",
+with copies of the relevant tables and their indexes filled with generated rows
+(as the optimizer would rather scan a near empty table), so it will not touch the "coursefinity" database.
+
+Usage:
+    python explain_time_predicates.py [--host localhost] [--user root] [--rows 20000]
+
+Exits with status code 1 if any of the queries does not use the expected index.
+"""
+# import third party libraries
+import pymysql
+
+# import python standard libraries
+from random import Random
+from datetime import datetime, timedelta, time
+from zoneinfo import ZoneInfo
+from getpass import getpass
+from sys import modules
+from importlib.util import spec_from_file_location, module_from_spec
+import argparse, pathlib, sys
+
+# import PurgeQueries.py local python module using absolute path
+FILE_PATH = pathlib.Path(__file__).parent.absolute()
+PURGE_QUERIES_PY_FILE = FILE_PATH.parent.parent.joinpath("src", "python_files", "classes", "PurgeQueries.py")
+spec = spec_from_file_location("PurgeQueries", str(PURGE_QUERIES_PY_FILE))
+PurgeQueries = module_from_spec(spec)
+modules[spec.name] = PurgeQueries
+spec.loader.exec_module(PurgeQueries)
+
+CHECK_DATABASE = "coursefinity_explain_check"
+INSERT_BATCH_SIZE = 5000
+
+# Same columns and indexes as sample/create_mysql_database.py (without the foreign keys)
+TABLES = (
+    """CREATE TABLE session (
+        session_id CHAR(64) PRIMARY KEY,
+        user_id VARCHAR(32) NOT NULL,
+        expiry_date DATETIME NOT NULL,
+        fingerprint_hash CHAR(128) NOT NULL
+    )""",
+    "CREATE INDEX session_user_id_idx ON session(user_id)",
+    "CREATE INDEX session_expiry_date_idx ON session(expiry_date)",
+    """CREATE TABLE user_ip_addresses (
+        user_id VARCHAR(32) NOT NULL,
+        ip_address VARCHAR(32) NOT NULL,
+        last_accessed DATETIME NOT NULL,
+        is_ipv4 BOOL NOT NULL DEFAULT TRUE,
+        PRIMARY KEY (user_id, ip_address)
+    )""",
+    "CREATE INDEX user_ip_addresses_last_accessed_idx ON user_ip_addresses(last_accessed)",
+    "CREATE INDEX user_ip_addresses_user_id_last_accessed_idx ON user_ip_addresses(user_id, last_accessed)",
+    """CREATE TABLE guard_token (
+        token CHAR(16),
+        user_id VARCHAR(32) NOT NULL,
+        expiry_date DATETIME,
+        PRIMARY KEY (token, user_id)
+    )""",
+    "CREATE INDEX guard_token_expiry_date_idx ON guard_token(expiry_date)",
+    """CREATE TABLE expirable_token (
+        token CHAR(240) PRIMARY KEY,
+        user_id VARCHAR(32) NOT NULL,
+        expiry_date DATETIME,
+        purpose VARCHAR(30) NOT NULL
+    )""",
+    "CREATE INDEX expirable_token_expiry_date_idx ON expirable_token(expiry_date)",
+    """CREATE TABLE used_url_token (
+        nonce CHAR(32) PRIMARY KEY,
+        expiry_date DATETIME NOT NULL
+    )""",
+    "CREATE INDEX used_url_token_expiry_date_idx ON used_url_token(expiry_date)",
+    """CREATE TABLE login_attempts (
+        user_id VARCHAR(32) PRIMARY KEY,
+        attempts INTEGER UNSIGNED NOT NULL,
+        reset_date DATETIME NOT NULL
+    )""",
+    "CREATE INDEX login_attempts_reset_date_idx ON login_attempts(reset_date)",
+    """CREATE TABLE stripe_payments (
+        stripe_payment_intent VARCHAR(32) PRIMARY KEY,
+        user_id VARCHAR(32) NOT NULL,
+        created_time DATETIME NOT NULL,
+        payment_time DATETIME
+    )""",
+    "CREATE INDEX stripe_payments_payment_time_created_time_idx ON stripe_payments(payment_time, created_time)",
+    """CREATE TABLE user (
+        id VARCHAR(32) PRIMARY KEY,
+        email_verified BOOLEAN NOT NULL DEFAULT FALSE,
+        date_joined DATETIME NOT NULL
+    )""",
+    "CREATE INDEX user_email_verified_idx ON user(email_verified)",
+    "CREATE INDEX user_date_joined_idx ON user(date_joined)",
+    """CREATE FUNCTION SGT_NOW() RETURNS DATETIME DETERMINISTIC
+        RETURN CONVERT_TZ(UTC_TIMESTAMP(), '+00:00', '+08:00')"""
+)
+
+# The parameters of the purges' conditions, same as the SQL operations in SQLFunctions.py
+def get_purge_params(now:datetime) -> dict:
+    return {
+        "session": {"now": now},
+        "user_ip_addresses": {"lastAccessedBound": datetime.combine(now.date() - timedelta(days=10), time.min)},
+        "guard_token": {"now": now},
+        "expirable_token": {"now": now},
+        "used_url_token": {"now": now},
+        "login_attempts": {"now": now},
+        "stripe_payments": {"createdBefore": now - timedelta(hours=2)},
+        "user": {"joinedBefore": now - timedelta(days=30)}
+    }
+
+def get_purge_checks(con:pymysql.connections.Connection, purgeQuery, params:dict, batchSize:int) -> tuple:
+    """
+    Returns the checks of the batched SELECT and DELETE of the purge, compared
+    with the single DELETE of all the matching rows that they replaced.
+    """
+    selectQuery = purgeQuery.get_select_query(batchSize)
+    cur = con.cursor()
+    cur.execute(selectQuery, params)
+    primaryKeys = cur.fetchall()
+
+    # escaped beforehand as the batch DELETE check has no parameters left
+    previousQuery = cur.mogrify(f"DELETE FROM {purgeQuery.table} WHERE {purgeQuery.condition}", params)
+    checks = [(
+        f"{purgeQuery.table} batch SELECT",
+        selectQuery, params,
+        f"{purgeQuery.table}_{purgeQuery.orderBy.replace(', ', '_')}_idx",
+        previousQuery
+    )]
+    if (primaryKeys):
+        # escaped the same way as in purge_in_batches()
+        deleteQuery = cur.mogrify(
+            purgeQuery.get_delete_query(len(primaryKeys)), [value for key in primaryKeys for value in key]
+        ) + cur.mogrify(purgeQuery.get_condition_clause(), params)
+        checks.append((
+            f"{purgeQuery.table} batch DELETE ({len(primaryKeys)} keys)",
+            deleteQuery, None,
+            "PRIMARY",
+            previousQuery
+        ))
+    return tuple(checks)
+
+# (description, query, params, expected index, previous query)
+def get_checks(con:pymysql.connections.Connection, now:datetime, userID:str, batchSize:int) -> tuple:
+    purgeParams = get_purge_params(now)
+    checks = [
+        (
+            "user_ip_addresses get_ip_addresses",
+            "SELECT ip_address FROM user_ip_addresses WHERE user_id = %(userID)s AND last_accessed >= %(bound)s",
+            {"userID": userID, "bound": purgeParams["user_ip_addresses"]["lastAccessedBound"]},
+            "user_ip_addresses_user_id_last_accessed_idx",
+            "SELECT ip_address FROM user_ip_addresses WHERE user_id = %(userID)s AND DATEDIFF(SGT_NOW(), last_accessed) <= 10"
+        )
+    ]
+    for table, purgeQuery in PurgeQueries.PURGE_QUERIES.items():
+        checks.extend(get_purge_checks(con, purgeQuery, purgeParams[table], batchSize))
+    return tuple(checks)
+
+def insert_rows(con:pymysql.connections.Connection, query:str, rows) -> None:
+    """Bulk insert the generated rows in batches"""
+    cur = con.cursor()
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if (len(batch) >= INSERT_BATCH_SIZE):
+            cur.executemany(query, batch)
+            con.commit()
+            batch.clear()
+    if (batch):
+        cur.executemany(query, batch)
+        con.commit()
+
+def fill_tables(con:pymysql.connections.Connection, rng:Random, now:datetime, numOfRows:int) -> None:
+    """
+    Fill the tables with rows where only about 2% of them are past the time bounds,
+    like the tables in production where the expired rows are regularly deleted
+    """
+    def random_time(pastRatio:float=0.02, spanHours:int=24 * 30) -> datetime:
+        offset = timedelta(hours=rng.random() * spanHours)
+        return (now - offset - timedelta(days=15)) if (rng.random() < pastRatio) else (now + offset)
+
+    def random_past_time(pastRatio:float=0.02) -> datetime:
+        if (rng.random() < pastRatio):
+            return now - timedelta(days=rng.randint(12, 60))
+        return now - timedelta(minutes=rng.randint(0, 60 * 24 * 9))
+
+    userIDs = [f"user{userNum:028d}" for userNum in range(max(numOfRows // 10, 1))]
+    insert_rows(con, "INSERT INTO session VALUES (%s, %s, %s, %s)", (
+        (f"{rowNum:064x}", rng.choice(userIDs), random_time(), "0" * 128) for rowNum in range(numOfRows)
+    ))
+    insert_rows(con, "INSERT INTO user_ip_addresses VALUES (%s, %s, %s, 1)", (
+        (rng.choice(userIDs), f"{rowNum:08x}", random_past_time()) for rowNum in range(numOfRows)
+    ))
+    insert_rows(con, "INSERT INTO guard_token VALUES (%s, %s, %s)", (
+        (f"{rowNum:016x}", rng.choice(userIDs), random_time()) for rowNum in range(numOfRows)
+    ))
+    insert_rows(con, "INSERT INTO expirable_token VALUES (%s, %s, %s, 'email_verification')", (
+        (f"{rowNum:0240x}", rng.choice(userIDs), random_time()) for rowNum in range(numOfRows)
+    ))
+    insert_rows(con, "INSERT INTO used_url_token VALUES (%s, %s)", (
+        (f"{rowNum:032x}", random_time()) for rowNum in range(numOfRows)
+    ))
+    insert_rows(con, "INSERT INTO login_attempts VALUES (%s, 1, %s)", (
+        (f"user{rowNum:028d}", random_time()) for rowNum in range(numOfRows)
+    ))
+    insert_rows(con, "INSERT INTO stripe_payments VALUES (%s, %s, %s, %s)", (
+        (
+            f"{rowNum:032x}", rng.choice(userIDs),
+            now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+            None if (rng.random() < 0.02) else now
+        ) for rowNum in range(numOfRows)
+    ))
+    insert_rows(con, "INSERT INTO user VALUES (%s, %s, %s)", (
+        (
+            f"user{rowNum:028d}",
+            rng.random() >= 0.02,
+            now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+        ) for rowNum in range(numOfRows)
+    ))
+
+    cur = con.cursor()
+    for table in PurgeQueries.PURGE_QUERIES:
+        cur.execute(f"ANALYZE TABLE {table}")
+        cur.fetchall()
+
+def explain(con:pymysql.connections.Connection, query:str, params:dict=None) -> tuple:
+    """Returns the (access type, index used) of the query's first table in the EXPLAIN output"""
+    cur = con.cursor(pymysql.cursors.DictCursor)
+    cur.execute(f"EXPLAIN {query}", params)
+    plan = cur.fetchall()[0]
+    return plan["type"], plan["key"]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check that the time bound predicates use the expiry and last accessed indexes.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--rows", default=20000, type=int, help="Number of rows to generate per table")
+    parser.add_argument("--batch-size", default=1000, type=int, help="Number of rows per batch of the purges (CONSTANTS.PURGE_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    con = pymysql.connect(host=args.host, user=args.user, password=getpass(f"Enter the MySQL password for {args.user}: "))
+    cur = con.cursor()
+    cur.execute(f"DROP DATABASE IF EXISTS {CHECK_DATABASE}")
+    cur.execute(f"CREATE DATABASE {CHECK_DATABASE}")
+    cur.execute(f"USE {CHECK_DATABASE}")
+
+    hasFailed = False
+    try:
+        for statement in TABLES:
+            cur.execute(statement)
+
+        # same as get_sgt_now() in SQLFunctions.py
+        now = datetime.now(tz=ZoneInfo("Asia/Singapore")).replace(tzinfo=None, microsecond=0)
+        rng = Random(2022)
+        print(f"Generating {args.rows:,} rows per table...")
+        fill_tables(con, rng, now, args.rows)
+
+        print(f"\n{'SQL operation':<60}{'previous plan':<40}{'current plan':<60}")
+        checks = get_checks(con, now, userID=f"user{0:028d}", batchSize=args.batch_size)
+        for description, query, params, expectedIndex, previousQuery in checks:
+            previousType, previousKey = explain(con, previousQuery, params)
+            currentType, currentKey = explain(con, query, params)
+            isUsingIndex = (currentKey == expectedIndex and currentType != "ALL")
+            hasFailed = hasFailed or not isUsingIndex
+            print(
+                f"{description:<60}{f'{previousType} ({previousKey})':<40}"
+                f"{f'{currentType} ({currentKey})':<60}{'OK' if (isUsingIndex) else f'FAILED, expected {expectedIndex}'}"
+            )
+    finally:
+        cur.execute(f"DROP DATABASE IF EXISTS {CHECK_DATABASE}")
+        con.close()
+
+    sys.exit(1 if (hasFailed) else 0)
+
+if (__name__ == "__main__"):
+    main()
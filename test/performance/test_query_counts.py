@@ -0,0 +1,225 @@
+"""
+Query-count regression tests for the pages that used to run a query per row
+(per-row cart/purchase checks, per-review get_image_path(), per-row account recovery checks, etc.).
+
+Each page is requested with the Flask test client and the number of queries and MySQL connections
+of the request are read from the "Server-Timing" response header (only added in debug mode, see after_request()).
+A test fails if a page runs more queries than its upper bound in MAX_QUERIES,
+e.g. when a change brings back a query per course, review or user on the page.
+
+Prerequisites (the tests are skipped if they are not met):
+- DEBUG_MODE is enabled in Constants.py so that the web app connects to the local MySQL server
+- The local "coursefinity" database is created with sample/create_mysql_database.py and seeded with
+    - sample/create_x_num_of_courses.py (with demo reviews) for the courses, teachers and reviews
+    - sample/create_x_num_of_users.py for the students
+    - sample/create_x_num_of_admins.py for the admins
+
+The courses added to the student's cart by the tests are removed afterwards.
+
+Usage (from the root of the repository):
+    python -m pytest test/performance/test_query_counts.py -v
+"""
+# import third party libraries
+import pytest
+
+# import python standard libraries
+import re, sys
+from pathlib import Path
+
+SRC_PATH = Path(__file__).resolve().parent.parent.parent.joinpath("src")
+sys.path.insert(0, str(SRC_PATH))
+
+USER_AGENT = "CourseFinity query count tests"
+USER_IP = "127.0.0.1"
+CART_SIZE = 5
+MIN_ROWS = 10 # the minimum number of rows on a page for a per-row query to exceed the page's upper bound
+
+SERVER_TIMING_REGEX = re.compile(r"sql;dur=[\d.]+;desc=\"(\d+) queries, (\d+) connections, (\d+) rows\"")
+
+# Upper bounds of the number of queries per page (with the caches cleared) for each principal.
+# The bounds include a little headroom (e.g. for the RBAC role version check and the session expiry extension)
+# but are well below the MIN_ROWS extra queries that a per-row query on the page would add.
+MAX_QUERIES = {
+    "/": {"guest": 5, "student": 8},
+    "/search": {"guest": 6, "student": 8},
+    "/course/<id>": {"guest": 6, "student": 8},
+    "/course/<id>/reviews": {"guest": 6, "student": 8},
+    "/teacher/<id>": {"guest": 7, "student": 10},
+    "/user-management": {"admin": 6},
+    "/shopping-cart": {"student": 6}
+}
+MAX_CONNECTIONS = 1
+
+@pytest.fixture(scope="session")
+def flaskApp():
+    # the web app's dependencies (e.g. Flask and the Google Cloud libraries) might not be installed
+    try:
+        from python_files.classes.Constants import CONSTANTS
+    except (Exception) as e:
+        pytest.skip(f"The web app's constants could not be loaded: {e}")
+
+    if (not CONSTANTS.DEBUG_MODE):
+        pytest.skip("DEBUG_MODE must be enabled to connect to the local MySQL server and to add the Server-Timing header.")
+
+    # importing the web app does not start its scheduled jobs (see start_scheduler() in app.py)
+    try:
+        from app import app
+        from routes.RoutesUtils import get_rbac_decision_table
+    except (Exception) as e:
+        pytest.skip(f"The web app could not be started: {e}")
+
+    # compile the RBAC decision table like start_scheduler() so that it is not counted in the first request
+    with app.app_context():
+        get_rbac_decision_table()
+
+    app.config["TESTING"] = True
+    return app
+
+@pytest.fixture(scope="session")
+def seededIDs(flaskApp) -> dict:
+    """Get the IDs of the seeded rows with the most rows on their pages."""
+    from python_files.functions.NormalFunctions import get_mysql_connection
+
+    con = get_mysql_connection()
+    try:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT c.course_id, COUNT(r.user_id) AS review_count, c.course_name FROM course AS c
+            LEFT OUTER JOIN review AS r ON c.course_id=r.course_id
+            WHERE c.active=1 GROUP BY c.course_id ORDER BY review_count DESC LIMIT 1
+        """)
+        courseRow = cur.fetchone()
+        cur.execute("""
+            SELECT teacher_id, COUNT(*) AS course_count FROM course
+            WHERE active=1 GROUP BY teacher_id ORDER BY course_count DESC LIMIT 1
+        """)
+        teacherRow = cur.fetchone()
+        cur.execute("""
+            SELECT u.id FROM user AS u INNER JOIN role AS r ON u.role=r.role_id
+            WHERE r.role_name='Student' AND u.status='Active' ORDER BY u.date_joined LIMIT 1
+        """)
+        studentRow = cur.fetchone()
+        cur.execute("""
+            SELECT u.id FROM user AS u INNER JOIN role AS r ON u.role=r.role_id
+            WHERE r.role_name='Admin' AND u.status='Active' ORDER BY u.date_joined LIMIT 1
+        """)
+        adminRow = cur.fetchone()
+        cur.execute("""
+            SELECT COUNT(*) FROM user AS u INNER JOIN role AS r ON u.role=r.role_id
+            WHERE r.role_name IN ('Student', 'Teacher')
+        """)
+        userCount = cur.fetchone()[0]
+    finally:
+        con.close()
+
+    if (courseRow is None or courseRow[1] < MIN_ROWS):
+        pytest.skip(f"Seed a course with at least {MIN_ROWS} reviews with sample/create_x_num_of_courses.py.")
+    if (teacherRow is None or teacherRow[1] < CART_SIZE):
+        pytest.skip(f"Seed a teacher with at least {CART_SIZE} courses with sample/create_x_num_of_courses.py.")
+    if (studentRow is None or userCount < MIN_ROWS):
+        pytest.skip(f"Seed at least {MIN_ROWS} users with sample/create_x_num_of_users.py.")
+
+    return {
+        "courseID": courseRow[0],
+        # the longest word of the course name to search for, so that the search has at least one result
+        "searchTerm": max(courseRow[2].split(), key=len),
+        "teacherID": teacherRow[0],
+        "studentID": studentRow[0],
+        "adminID": None if (adminRow is None) else adminRow[0]
+    }
+
+@pytest.fixture(scope="session")
+def studentCart(flaskApp, seededIDs):
+    """Add the teacher's courses to the student's cart and remove them after the tests."""
+    from python_files.functions.NormalFunctions import get_mysql_connection
+
+    con = get_mysql_connection()
+    addedCourseIDs = []
+    try:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT c.course_id FROM course AS c
+            WHERE c.teacher_id=%(teacherID)s AND c.active=1
+            AND c.course_id NOT IN (SELECT course_id FROM cart WHERE user_id=%(studentID)s)
+            AND c.course_id NOT IN (SELECT course_id FROM purchased_courses WHERE user_id=%(studentID)s)
+            LIMIT %(cartSize)s
+        """, {"teacherID": seededIDs["teacherID"], "studentID": seededIDs["studentID"], "cartSize": CART_SIZE})
+        addedCourseIDs = [row[0] for row in cur.fetchall()]
+        cur.executemany(
+            "INSERT INTO cart (user_id, course_id) VALUES (%s, %s)",
+            [(seededIDs["studentID"], courseID) for courseID in addedCourseIDs]
+        )
+        con.commit()
+        yield addedCourseIDs
+    finally:
+        cur = con.cursor()
+        cur.executemany(
+            "DELETE FROM cart WHERE user_id=%s AND course_id=%s",
+            [(seededIDs["studentID"], courseID) for courseID in addedCourseIDs]
+        )
+        con.commit()
+        con.close()
+
+def login(flaskApp, client, principal:str, seededIDs:dict) -> None:
+    """Log in the test client as the principal by adding a session for the seeded user."""
+    if (principal == "guest"):
+        return
+
+    from python_files.functions.SQLFunctions import add_session
+    userID = seededIDs["adminID"] if (principal == "admin") else seededIDs["studentID"]
+    if (userID is None):
+        pytest.skip("Seed an admin with sample/create_x_num_of_admins.py.")
+
+    with flaskApp.test_request_context():
+        sessionID = add_session(userID, userIP=USER_IP, userAgent=USER_AGENT)
+
+    with client.session_transaction() as flaskSession:
+        flaskSession["sid"] = sessionID
+        if (principal == "admin"):
+            flaskSession["admin"] = userID
+        else:
+            flaskSession["user"] = userID
+            flaskSession["isTeacher"] = False
+
+def get_sql_stats(response) -> tuple:
+    """Returns the (queries, connections) of the request from the Server-Timing header."""
+    matched = SERVER_TIMING_REGEX.search(response.headers.get("Server-Timing", ""))
+    assert matched is not None, "The response has no SQL Server-Timing header, is DEBUG_MODE enabled?"
+    return int(matched.group(1)), int(matched.group(2))
+
+def clear_caches() -> None:
+    """Clear the caches so that every measured request runs all of its queries."""
+    from python_files.functions.SQLFunctions import COURSE_CAROUSEL_CACHE, PAGINATION_COUNT_CACHE
+    COURSE_CAROUSEL_CACHE.invalidate()
+    PAGINATION_COUNT_CACHE.invalidate()
+
+def get_url(page:str, seededIDs:dict) -> str:
+    if (page == "/search"):
+        return f"/search?q={seededIDs['searchTerm']}"
+    return page.replace("<id>", seededIDs["teacherID"] if (page.startswith("/teacher")) else seededIDs["courseID"])
+
+@pytest.mark.parametrize(
+    "page, principal",
+    [(page, principal) for page, bounds in MAX_QUERIES.items() for principal in bounds]
+)
+def test_query_count(flaskApp, seededIDs, studentCart, page:str, principal:str):
+    client = flaskApp.test_client()
+    client.environ_base.update({"HTTP_USER_AGENT": USER_AGENT, "REMOTE_ADDR": USER_IP})
+    login(flaskApp, client, principal, seededIDs)
+    url = get_url(page, seededIDs)
+
+    # warm up the per-worker state (e.g. the RBAC decision table) before measuring
+    client.get(url, base_url="https://localhost")
+    clear_caches()
+    response = client.get(url, base_url="https://localhost")
+
+    assert response.status_code == 200, f"{url} returned {response.status_code} for the {principal}"
+    queries, connections = get_sql_stats(response)
+    maxQueries = MAX_QUERIES[page][principal]
+    assert queries <= maxQueries, (
+        f"{url} ran {queries} queries for the {principal} (max: {maxQueries}), "
+        "was a query per row added to the page?"
+    )
+    assert connections <= MAX_CONNECTIONS, (
+        f"{url} borrowed {connections} MySQL connections for the {principal} (max: {MAX_CONNECTIONS})"
+    )